@@ -49,7 +49,8 @@ export class InvoiceViewComponent implements OnInit {
       },
       items: this.extractedData.extracted_data.items,
       original_extraction: this.extractedData.extracted_data,
-      file_path: this.originalFile
+      file_path: this.originalFile,
+      text_fingerprint: this.extractedData.text_fingerprint
     };
     
     this.invoiceService.saveInvoice(data).subscribe({
@@ -22,10 +22,25 @@ export interface Invoice {
   items: InvoiceItem[];
 }
 
+export interface DuplicateMatch {
+  invoice_id: number;
+  match: 'exact' | 'near';
+}
+
+export interface SupplierMatch {
+  id: number;
+  name: string;
+  tax_id: string;
+  match: 'tax_id' | 'name';
+}
+
 export interface ExtractedData {
   status: string;
   extracted_data: Invoice;
   original_text: string;
+  text_fingerprint?: string;
+  duplicate?: DuplicateMatch | null;
+  supplier_match?: SupplierMatch | null;
 }
 
 export interface SaveInvoiceResponse {
@@ -17,7 +17,7 @@ export class InvoiceService {
     return this.http.post<ExtractedData>(`${this.apiUrl}/upload-invoice/`, formData);
   }
 
-  saveInvoice(data: { supplier: any, invoice: any, items: any[], original_extraction: any, file_path: string }): Observable<SaveInvoiceResponse> {
+  saveInvoice(data: { supplier: any, invoice: any, items: any[], original_extraction: any, file_path: string, text_fingerprint?: string }): Observable<SaveInvoiceResponse> {
     return this.http.post<SaveInvoiceResponse>(`${this.apiUrl}/save-invoice/`, data);
   }
 
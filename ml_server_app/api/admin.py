@@ -1,11 +1,33 @@
+from django import forms
 from django.contrib import admin
-from .models import Supplier, Invoice, InvoiceItem, MLModel, TrainingData
+from .models import Supplier, SupplierTemplate, Invoice, InvoiceItem, MLModel, TrainingData, ExtractionJob
+from .supplier_templates import compile_rules
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
     list_display = ('name', 'tax_id', 'created_at')
     search_fields = ('name', 'tax_id')
 
+class SupplierTemplateForm(forms.ModelForm):
+    class Meta:
+        model = SupplierTemplate
+        fields = '__all__'
+
+    def clean_rules(self):
+        rules = self.cleaned_data['rules']
+        try:
+            compile_rules(rules)
+        except ValueError as e:
+            raise forms.ValidationError(str(e))
+        return rules
+
+@admin.register(SupplierTemplate)
+class SupplierTemplateAdmin(admin.ModelAdmin):
+    form = SupplierTemplateForm
+    list_display = ('supplier', 'fingerprint', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('supplier__name', 'fingerprint')
+
 class InvoiceItemInline(admin.TabularInline):
     model = InvoiceItem
     extra = 0
@@ -25,4 +47,9 @@ class MLModelAdmin(admin.ModelAdmin):
 @admin.register(TrainingData)
 class TrainingDataAdmin(admin.ModelAdmin):
     list_display = ('invoice', 'used_for_training', 'created_at')
-    list_filter = ('used_for_training',)
\ No newline at end of file
+    list_filter = ('used_for_training',)
+
+@admin.register(ExtractionJob)
+class ExtractionJobAdmin(admin.ModelAdmin):
+    list_display = ('filename', 'status', 'attempts', 'model_version', 'created_at', 'finished_at')
+    list_filter = ('status',)
\ No newline at end of file
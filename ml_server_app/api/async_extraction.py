@@ -0,0 +1,101 @@
+import asyncio
+import math
+import os
+import threading
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .extraction_pool import get_executor, pool_size
+from .metrics import stage_metrics
+from .ml_processor import extract_invoice_results
+
+
+class ExtractionBackpressure(Exception):
+    """
+    Raised when the extraction queue is full; carries a Retry-After estimate in seconds
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Extraction queue is full")
+        self.retry_after = retry_after
+
+
+class ExtractionLimiter:
+    """
+    Bound on the extractions running or waiting in the process pool.
+
+    Up to one extraction per pool worker runs while EXTRACTION_QUEUE_DEPTH
+    more wait; beyond that uploads are refused instead of piling up.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def capacity(self):
+        return pool_size() + settings.EXTRACTION_QUEUE_DEPTH
+
+    def try_acquire(self):
+        with self.lock:
+            if self.in_flight >= self.capacity:
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self, *args):
+        with self.lock:
+            self.in_flight -= 1
+
+    def retry_after(self):
+        """
+        Seconds until a slot frees up, from the mean extraction time seen so far
+        """
+        histogram = stage_metrics.histograms.get('extraction')
+        count = sum(histogram.counts) if histogram is not None else 0
+        mean = histogram.total / count if count else settings.EXTRACTION_RETRY_AFTER
+        waves = math.ceil((self.in_flight - pool_size() + 1) / pool_size())
+        return max(1, math.ceil(mean * max(waves, 1)))
+
+
+extraction_limiter = ExtractionLimiter()
+
+
+def extraction_finished(file_path, remove_file, future=None):
+    extraction_limiter.release()
+    if remove_file:
+        os.remove(file_path)
+
+
+def submit_extraction(file_path, remove_file):
+    # Appelé dans le thread des appels synchrones: les workers du pool y sont
+    # créés (fork), pas dans le thread de la boucle d'événements. Ce thread va
+    # jusqu'au bout même si la requête est annulée pendant la soumission
+    finished = partial(extraction_finished, file_path, remove_file)
+    try:
+        future = get_executor().submit(extract_invoice_results, [file_path])
+    except Exception:
+        finished()
+        raise
+    # Créneau libéré et fichier supprimé à la fin réelle du calcul, même si la requête est abandonnée
+    future.add_done_callback(finished)
+    return future
+
+
+async def extract_invoice_async(file_path, remove_file=False):
+    """
+    Extract a file in the process pool without blocking the event loop,
+    raising ExtractionBackpressure when too many extractions are pending.
+
+    With remove_file, the file belongs to the extraction: it is removed
+    once the worker is done with it, or right away if it is refused.
+    """
+    if not extraction_limiter.try_acquire():
+        if remove_file:
+            os.remove(file_path)
+        raise ExtractionBackpressure(extraction_limiter.retry_after())
+    future = await sync_to_async(submit_extraction)(file_path, remove_file)
+    results = await asyncio.wrap_future(future)
+    return results[0]
@@ -0,0 +1,98 @@
+import os
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.exceptions import APIException
+
+from .async_extraction import ExtractionBackpressure, extract_invoice_async
+from .duplicates import find_duplicate
+from .extraction_cache import extraction_cache, get_active_model_version
+from .metrics import timed
+from .model_registry import model_registry
+from .stats import get_cached_model_stats
+from .supplier_resolver import match_supplier
+from .views import queue_upload, spool_upload
+
+# Vues asynchrones servies par ASGI (ml_server_app.asgi): la boucle d'événements
+# ne fait qu'attendre, l'extraction tourne dans le pool de processus borné
+
+
+def error_response(message, status):
+    return JsonResponse({'status': 'error', 'message': message}, status=status)
+
+
+@csrf_exempt
+@require_POST
+async def upload_invoice(request):
+    """
+    Upload and process an invoice file, without holding a server thread during extraction
+    """
+    file_path = None
+    try:
+        # Lecture du corps multipart dans un thread: le fichier est écrit sur disque et haché
+        with timed('request_parsing'):
+            files = await sync_to_async(lambda: request.FILES)()
+        invoice_file = files.get('file')
+        if invoice_file is None:
+            return JsonResponse({'file': ['No file was submitted.']}, status=400)
+
+        if request.GET.get('async', '').lower() in ('1', 'true'):
+            response = await sync_to_async(queue_upload)(invoice_file)
+            return JsonResponse(response.data, status=response.status_code)
+
+        with timed('spool'):
+            file_path, digest = await sync_to_async(spool_upload)(invoice_file)
+        with timed('cache_lookup'):
+            model_version = await sync_to_async(get_active_model_version)()
+            result = await sync_to_async(extraction_cache.get)(digest, model_version)
+        if result is None:
+            # Le fichier passe à l'extraction, qui le supprime quand le worker a fini:
+            # une requête annulée (client déconnecté) ne l'efface pas en cours de lecture
+            extraction_path, file_path = file_path, None
+            with timed('extraction'):
+                extracted = await extract_invoice_async(extraction_path, remove_file=True)
+            if extracted['status'] != 'success':
+                return error_response(extracted['message'], 500)
+            result = {key: value for key, value in extracted.items() if key != 'status'}
+            await sync_to_async(extraction_cache.set)(digest, model_version, result)
+        with timed('supplier_lookup'):
+            supplier_match = await sync_to_async(match_supplier)(result['extracted_data'].get('supplier'))
+        with timed('duplicate_lookup'):
+            duplicate = await sync_to_async(find_duplicate)(result, supplier_match)
+
+        with timed('serialization'):
+            return JsonResponse({
+                'status': 'success', **result, 'duplicate': duplicate, 'supplier_match': supplier_match
+            })
+
+    except ExtractionBackpressure as e:
+        response = error_response("Too many extractions in progress, retry later", 429)
+        response['Retry-After'] = str(e.retry_after)
+        return response
+    except APIException as e:
+        # Fichier trop volumineux (413): même réponse que la vue synchrone
+        return error_response(str(e.detail), e.status_code)
+    except Exception as e:
+        return error_response(str(e), 500)
+    finally:
+        if file_path is not None:
+            os.remove(file_path)
+
+
+@require_GET
+async def get_model_stats(request):
+    """
+    Get statistics about the ML model and training data, without blocking on extractions
+    """
+    try:
+        stats = await sync_to_async(get_cached_model_stats)()
+        return JsonResponse({
+            'status': 'success',
+            **stats,
+            'extraction_cache': extraction_cache.stats(),
+            'serving_model': model_registry.stats()
+        })
+    except Exception as e:
+        return error_response(str(e), 500)
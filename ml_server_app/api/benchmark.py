@@ -0,0 +1,153 @@
+import os
+import time
+import tracemalloc
+
+import numpy as np
+
+from .documents import MappedDocument
+from .ml_processor import extract_text_from_image, extract_text_from_pdf, process_invoice_data
+from .training import labelled_values
+
+STAGES = ('pdf_text', 'image_text', 'fields')
+# Champs comparés à la vérité terrain (étiquettes de labelled_values)
+ACCURACY_LABELS = (
+    'invoice_number', 'date', 'due_date', 'total_amount', 'tax_amount', 'supplier_name', 'supplier_tax_id',
+)
+PERCENTILES = (50, 90, 99)
+
+
+def corpus_files(source):
+    """
+    Return the (path, format) of every PDF or image of a corpus directory
+    """
+    files = []
+    for filename in sorted(os.listdir(source)):
+        path = os.path.join(source, filename)
+        if not os.path.isfile(path):
+            continue
+        with MappedDocument(path) as document:
+            if document.format != 'unknown':
+                files.append((path, document.format))
+    return files
+
+
+def measure(function, argument, repeat):
+    """
+    Call a function `repeat` times, returning its result and each call's duration
+    """
+    seconds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function(argument)
+        seconds.append(time.perf_counter() - started)
+    return result, seconds
+
+
+def peak_memory(function, argument):
+    """
+    Peak Python memory allocated by one call, in bytes
+    """
+    # Passe séparée: le suivi des allocations fausserait les temps mesurés
+    tracemalloc.start()
+    try:
+        function(argument)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def field_matches(extracted, truth):
+    """
+    Yield (label, correct) for each field that has a ground truth value
+    """
+    extracted_values = labelled_values(extracted)
+    truth_values = labelled_values(truth)
+    for label in ACCURACY_LABELS:
+        if truth_values.get(label):
+            yield label, bool(extracted_values.get(label, set()) & truth_values[label])
+
+
+def summarize(seconds, peak):
+    seconds = np.asarray(seconds)
+    summary = {'calls': len(seconds)}
+    for percentile, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+        summary[f'p{percentile}_ms'] = round(float(value) * 1000, 3)
+    summary['mean_ms'] = round(float(seconds.mean()) * 1000, 3)
+    summary['throughput_per_s'] = round(len(seconds) / float(seconds.sum()), 2)
+    summary['peak_memory_kb'] = round(peak / 1024, 1)
+    return summary
+
+
+def run_benchmark(files, ground_truth=None, repeat=3):
+    """
+    Time text extraction and field parsing over a corpus and score the fields
+    against the ground truth ({filename: extraction or correction})
+    """
+    ground_truth = ground_truth or {}
+    timings = {stage: [] for stage in STAGES}
+    peaks = dict.fromkeys(STAGES, 0)
+    fields = {label: [0, 0] for label in ACCURACY_LABELS}
+    errors = []
+
+    for path, document_format in files:
+        filename = os.path.basename(path)
+        if document_format == 'pdf':
+            stage, extract = 'pdf_text', extract_text_from_pdf
+        else:
+            stage, extract = 'image_text', extract_text_from_image
+        try:
+            text, seconds = measure(extract, path, repeat)
+        except Exception as e:
+            # Ex.: document numérisé sans tesseract/poppler installés
+            errors.append({'file': filename, 'stage': stage, 'message': str(e)})
+            continue
+        timings[stage].extend(seconds)
+        extracted, seconds = measure(process_invoice_data, text, repeat)
+        timings['fields'].extend(seconds)
+
+        peaks[stage] = max(peaks[stage], peak_memory(extract, path))
+        peaks['fields'] = max(peaks['fields'], peak_memory(process_invoice_data, text))
+
+        if filename in ground_truth:
+            for label, correct in field_matches(extracted, ground_truth[filename]):
+                fields[label][0] += correct
+                fields[label][1] += 1
+
+    accuracy = {
+        label: {'correct': correct, 'total': total, 'accuracy': round(correct / total, 4)}
+        for label, (correct, total) in fields.items() if total
+    }
+    correct = sum(field['correct'] for field in accuracy.values())
+    total = sum(field['total'] for field in accuracy.values())
+    return {
+        'files': len(files),
+        'repeat': repeat,
+        'stages': {stage: summarize(seconds, peaks[stage]) for stage, seconds in timings.items() if seconds},
+        'accuracy': accuracy,
+        'overall_accuracy': round(correct / total, 4) if total else None,
+        'errors': errors,
+    }
+
+
+def compare_reports(baseline, current, tolerance=0.2):
+    """
+    List the regressions of a report against a baseline: latency, throughput
+    or memory worse by more than `tolerance`, or any drop in field accuracy
+    """
+    regressions = []
+    for stage, summary in current['stages'].items():
+        reference = baseline.get('stages', {}).get(stage)
+        if reference is None:
+            continue
+        for metric in ('p50_ms', 'p90_ms', 'peak_memory_kb'):
+            if reference[metric] and summary[metric] > reference[metric] * (1 + tolerance):
+                regressions.append(f"{stage} {metric}: {reference[metric]} -> {summary[metric]}")
+        if summary['throughput_per_s'] < reference['throughput_per_s'] * (1 - tolerance):
+            regressions.append(
+                f"{stage} throughput_per_s: {reference['throughput_per_s']} -> {summary['throughput_per_s']}"
+            )
+    for label, field in current['accuracy'].items():
+        reference = baseline.get('accuracy', {}).get(label)
+        if reference is not None and field['accuracy'] < reference['accuracy']:
+            regressions.append(f"{label} accuracy: {reference['accuracy']} -> {field['accuracy']}")
+    return regressions
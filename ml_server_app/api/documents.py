@@ -0,0 +1,81 @@
+import hashlib
+import mmap
+
+# Signatures des formats acceptés: (format, octets de début)
+SIGNATURES = (
+    ('png', b'\x89PNG\r\n\x1a\n'),
+    ('jpeg', b'\xff\xd8\xff'),
+    ('tiff', b'II*\x00'),
+    ('tiff', b'MM\x00*'),
+    ('gif', b'GIF8'),
+    ('bmp', b'BM'),
+)
+# Certains générateurs écrivent quelques octets avant l'en-tête %PDF
+PDF_HEADER_WINDOW = 1024
+
+
+def sniff_format(buffer):
+    """
+    Detect a document format from its leading bytes
+    """
+    if buffer.find(b'%PDF', 0, PDF_HEADER_WINDOW) != -1:
+        return 'pdf'
+    for name, signature in SIGNATURES:
+        if buffer[:len(signature)] == signature:
+            return name
+    if buffer[:4] == b'RIFF' and buffer[8:12] == b'WEBP':
+        return 'webp'
+    return 'unknown'
+
+
+class MappedDocument:
+    """
+    Read-only memory map of an uploaded document.
+
+    Sniffing, hashing and parsing all read the same mapping, so a document
+    handed to a worker process by path is never copied into Python bytes:
+    the pages come straight from the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Un fichier vide ne peut pas être projeté en mémoire
+            self.buffer = None
+        self._format = None
+
+    @property
+    def format(self):
+        if self._format is None:
+            self._format = sniff_format(self.buffer) if self.buffer is not None else 'unknown'
+        return self._format
+
+    @property
+    def is_pdf(self):
+        return self.format == 'pdf'
+
+    def sha256(self):
+        return hashlib.sha256(self.buffer if self.buffer is not None else b'').hexdigest()
+
+    def stream(self):
+        """
+        Return a seekable file-like view over the mapping, for parsers
+        """
+        if self.buffer is None:
+            return self.file
+        self.buffer.seek(0)
+        return self.buffer
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,221 @@
+import hashlib
+import re
+import threading
+import time
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from .normalization import parse_amount, parse_date
+
+# Empreinte SimHash de 64 bits découpée en 6 bandes (4 de 11 bits, 2 de 10): deux
+# empreintes à au plus 5 bits d'écart ont forcément une bande identique (principe des tiroirs)
+FINGERPRINT_BITS = 64
+BAND_WIDTHS = (11, 11, 11, 11, 10, 10)
+BANDS = tuple(
+    (sum(BAND_WIDTHS[:index]), (1 << width) - 1) for index, width in enumerate(BAND_WIDTHS)
+)
+NEAR_DISTANCE = len(BANDS) - 1
+# Les mots surtout faits de chiffres (numéro, dates, montants) distinguent deux
+# factures d'une même mise en page: sur le corpus data_source, deux factures d'un
+# même fournisseur sont à 9 bits ou plus, une facture relue avec quelques erreurs
+# d'OCR presque toujours à 5 bits ou moins
+NUMERIC_TOKEN_WEIGHT = 8
+
+WORD_PATTERN = re.compile(r'\w+')
+DIGIT_PATTERN = re.compile(r'\d')
+INVOICE_NUMBER_NOISE = re.compile(r'[\W_]+')
+CENTS = Decimal('0.01')
+
+
+def normalize_date(value):
+    """
+    Return a date (date object or text) as YYYY-MM-DD, or ''
+    """
+    return parse_date(value) or ''
+
+
+def normalize_amount(value):
+    amount = parse_amount(value)
+    return str(amount.quantize(CENTS)) if amount is not None else ''
+
+
+def duplicate_key(supplier_tax_id, invoice_number, total_amount, invoice_date, supplier_name=''):
+    """
+    Hash the exact identity of an invoice, or '' when one of its parts is missing
+    """
+    # Sans identifiant fiscal, le nom du fournisseur tient lieu d'identifiant
+    supplier = ''.join(str(supplier_tax_id or '').split()).upper() or ' '.join(str(supplier_name or '').split()).upper()
+    number = INVOICE_NUMBER_NOISE.sub('', str(invoice_number or '')).upper()
+    parts = (supplier, number, normalize_amount(total_amount), normalize_date(invoice_date))
+    if not all(parts):
+        return ''
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def invoice_duplicate_key(invoice):
+    return duplicate_key(
+        invoice.supplier.tax_id, invoice.invoice_number, invoice.total_amount, invoice.date,
+        supplier_name=invoice.supplier.name
+    )
+
+
+def simhash(text):
+    """
+    64-bit SimHash of a text over its distinct lowercased words
+    """
+    words = sorted(set(WORD_PATTERN.findall(text.lower())))
+    if not words:
+        return 0
+    digests = b''.join(hashlib.blake2b(word.encode('utf-8'), digest_size=8).digest() for word in words)
+    weights = np.array([
+        NUMERIC_TOKEN_WEIGHT if len(DIGIT_PATTERN.findall(word)) * 2 >= len(word) else 1 for word in words
+    ])
+    # Chaque bit de l'empreinte est le vote pondéré de ce bit sur les hachés des mots
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(len(words), 8), axis=1)
+    votes = (bits * weights[:, None]).sum(axis=0) * 2 > weights.sum()
+    return int.from_bytes(np.packbits(votes).tobytes(), 'big')
+
+
+def format_fingerprint(fingerprint):
+    # Chaîne hexadécimale: un entier de 64 bits perd sa précision en JavaScript
+    return format(fingerprint, '016x')
+
+
+def parse_fingerprint(value):
+    try:
+        return int(value, 16) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def to_signed(fingerprint):
+    """
+    Store an unsigned 64-bit fingerprint in a signed BigIntegerField
+    """
+    return fingerprint - (1 << FINGERPRINT_BITS) if fingerprint >= 1 << (FINGERPRINT_BITS - 1) else fingerprint
+
+
+def to_unsigned(value):
+    return value % (1 << FINGERPRINT_BITS)
+
+
+def fingerprint_bands(fingerprint):
+    return [(index, (fingerprint >> shift) & mask) for index, (shift, mask) in enumerate(BANDS)]
+
+
+class DuplicateIndex:
+    """
+    In-memory index of saved invoices by duplicate key and text fingerprint.
+
+    Loaded on first use in each process, then completed every
+    DUPLICATE_INDEX_REFRESH_SECONDS with the invoices saved since (by id);
+    invoices saved or deleted in this process are applied at once.
+    """
+
+    def __init__(self):
+        self._keys = None
+        self._bands = None
+        self._entries = None
+        self._last_id = 0
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def find(self, key, fingerprint=None):
+        """
+        Return (invoice id, 'exact' or 'near') of a saved duplicate, or None
+        """
+        with self._lock:
+            self._sync()
+            if key and key in self._keys:
+                return self._keys[key], 'exact'
+            if fingerprint is None:
+                return None
+            best = None
+            for band in fingerprint_bands(fingerprint):
+                for invoice_id, candidate in self._bands.get(band, {}).items():
+                    distance = (candidate ^ fingerprint).bit_count()
+                    if distance <= NEAR_DISTANCE and (best is None or (distance, invoice_id) < best):
+                        best = (distance, invoice_id)
+            return (best[1], 'near') if best is not None else None
+
+    def add(self, invoice_id, key, fingerprint=None):
+        with self._lock:
+            if self._entries is not None:
+                self._add(invoice_id, key, fingerprint)
+
+    def remove(self, invoice_id):
+        with self._lock:
+            if self._entries is not None:
+                self._remove(invoice_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+    def _sync(self):
+        from .models import Invoice
+
+        if self._entries is None:
+            self._keys, self._bands, self._entries = {}, {}, {}
+            self._last_id = 0
+        elif time.monotonic() - self._refreshed_at < settings.DUPLICATE_INDEX_REFRESH_SECONDS:
+            return
+        rows = (
+            Invoice.objects.filter(id__gt=self._last_id).order_by('id')
+            .values_list('id', 'duplicate_key', 'text_fingerprint')
+            .iterator()
+        )
+        for invoice_id, key, fingerprint in rows:
+            self._add(invoice_id, key, None if fingerprint is None else to_unsigned(fingerprint))
+        self._refreshed_at = time.monotonic()
+
+    def _add(self, invoice_id, key, fingerprint):
+        if invoice_id in self._entries:
+            self._remove(invoice_id)
+        self._entries[invoice_id] = (key, fingerprint)
+        self._last_id = max(self._last_id, invoice_id)
+        if key:
+            # En cas de doublons existants, la facture la plus ancienne est retenue
+            self._keys.setdefault(key, invoice_id)
+        if fingerprint is not None:
+            for band in fingerprint_bands(fingerprint):
+                self._bands.setdefault(band, {})[invoice_id] = fingerprint
+
+    def _remove(self, invoice_id):
+        key, fingerprint = self._entries.pop(invoice_id, ('', None))
+        if key and self._keys.get(key) == invoice_id:
+            del self._keys[key]
+        if fingerprint is not None:
+            for band in fingerprint_bands(fingerprint):
+                del self._bands[band][invoice_id]
+
+
+duplicate_index = DuplicateIndex()
+
+
+def find_duplicate(result, supplier_match=None):
+    """
+    Look up a saved invoice matching an extraction payload, for the upload endpoints.
+
+    The key uses the saved supplier the payload was matched to (see
+    api.supplier_resolver.match_supplier), as saving the invoice would.
+    """
+    from .models import Invoice
+
+    data = result.get('extracted_data') or {}
+    supplier = supplier_match or data.get('supplier') or {}
+    key = duplicate_key(
+        supplier.get('tax_id'), data.get('invoice_number'), data.get('total_amount'), data.get('date'),
+        supplier_name=supplier.get('name')
+    )
+    match = duplicate_index.find(key, parse_fingerprint(result.get('text_fingerprint')))
+    if match is None:
+        return None
+    invoice_id, kind = match
+    # Une facture supprimée par un autre processus peut rester dans l'index jusqu'au rechargement
+    if not Invoice.objects.filter(id=invoice_id).exists():
+        duplicate_index.remove(invoice_id)
+        return find_duplicate(result, supplier_match)
+    return {'invoice_id': invoice_id, 'match': kind}
@@ -0,0 +1,94 @@
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+class ExtractionCache:
+    """
+    Two-tier cache of extraction results keyed by file hash and model version.
+
+    The memory tier is a bounded LRU local to the process; the disk tier is
+    shared by every worker and survives restarts.
+    """
+
+    def __init__(self, max_entries, directory):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, digest, model_version):
+        key = (digest, model_version)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.memory_hits += 1
+                return self.entries[key]
+
+        try:
+            with open(self._path(digest, model_version), encoding='utf-8') as cache_file:
+                value = json.load(cache_file)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.disk_hits += 1
+            self._remember(key, value)
+        return value
+
+    def set(self, digest, model_version, value):
+        with self.lock:
+            self._remember((digest, model_version), value)
+
+        path = self._path(digest, model_version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique: un autre worker ne doit jamais lire un fichier partiel
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump(value, cache_file)
+        os.replace(tmp_path, path)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses
+            }
+
+    def _remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _path(self, digest, model_version):
+        return os.path.join(self.directory, model_version, digest[:2], f"{digest}.json")
+
+
+def get_active_model_version():
+    from .models import MLModel
+
+    version = MLModel.objects.filter(is_active=True).values_list('version', flat=True).first()
+    return version or 'none'
+
+
+extraction_cache = ExtractionCache(
+    max_entries=settings.EXTRACTION_CACHE_SIZE,
+    directory=settings.EXTRACTION_CACHE_DIR
+)
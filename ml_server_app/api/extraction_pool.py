@@ -0,0 +1,81 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+_executor_lock = threading.Lock()
+# Connexions copiées du processus parent par fork: gardées en référence dans le
+# worker, leur fermeture au ramasse-miettes couperait les sockets du parent
+_inherited_connections = []
+# Vrai dans les workers du pool (voir init_worker)
+_in_worker = False
+
+
+def pool_size():
+    return settings.EXTRACTION_WORKERS or os.cpu_count() or 1
+
+
+def is_pool_worker():
+    return _in_worker
+
+
+def init_worker():
+    """
+    Set up Django in a pool worker and drop the database connections inherited from the parent
+    """
+    global _in_worker
+    _in_worker = True
+    # Sans effet après un fork; indispensable avec 'forkserver' ou 'spawn', qui réimportent les modules
+    django.setup()
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None:
+            _inherited_connections.append(connection.connection)
+            # Le worker ouvre sa propre connexion à la première requête
+            connection.connection = None
+
+
+def get_executor():
+    """
+    Return the process-wide extraction pool, created on first use
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=pool_size(),
+                mp_context=multiprocessing.get_context(settings.EXTRACTION_START_METHOD),
+                initializer=init_worker
+            )
+        return _executor
+
+
+def micro_batches(file_paths):
+    """
+    Split paths into micro-batches of at most INFERENCE_BATCH_SIZE files,
+    small enough for every worker to get one
+    """
+    size = max(1, min(settings.INFERENCE_BATCH_SIZE, math.ceil(len(file_paths) / pool_size())))
+    return [file_paths[start:start + size] for start in range(0, len(file_paths), size)]
+
+
+def extract_many(file_paths):
+    """
+    Extract several files in parallel, returning results in input order
+    """
+    # Seuls les chemins transitent vers les workers, qui projettent les fichiers
+    # en mémoire: les documents ne sont jamais sérialisés entre processus.
+    # Chaque worker reçoit un micro-lot, dont toutes les lignes sont évaluées
+    # par le modèle en un seul appel
+    from .ml_processor import extract_invoice_results
+
+    executor = get_executor()
+    results = []
+    for batch in executor.map(extract_invoice_results, micro_batches(file_paths)):
+        results.extend(batch)
+    return results
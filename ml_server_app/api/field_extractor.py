@@ -0,0 +1,265 @@
+import re
+from collections import namedtuple
+
+from .line_items import LineItemTable, parse_number
+from .normalization import parse_amount as parse_decimal
+
+# Montant avec ou sans séparateurs de milliers: "1400,58", "1 400,58", "1.400,58"
+AMOUNT = r'(?:\d{1,3}(?:[ .\u00a0\u202f]\d{3})+|\d+)[.,]\d{2}'
+DATE = r'\d{1,2}/\d{1,2}/\d{4}'
+
+
+def parse_amount(value):
+    # Nombre à virgule flottante dans la réponse JSON; Decimal à l'enregistrement
+    amount = parse_decimal(value)
+    return float(amount) if amount is not None else None
+
+
+def parse_text(value):
+    return value.strip()
+
+
+# Une règle associe un champ du résultat (chemin pointé) à un mot-clé suivi
+# d'un motif dont le premier groupe capture la valeur. Les règles sans motif
+# sont des marqueurs de section.
+FieldRule = namedtuple('FieldRule', ['field', 'keyword', 'value', 'convert'])
+
+# Table déclarative des règles. Les mots-clés sont en minuscules et combinés
+# dans une seule alternance: l'ordre compte, le premier qui correspond gagne,
+# ce qui empêche par exemple "Sous-total:" d'être lu comme "TOTAL:".
+FIELD_RULES = (
+    FieldRule('invoice_number', 'facture n°', r'\s*([A-Za-z0-9\-_/]+)', parse_text),
+    FieldRule('due_date', 'échéance:', r'\s*(' + DATE + ')', parse_text),
+    FieldRule('date', 'date:', r'\s*(' + DATE + ')', parse_text),
+    FieldRule('items_start', 'description', None, None),
+    FieldRule('items_end', 'sous-total', None, None),
+    FieldRule('total_amount', 'total:', r'\s*(' + AMOUNT + ')', parse_amount),
+    FieldRule('tax_amount', 'tva', r'[^:]*:\s*(' + AMOUNT + ')', parse_amount),
+    FieldRule('supplier.tax_id', 'siret:', r'\s*(\d+)', parse_text),
+)
+
+# Taux de TVA du document ("TVA (20%):"), cherché après le tableau pour les lignes sans taux
+TAX_RATE_PATTERN = re.compile(r'\btva\b[^%\n]{0,20}?(\d+(?:[.,]\d+)?)[ \t]*%', re.IGNORECASE)
+ADDRESS_PATTERN = re.compile(r'\d+\s+rue', re.IGNORECASE)
+LINE_PATTERN = re.compile(r'[^\n]+')
+
+# Nombre de lignes après le nom du fournisseur dans lesquelles on cherche l'adresse
+ADDRESS_WINDOW = 2
+# Caractères après la fin du tableau dans lesquels on cherche le taux de TVA
+TAX_RATE_WINDOW = 500
+DEFAULT_TAX_RATE = 20.0
+
+
+class RuleScanner:
+    """
+    Precompiled scanner locating every rule of a table in a single pass.
+
+    The keywords are matched case-sensitively against the lowercased text:
+    a plain literal alternation lets the regex engine skip ahead quickly,
+    which IGNORECASE or capture groups would prevent. Values are then
+    matched in place, anchored right after their keyword.
+    """
+
+    def __init__(self, rules):
+        self.rules = {rule.keyword: rule for rule in rules}
+        self.values = {
+            rule.keyword: re.compile(rule.value, re.IGNORECASE)
+            for rule in rules if rule.value is not None
+        }
+        alternation = '|'.join(re.escape(rule.keyword) for rule in rules)
+        self.keywords = re.compile(alternation)
+        self.keywords_ignorecase = re.compile(alternation, re.IGNORECASE)
+
+    def scan(self, text):
+        """
+        Yield (rule, value, start) for each rule occurrence, in text order
+        """
+        folded = text.lower()
+        if len(folded) == len(text):
+            matches = self.keywords.finditer(folded)
+        else:
+            # Certaines majuscules changent de longueur en minuscules: on
+            # perdrait l'alignement des positions avec le texte d'origine
+            matches = self.keywords_ignorecase.finditer(text)
+
+        for match in matches:
+            keyword = match.group().lower()
+            rule = self.rules[keyword]
+            value_pattern = self.values.get(keyword)
+            if value_pattern is None:
+                yield rule, None, match.start()
+                continue
+            value_match = value_pattern.match(text, match.end())
+            if value_match:
+                value = rule.convert(value_match.group(1))
+                # Valeur illisible ("1.400.58"): le champ reste à trouver plus loin
+                if value is not None:
+                    yield rule, value, match.start()
+
+    def claims(self, line):
+        return next(self.scan(line), None) is not None
+
+
+SCANNER = RuleScanner(FIELD_RULES)
+
+
+def empty_result():
+    return {
+        'invoice_number': None,
+        'date': None,
+        'due_date': None,
+        'total_amount': None,
+        'tax_amount': None,
+        'supplier': {
+            'name': None,
+            'address': None,
+            'tax_id': None
+        },
+        'items': []
+    }
+
+
+class FieldExtractor:
+    """
+    Single-pass, rule-driven invoice field extractor.
+
+    Text can be fed in several chunks (e.g. one per page); `feed` returns
+    True once every field has been resolved so that callers can stop
+    reading the document.
+    """
+
+    def __init__(self, scanner=SCANNER, supplier=None):
+        self.scanner = scanner
+        self.data = empty_result()
+        self.pending = {rule.field for rule in scanner.rules.values() if rule.convert is not None}
+        self.in_items = False
+        self.items_done = False
+        self.items_table = None
+        self.tax_rate = DEFAULT_TAX_RATE
+        self.address_window = None
+        self.address_line = None
+        self.done = False
+        if supplier is not None:
+            # Fournisseur déjà connu (modèle de mise en page): l'en-tête n'est pas analysé
+            self.data['supplier'].update(supplier)
+            self.pending -= {f'supplier.{key}' for key, value in supplier.items() if value}
+            self.address_window = 0
+
+    def feed(self, text):
+        if self.done:
+            return True
+        if not self._supplier_resolved():
+            self._scan_supplier(text)
+
+        # Un seul parcours du texte par l'alternance précompilée
+        items_start = 0
+        for rule, value, position in self.scanner.scan(text):
+            if rule.field == 'items_start':
+                if not self.in_items and not self.items_done:
+                    self.in_items = True
+                    self.items_table = LineItemTable()
+                    # Le tableau est lu depuis sa ligne d'en-tête, qui donne les colonnes
+                    items_start = text.rfind('\n', 0, position) + 1
+            elif rule.field == 'items_end':
+                if self.in_items:
+                    self._scan_items(text, items_start, position)
+                    self.in_items = False
+                    self.items_done = True
+                    tax_rate = TAX_RATE_PATTERN.search(text, position, position + TAX_RATE_WINDOW)
+                    if tax_rate:
+                        self.tax_rate = parse_number(tax_rate.group(1))
+            elif rule.field in self.pending:
+                self._set(rule, value)
+
+            if self._is_complete():
+                self.done = True
+                return True
+
+        if self.in_items:
+            # Le tableau continue sur la page suivante
+            self._scan_items(text, items_start, len(text))
+        return self.done
+
+    def result(self):
+        if self.items_table is not None:
+            self.items_table.finish(self.tax_rate)
+        if self.data['supplier']['address'] is None:
+            self.data['supplier']['address'] = self.address_line or ''
+        return self.data
+
+    def _set(self, rule, value):
+        self.pending.discard(rule.field)
+        target = self.data
+        *parents, key = rule.field.split('.')
+        for parent in parents:
+            target = target[parent]
+        target[key] = value
+
+    def _scan_items(self, text, start, end):
+        # Lignes lues une à une dans la page: rien n'est copié du tableau
+        self.data['items'].extend(self.items_table.parse(text, start, end))
+
+    def _scan_supplier(self, text):
+        # Seules les premières lignes de l'en-tête sont parcourues
+        supplier = self.data['supplier']
+        for line_match in LINE_PATTERN.finditer(text):
+            line = line_match.group().strip()
+            if not line:
+                continue
+            if self.address_line is not None:
+                supplier['address'] = f"{self.address_line}, {line}"
+            elif not self.scanner.claims(line):
+                self._update_supplier(line)
+            if self._supplier_resolved():
+                break
+
+    def _update_supplier(self, line):
+        supplier = self.data['supplier']
+        if supplier['name'] is None:
+            # Première ligne libre de l'en-tête: le nom du fournisseur
+            supplier['name'] = line
+            self.address_window = ADDRESS_WINDOW
+        elif self.address_window:
+            self.address_window -= 1
+            if ADDRESS_PATTERN.search(line):
+                self.address_line = line
+                self.address_window = 0
+
+    def _supplier_resolved(self):
+        return (
+            self.data['supplier']['name'] is not None
+            and self.address_window == 0
+            and (self.address_line is None or self.data['supplier']['address'] is not None)
+        )
+
+    def _is_complete(self):
+        return not self.pending and self.items_done and self._supplier_resolved()
+
+
+def extract_fields(text, extractor_for=None):
+    """
+    Run the single-pass extractor over a document text or an iterable of pages.
+
+    `extractor_for`, when given, picks the extractor from the first page
+    (e.g. a supplier template); the generic rules are used otherwise.
+    """
+    select = extractor_for or (lambda first_page: FieldExtractor())
+    if isinstance(text, str):
+        extractor = select(text)
+        extractor.feed(text)
+        return extractor.result()
+
+    extractor = None
+    pages = iter(text)
+    try:
+        for page in pages:
+            if extractor is None:
+                extractor = select(page)
+            if extractor.feed(page):
+                break
+    finally:
+        # Libère le lecteur de pages dès l'arrêt anticipé
+        close = getattr(pages, 'close', None)
+        if close is not None:
+            close()
+    return (extractor or FieldExtractor()).result()
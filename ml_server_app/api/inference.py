@@ -0,0 +1,171 @@
+import os
+import re
+import zlib
+
+import numpy as np
+
+# Étiquettes de ligne prédites par le modèle ('other': ligne sans intérêt)
+LINE_LABELS = (
+    'other', 'invoice_number', 'date', 'due_date', 'total_amount',
+    'tax_amount', 'supplier_name', 'supplier_tax_id', 'item',
+)
+# Jetons hachés dans HASH_DIM colonnes, suivis de quelques traits numériques par ligne
+HASH_DIM = 1024
+DENSE_FEATURES = ('position', 'digit_ratio', 'length')
+FEATURE_DIM = HASH_DIM + len(DENSE_FEATURES)
+
+TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+DIGIT_PATTERN = re.compile(r'\d')
+
+
+def split_lines(text):
+    return [line.strip() for line in text.split('\n') if line.strip()]
+
+
+def token_buckets(tokens):
+    """
+    Hash columns of a list of tokens
+    """
+    # crc32 plutôt que hash(): les colonnes doivent être stables d'un processus à l'autre
+    return np.fromiter(
+        (zlib.crc32(token.encode('utf-8')) % HASH_DIM for token in tokens), dtype=np.intp, count=len(tokens)
+    )
+
+
+def shape_buckets(tokens):
+    """
+    Hash columns of the digit shape of each token ("15/01" -> "00/00"), -1 for tokens without digits
+    """
+    shapes = ['#' + DIGIT_PATTERN.sub('0', token) if DIGIT_PATTERN.search(token) else None for token in tokens]
+    return np.fromiter(
+        (zlib.crc32(shape.encode('utf-8')) % HASH_DIM if shape else -1 for shape in shapes),
+        dtype=np.intp, count=len(shapes)
+    )
+
+
+def featurize_documents(texts):
+    """
+    Build one feature matrix for the lines of several documents.
+
+    Returns the (lines, FEATURE_DIM) float32 matrix, the document index of
+    each row and the lines themselves.
+    """
+    lines = []
+    line_counts = np.empty(len(texts), dtype=np.intp)
+    for index, text in enumerate(texts):
+        document_lines = split_lines(text)
+        lines.extend(document_lines)
+        line_counts[index] = len(document_lines)
+
+    # Les jetons sont numérotés au fil de la lecture: hachage et forme ne sont
+    # calculés qu'une fois par jeton distinct du lot
+    vocabulary = {}
+    token_ids = []
+    token_counts = np.empty(len(lines), dtype=np.intp)
+    for index, line in enumerate(lines):
+        tokens = TOKEN_PATTERN.findall(line.lower())
+        token_ids.extend([vocabulary.setdefault(token, len(vocabulary)) for token in tokens])
+        token_counts[index] = len(tokens)
+
+    rows = len(lines)
+    documents = np.repeat(np.arange(len(texts)), line_counts)
+    features = np.zeros((rows, FEATURE_DIM), dtype=np.float32)
+    if token_ids:
+        token_ids = np.array(token_ids, dtype=np.intp)
+        token_rows = np.repeat(np.arange(rows), token_counts)
+        shapes = shape_buckets(list(vocabulary))[token_ids]
+        has_shape = shapes >= 0
+        # Comptage des jetons et de leurs formes de toutes les lignes en un seul appel
+        np.add.at(
+            features,
+            (np.concatenate((token_rows, token_rows[has_shape])),
+             np.concatenate((token_buckets(list(vocabulary))[token_ids], shapes[has_shape]))),
+            1.0
+        )
+        hashed = features[:, :HASH_DIM]
+        norms = np.linalg.norm(hashed, axis=1, keepdims=True)
+        np.divide(hashed, norms, out=hashed, where=norms > 0)
+
+    if rows:
+        starts = np.repeat(np.cumsum(line_counts) - line_counts, line_counts)
+        lengths = np.fromiter((len(line) for line in lines), dtype=np.float32, count=rows)
+        digits = np.fromiter((len(DIGIT_PATTERN.findall(line)) for line in lines), dtype=np.float32, count=rows)
+        features[:, HASH_DIM] = (np.arange(rows) - starts) / np.repeat(np.maximum(line_counts, 1), line_counts)
+        features[:, HASH_DIM + 1] = digits / lengths
+        features[:, HASH_DIM + 2] = np.minimum(lengths / 100, 1)
+    return features, documents, lines
+
+
+class LineModel:
+    """
+    Linear line classifier scoring every line of a batch in one matrix product
+    """
+
+    def __init__(self, weights, bias, labels=LINE_LABELS):
+        self.weights = np.asanyarray(weights, dtype=np.float32)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.labels = tuple(str(label) for label in labels)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a model saved as a directory (weights memory-mapped) or as a .npz archive
+        """
+        if os.path.isdir(path):
+            # Les poids restent dans le cache de pages du système, partagés entre workers
+            weights = np.load(os.path.join(path, 'weights.npy'), mmap_mode='r')
+            bias = np.load(os.path.join(path, 'bias.npy'))
+            labels = np.load(os.path.join(path, 'labels.npy'))
+            return cls(weights, bias, labels)
+        with np.load(path, allow_pickle=False) as archive:
+            return cls(archive['weights'], archive['bias'], archive['labels'])
+
+    def save(self, path):
+        if path.endswith('.npz'):
+            np.savez(path, weights=self.weights, bias=self.bias, labels=np.array(self.labels))
+            return
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'weights.npy'), self.weights)
+        np.save(os.path.join(path, 'bias.npy'), self.bias)
+        np.save(os.path.join(path, 'labels.npy'), np.array(self.labels))
+
+    @property
+    def is_mapped(self):
+        return isinstance(self.weights, np.memmap)
+
+    @property
+    def nbytes(self):
+        return self.weights.nbytes + self.bias.nbytes
+
+    def predict_proba(self, features):
+        logits = features @ self.weights + self.bias
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def predict_documents(self, texts):
+        """
+        Return, for each document, the best scoring line of each label
+        """
+        predictions = [{} for _ in texts]
+        features, documents, lines = featurize_documents(texts)
+        if not lines:
+            return predictions
+
+        probabilities = self.predict_proba(features)
+        labels = probabilities.argmax(axis=1)
+        scores = probabilities[np.arange(len(lines)), labels]
+
+        # Meilleure ligne par (document, étiquette): tri puis première occurrence de chaque paire
+        keep = labels != self.labels.index('other') if 'other' in self.labels else np.ones(len(lines), dtype=bool)
+        rows = np.flatnonzero(keep)
+        order = rows[np.lexsort((-scores[rows], labels[rows], documents[rows]))]
+        pairs = documents[order] * len(self.labels) + labels[order]
+        _, first = np.unique(pairs, return_index=True)
+        for row in order[first]:
+            predictions[documents[row]][self.labels[labels[row]]] = {
+                'line': lines[row],
+                'score': round(float(scores[row]), 4)
+            }
+        return predictions
@@ -0,0 +1,158 @@
+from functools import partial
+
+from django.db import transaction
+
+from .duplicates import duplicate_index, duplicate_key, parse_fingerprint, to_signed, to_unsigned
+from .models import Invoice, Supplier, InvoiceItem, TrainingData
+from .normalization import normalize_items, parse_amount, parse_date
+from .stats import record_stats_change
+from .supplier_resolver import is_same_supplier, normalize_name, supplier_resolver, tax_keys
+
+
+def resolve_suppliers(suppliers_data):
+    """
+    Map the suppliers of a batch to existing suppliers, or new ones, in three queries.
+
+    Suppliers are matched by tax id, then by similar name (see
+    api.supplier_resolver): OCR and spelling variants of a name reuse the
+    existing supplier instead of creating a duplicate.
+    """
+    # Fournisseurs créés entre-temps par les autres processus: une requête sur les ids récents
+    supplier_resolver.refresh()
+    matches = [supplier_resolver.resolve(data.get('tax_id'), data.get('name')) for data in suppliers_data]
+    existing = Supplier.objects.in_bulk({match[0] for match in matches if match is not None})
+
+    suppliers = []
+    missing = {}
+    for supplier_data, match in zip(suppliers_data, matches):
+        name, tax_id = supplier_data.get('name'), supplier_data.get('tax_id')
+        supplier = existing.get(match[0]) if match is not None else None
+        if supplier is not None and not is_same_supplier(supplier, tax_id, name):
+            supplier = None
+        if supplier is None:
+            # Variantes d'un même nouveau fournisseur dans le lot: un seul est créé
+            keys = tax_keys(tax_id)
+            key = keys[-1] if keys else normalize_name(name)
+            if key not in missing:
+                missing[key] = Supplier(name=name, address=supplier_data.get('address', ''), tax_id=tax_id or '')
+            supplier = missing[key]
+        suppliers.append(supplier)
+    created = Supplier.objects.bulk_create(missing.values())
+    # bulk_create ne déclenche pas les signaux: le résolveur est complété au commit
+    transaction.on_commit(partial(add_to_supplier_resolver, created))
+    return suppliers
+
+
+def add_to_supplier_resolver(suppliers):
+    for supplier in suppliers:
+        supplier_resolver.add(supplier.id, supplier.name, supplier.tax_id)
+
+
+def payload_duplicate_key(data, supplier):
+    invoice_data = data.get('invoice', {})
+    # Fournisseur rapproché (SIREN, nom voisin): sa clé est celle que calcule
+    # invoice_duplicate_key quand la facture est de nouveau enregistrée
+    return duplicate_key(
+        supplier.tax_id,
+        invoice_data.get('invoice_number'),
+        invoice_data.get('total_amount'),
+        invoice_data.get('date'),
+        supplier_name=supplier.name
+    )
+
+
+def add_to_duplicate_index(invoices):
+    for invoice in invoices:
+        fingerprint = invoice.text_fingerprint
+        duplicate_index.add(invoice.id, invoice.duplicate_key, None if fingerprint is None else to_unsigned(fingerprint))
+
+
+def save_corrected_invoices(payloads):
+    """
+    Persist corrected invoices with their items and training data.
+
+    Invoices already saved (same supplier tax id, number, total and date,
+    in the database or earlier in the batch) are skipped: returns the
+    created invoices and {payload index: id of the existing invoice}.
+
+    The number of queries does not depend on the number of invoices or
+    items (beyond the backend's own bulk_create batching on very large
+    batches); callers are expected to wrap this in a transaction.
+    """
+    suppliers = resolve_suppliers([data.get('supplier', {}) for data in payloads])
+    keys = [payload_duplicate_key(data, supplier) for data, supplier in zip(payloads, suppliers)]
+    # Index sur duplicate_key: une requête pour tout le lot, dans la transaction de l'appelant
+    existing = dict(
+        Invoice.objects.filter(duplicate_key__in={key for key in keys if key})
+        .order_by('-id').values_list('duplicate_key', 'id')
+    )
+
+    invoices = []
+    created_payloads = []
+    duplicates = {}
+    batch_keys = {}
+    for index, (data, supplier, key) in enumerate(zip(payloads, suppliers, keys)):
+        if key in existing:
+            duplicates[index] = existing[key]
+            continue
+        if key in batch_keys:
+            duplicates[index] = batch_keys[key]
+            continue
+        invoice_data = data.get('invoice', {})
+        fingerprint = parse_fingerprint(data.get('text_fingerprint'))
+        # Montants et dates tels qu'affichés ("1 400,58", "15/01/2025"): Decimal et ISO
+        invoices.append(Invoice(
+            invoice_number=invoice_data.get('invoice_number'),
+            date=parse_date(invoice_data.get('date')),
+            due_date=parse_date(invoice_data.get('due_date')),
+            supplier=supplier,
+            total_amount=parse_amount(invoice_data.get('total_amount')),
+            tax_amount=parse_amount(invoice_data.get('tax_amount')) or 0,
+            status='validated',
+            original_file=data.get('file_path', ''),
+            duplicate_key=key,
+            text_fingerprint=None if fingerprint is None else to_signed(fingerprint)
+        ))
+        created_payloads.append(data)
+        if key:
+            # Les identifiants ne sont connus qu'après bulk_create: l'objet en tient lieu
+            batch_keys[key] = invoices[-1]
+    invoices = Invoice.objects.bulk_create(invoices)
+    duplicates = {
+        index: invoice.id if isinstance(invoice, Invoice) else invoice
+        for index, invoice in duplicates.items()
+    }
+
+    # Colonnes de montants des articles de tout le lot normalisées d'un bloc
+    items_data = normalize_items([
+        {**item_data, 'invoice': invoice} for invoice, data in zip(invoices, created_payloads)
+        for item_data in data.get('items', [])
+    ])
+    items = [
+        InvoiceItem(
+            invoice=item_data['invoice'],
+            description=item_data.get('description'),
+            quantity=item_data['quantity'],
+            unit_price=item_data['unit_price'],
+            total_price=item_data['total_price'],
+            tax_rate=item_data['tax_rate'] or 0
+        )
+        for item_data in items_data
+    ]
+    training_data = []
+    for invoice, data in zip(invoices, created_payloads):
+        training_data.append(TrainingData(
+            invoice=invoice,
+            original_extraction=data.get('original_extraction', {}),
+            corrected_extraction={
+                'invoice': data.get('invoice', {}),
+                'supplier': data.get('supplier', {}),
+                'items': data.get('items', [])
+            }
+        ))
+    InvoiceItem.objects.bulk_create(items)
+    TrainingData.objects.bulk_create(training_data)
+    record_stats_change(total_invoices=len(invoices), training_data_count=len(training_data))
+    # bulk_create ne déclenche pas les signaux: l'index des doublons est mis à jour au commit
+    transaction.on_commit(partial(add_to_duplicate_index, invoices))
+    return invoices, duplicates
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .extraction_cache import extraction_cache
+from .ml_processor import extract_invoice_result
+from .models import ExtractionJob
+
+
+def claim_next_job():
+    """
+    Atomically claim the oldest pending extraction job, if any.
+
+    A job left running past EXTRACTION_JOB_TIMEOUT_SECONDS (its worker
+    died) is claimed again, until EXTRACTION_JOB_MAX_ATTEMPTS is reached.
+    """
+    now = timezone.now()
+    stale = Q(status='running', started_at__lt=now - timedelta(seconds=settings.EXTRACTION_JOB_TIMEOUT_SECONDS))
+    with transaction.atomic():
+        # Un job qui a fait tomber tous ses workers n'est plus repris, ni son fichier gardé
+        abandoned = ExtractionJob.objects.filter(stale, attempts__gte=settings.EXTRACTION_JOB_MAX_ATTEMPTS)
+        files = [job.file for job in abandoned.only('id', 'file')]
+        abandoned.update(
+            status='failed',
+            error="Abandonné après plusieurs tentatives interrompues",
+            finished_at=now,
+            file=''
+        )
+        for file in files:
+            if file:
+                file.delete(save=False)
+
+        queryset = ExtractionJob.objects.filter(Q(status='pending') | stale).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            # Postgres: les workers concurrents sautent les lignes déjà verrouillées
+            queryset = queryset.select_for_update(skip_locked=True)
+        job = queryset.first()
+        if job is None:
+            return None
+
+        # Sous SQLite il n'y a pas de verrou de ligne: la mise à jour
+        # conditionnelle garantit qu'un seul worker obtient le job (started_at
+        # départage les workers qui reprennent le même job expiré)
+        claimed = ExtractionJob.objects.filter(id=job.id, status=job.status, started_at=job.started_at).update(
+            status='running',
+            started_at=now,
+            attempts=F('attempts') + 1
+        )
+        if not claimed:
+            return None
+
+    job.refresh_from_db()
+    return job
+
+
+def run_job(job):
+    """
+    Extract a claimed job's file and store the result on the job
+    """
+    try:
+        result = extract_invoice_result(job.file.path)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+    else:
+        job.status = 'done'
+        job.result = result
+        extraction_cache.set(job.digest, job.model_version, result)
+
+    job.finished_at = timezone.now()
+    # Le fichier n'est plus utile une fois le résultat enregistré
+    job.file.delete(save=False)
+    job.save(update_fields=['status', 'result', 'error', 'finished_at', 'file'])
+    return job
@@ -0,0 +1,273 @@
+import re
+from itertools import combinations
+
+from .normalization import parse_amount
+
+# Intitulés de colonnes reconnus dans l'en-tête du tableau, du plus long au plus court
+COLUMN_LABELS = {
+    'description': ('description', 'désignation', 'designation', 'libellé', 'libelle', 'article', 'produit'),
+    'quantity': ('quantité', 'quantite', 'quantity', 'qté', 'qte', 'qty'),
+    'unit_price': ('prix unitaire', 'prix unit', 'unit price', 'p.u.', 'pu'),
+    'tax_rate': ('taux tva', 'taux de tva', 'tva', 'taux', 'vat'),
+    'total_price': ('montant', 'total', 'amount'),
+}
+LABEL_COLUMNS = {label: column for column, labels in COLUMN_LABELS.items() for label in labels}
+LABEL_PATTERN = re.compile(
+    r'(?<!\w)(?:' + '|'.join(re.escape(label) for label in sorted(LABEL_COLUMNS, key=len, reverse=True)) + r')(?!\w)',
+    re.IGNORECASE
+)
+# Mots qui complètent un intitulé sur les lignes suivantes de l'en-tête ("Prix unitaire\nHT")
+HEADER_QUALIFIERS = frozenset(('HT', 'TTC', 'HTVA', '€', 'EUR', 'N°', '%'))
+# Sans intitulé exploitable: colonnes du tableau d'exemple
+DEFAULT_COLUMNS = ('quantity', 'unit_price', 'total_price')
+NUMERIC_COLUMNS = frozenset(('quantity', 'unit_price', 'tax_rate', 'total_price'))
+
+# Cellule d'un tableau mis en page: mots séparés d'une seule espace
+CELL_PATTERN = re.compile(r'\S+(?:[ \u00a0\u202f]\S+)*')
+LINE_PATTERN = re.compile(r'[^\n]+')
+NUMBER_WORD = re.compile(r'^[-+]?\d[\d.,]*(%|€)?$')
+FOOTNOTE_WORD = re.compile(r'^(?:\(\d+\)|\*+)$')
+CURRENCY_WORDS = frozenset(('€', 'EUR', '$', '£'))
+THOUSANDS_HEAD = re.compile(r'^\d{1,3}(?: \d{3})*$')
+THOUSANDS_TAIL = re.compile(r'^\d{3}(?:[.,]\d+)?$')
+LETTER_PATTERN = re.compile(r'[^\W\d_]')
+
+# Regroupements de milliers essayés au plus par ligne ("1 000,50" écrit en deux mots)
+MAX_THOUSANDS_JOINS = 3
+# Écart toléré entre quantité × prix unitaire et total, pour départager les regroupements
+TOTAL_TOLERANCE = 0.02
+
+
+def parse_number(value):
+    """
+    Parse an amount, quantity or rate cell (see api.normalization), or return None
+    """
+    number = parse_amount(value)
+    return float(number) if number is not None else None
+
+
+def header_columns(line):
+    """
+    Return the (start, end, column) of each column label of a header line
+    """
+    return [
+        (match.start(), match.end(), LABEL_COLUMNS[match.group().lower()])
+        for match in LABEL_PATTERN.finditer(line)
+    ]
+
+
+class LineItemTable:
+    """
+    Line-item table parser, fed one chunk (page) of the table at a time.
+
+    Columns are inferred once, from the header: label positions when the
+    text keeps the page layout (columns separated by two spaces or more),
+    otherwise the label order, matched right to left against the trailing
+    numbers of each row. Every row is then parsed in a single pass over its
+    words. Rows without a tax rate column get the document rate (see
+    `finish`), and a row without description takes the text line above it.
+    """
+
+    def __init__(self):
+        self.columns = None
+        self.positions = None
+        self.header_open = False
+        self.description = None
+        self.untaxed = []
+
+    def parse(self, text, start, end):
+        """
+        Yield the items of text[start:end], the table header included on the first chunk
+        """
+        for line_match in LINE_PATTERN.finditer(text, start, end):
+            line = line_match.group()
+            if self.columns is None or self.header_open:
+                if self._read_header(line):
+                    continue
+            item = self._parse_row(line)
+            if item is None:
+                # Ligne de texte: description d'un article dont les montants suivent
+                if LETTER_PATTERN.search(line) and self.description is None:
+                    self.description = line.strip()
+                continue
+            self.description = None
+            if item['tax_rate'] is None:
+                self.untaxed.append(item)
+            yield item
+
+    def finish(self, tax_rate):
+        """
+        Give the rows without a tax rate the document rate
+        """
+        for item in self.untaxed:
+            item['tax_rate'] = tax_rate
+        self.untaxed = []
+
+    def _read_header(self, line):
+        labels = header_columns(line)
+        if self.columns is None:
+            self.columns = []
+            self.header_open = True
+            # Colonnes alignées: chaque intitulé est séparé du suivant par deux espaces au moins
+            if len(labels) >= 2 and all(
+                '  ' in line[previous[1]:label[0]] for previous, label in zip(labels, labels[1:])
+            ):
+                self.positions = labels
+                self.header_open = False
+            self.columns.extend(column for _, _, column in labels)
+            return True
+        # En-tête sur plusieurs lignes ("Prix Unitaire\nHT\nTaux TVA"): intitulés et qualificatifs seulement
+        others = LABEL_PATTERN.sub(' ', line).split()
+        if (labels or others) and all(word.upper() in HEADER_QUALIFIERS for word in others):
+            self.columns.extend(column for _, _, column in labels)
+            return True
+        self.header_open = False
+        return False
+
+    def _parse_row(self, line):
+        if self.positions is not None:
+            cells = self._positioned_cells(line)
+        else:
+            cells = self._ordered_cells(line)
+        if cells is None:
+            return None
+        description, values = cells
+        if values.get('total_price') is None or (values.get('unit_price') is None and values.get('quantity') is None):
+            return None
+        description = description or self.description
+        if not description:
+            return None
+
+        quantity, unit_price = values.get('quantity'), values.get('unit_price')
+        if quantity is None:
+            quantity = round(values['total_price'] / unit_price, 3) if unit_price else 1.0
+        if unit_price is None:
+            unit_price = round(values['total_price'] / quantity, 2) if quantity else values['total_price']
+        return {
+            'description': description,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': values['total_price'],
+            'tax_rate': values.get('tax_rate')
+        }
+
+    def _positioned_cells(self, line):
+        # Chaque cellule va à la colonne dont l'intitulé la chevauche le plus, sinon la plus proche
+        description = []
+        values = {}
+        for match in CELL_PATTERN.finditer(line):
+            start, end = match.span()
+            column = max(
+                self.positions,
+                key=lambda label: (min(end, label[1]) - max(start, label[0]), -abs(start - label[0]))
+            )[2]
+            if column == 'description':
+                description.append(match.group())
+            elif column not in values:
+                value = parse_number(match.group())
+                if value is None:
+                    return None
+                values[column] = value
+        return ' '.join(description), values
+
+    def _ordered_cells(self, line):
+        # Mots lus de droite à gauche: nombres de fin de ligne, puis description
+        words = line.split()
+        numbers = []
+        unit = ''
+        index = len(words)
+        while index:
+            word = words[index - 1]
+            if word == '%':
+                unit = '%'
+            elif word.upper() in CURRENCY_WORDS:
+                unit = '€'
+            elif not FOOTNOTE_WORD.match(word):
+                match = NUMBER_WORD.match(word)
+                if match is None:
+                    break
+                numbers.append((word.rstrip('%€'), unit or match.group(1) or '', index - 1))
+                unit = ''
+            index -= 1
+        if not numbers:
+            return None
+        columns = [column for column in self.columns if column in NUMERIC_COLUMNS] or list(DEFAULT_COLUMNS)
+        # Au-delà des colonnes et des regroupements permis, les nombres font partie de la description
+        numbers = numbers[:len(columns) + MAX_THOUSANDS_JOINS][::-1]
+        values, first_word = assign_numbers(numbers, columns)
+        return ' '.join(words[:first_word]), values
+
+
+def assign_numbers(numbers, columns):
+    """
+    Match the trailing (text, unit, word index) numbers of a row to the
+    numeric columns, returning the values and the index of the first word used.
+
+    Thousands groups written as separate words ("1 000,50") are joined,
+    as many as the extra numbers allow, when that makes quantity x unit
+    price equal the total; the numbers are otherwise taken as written.
+    """
+    joins = [
+        index for index in range(len(numbers) - 1)
+        if not numbers[index][1] and THOUSANDS_HEAD.match(numbers[index][0])
+        and THOUSANDS_TAIL.match(numbers[index + 1][0])
+    ]
+    surplus = len(numbers) - len(columns)
+    for count in range(min(surplus, len(joins), MAX_THOUSANDS_JOINS), 0, -1):
+        for chosen in combinations(joins, count):
+            if any(index + 1 in chosen for index in chosen):
+                continue
+            assigned = align_numbers(join_thousands(numbers, chosen), columns)
+            if is_consistent(assigned[0]):
+                return assigned
+    return align_numbers(numbers, columns)
+
+
+def join_thousands(numbers, chosen):
+    joined = []
+    for index, number in enumerate(numbers):
+        if index - 1 in chosen:
+            joined[-1] = (f'{joined[-1][0]} {number[0]}', number[1], joined[-1][2])
+        else:
+            joined.append(number)
+    return joined
+
+
+def align_numbers(numbers, columns):
+    """
+    Assign numbers to columns from the right: a percentage is the tax rate,
+    an amount in the tax column is the tax of the row (not kept), and when
+    the row has fewer numbers than columns the tax column is only filled by
+    a percentage
+    """
+    values = {}
+    exact = len(numbers) == len(columns)
+    remaining = len(columns)
+    first_word = numbers[-1][2] + 1 if numbers else 0
+    for text, unit, word in reversed(numbers):
+        if unit == '%':
+            if remaining and columns[remaining - 1] == 'tax_rate':
+                remaining -= 1
+            values['tax_rate'] = parse_number(text)
+        elif unit == '€' and remaining and columns[remaining - 1] == 'tax_rate':
+            remaining -= 1
+        else:
+            while not exact and remaining and columns[remaining - 1] == 'tax_rate':
+                remaining -= 1
+            if not remaining:
+                break
+            remaining -= 1
+            # Colonne en double ("Prix unitaire HT" puis "TTC"): la première l'emporte
+            values[columns[remaining]] = parse_number(text)
+        first_word = word
+    return values, first_word
+
+
+def is_consistent(values):
+    quantity, unit_price, total = values.get('quantity'), values.get('unit_price'), values.get('total_price')
+    if None in (quantity, unit_price, total):
+        return False
+    tolerance = max(TOTAL_TOLERANCE, abs(total) * 0.001)
+    # Prix unitaire HT et total TTC: le taux de la ligne fait la différence
+    rates = (0, values.get('tax_rate') or 0)
+    return any(abs(quantity * unit_price * (1 + rate / 100) - total) <= tolerance for rate in rates)
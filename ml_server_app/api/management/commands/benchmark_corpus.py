@@ -0,0 +1,91 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmark import compare_reports, corpus_files, run_benchmark
+from api.models import TrainingData
+
+
+def load_ground_truth(path):
+    """
+    Expected extractions by file name: validated corrections, overridden by the JSON file if any
+    """
+    ground_truth = {}
+    corrections = (
+        TrainingData.objects.order_by('id')
+        .values_list('invoice__original_file', 'corrected_extraction')
+        .iterator()
+    )
+    for original_file, corrected in corrections:
+        if original_file:
+            ground_truth[os.path.basename(original_file)] = corrected
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            ground_truth.update(json.load(f))
+    return ground_truth
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure l'extraction sur le corpus data_source: latences par étape, débit, mémoire "
+        "et précision par champ, avec comparaison à une référence JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=settings.DATA_SOURCE_DIR)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--ground-truth',
+            help="Fichier JSON {nom de fichier: extraction attendue} (défaut: ground_truth.json du corpus)"
+        )
+        parser.add_argument('--save', help="Enregistre le rapport JSON (nouvelle référence)")
+        parser.add_argument('--baseline', help="Rapport JSON de référence à comparer")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help="Dégradation relative tolérée des latences, du débit et de la mémoire"
+        )
+        parser.add_argument(
+            '--fail-on-regression', action='store_true',
+            help="Termine en erreur si une régression est détectée"
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        files = corpus_files(source)
+        if not files:
+            raise CommandError(f"Aucun document trouvé dans {source}")
+
+        ground_truth = load_ground_truth(options['ground_truth'] or os.path.join(source, 'ground_truth.json'))
+        report = run_benchmark(files, ground_truth, options['repeat'])
+
+        self.stdout.write(f"Documents: {report['files']} ({len(report['errors'])} en erreur)")
+        for stage, summary in report['stages'].items():
+            self.stdout.write(
+                f"{stage:<11} p50 {summary['p50_ms']:>9.3f} ms  p90 {summary['p90_ms']:>9.3f} ms  "
+                f"p99 {summary['p99_ms']:>9.3f} ms  {summary['throughput_per_s']:>9.2f}/s  "
+                f"mémoire max {summary['peak_memory_kb']:.1f} Ko"
+            )
+        for label, field in report['accuracy'].items():
+            self.stdout.write(f"{label:<16} {field['correct']}/{field['total']} ({field['accuracy']:.1%})")
+        if report['overall_accuracy'] is None:
+            self.stdout.write("Aucune vérité terrain pour ce corpus: précision non mesurée")
+        for error in report['errors']:
+            self.stderr.write(f"{error['file']} ({error['stage']}): {error['message']}")
+
+        if options['save']:
+            os.makedirs(os.path.dirname(os.path.abspath(options['save'])), exist_ok=True)
+            with open(options['save'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Rapport enregistré dans {options['save']}")
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                regressions = compare_reports(json.load(f), report, options['tolerance'])
+            for regression in regressions:
+                self.stdout.write(self.style.WARNING(f"Régression: {regression}"))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence"))
+            elif options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} régression(s) détectée(s)")
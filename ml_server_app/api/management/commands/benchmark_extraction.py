@@ -0,0 +1,111 @@
+import os
+import re
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.ml_processor import extract_text_from_pdf, process_invoice_data
+
+
+def legacy_process_invoice_data(text):
+    """
+    Previous multi-search implementation, kept as the benchmark baseline
+    """
+    extracted_data = {
+        'invoice_number': None,
+        'date': None,
+        'due_date': None,
+        'total_amount': None,
+        'tax_amount': None,
+        'supplier': {'name': None, 'address': None, 'tax_id': None},
+        'items': []
+    }
+
+    invoice_match = re.search(r'FACTURE N°\s*([A-Za-z0-9\-_/]+)', text, re.IGNORECASE)
+    if invoice_match:
+        extracted_data['invoice_number'] = invoice_match.group(1).strip()
+    date_match = re.search(r'Date:\s*(\d{1,2}/\d{1,2}/\d{4})', text, re.IGNORECASE)
+    if date_match:
+        extracted_data['date'] = date_match.group(1).strip()
+    due_date_match = re.search(r'Échéance:\s*(\d{1,2}/\d{1,2}/\d{4})', text, re.IGNORECASE)
+    if due_date_match:
+        extracted_data['due_date'] = due_date_match.group(1).strip()
+    total_match = re.search(r'TOTAL:\s*(\d+[.,]\d{2})', text, re.IGNORECASE)
+    if total_match:
+        extracted_data['total_amount'] = float(total_match.group(1).replace(',', '.'))
+    tax_match = re.search(r'TVA[^:]*:\s*(\d+[.,]\d{2})', text, re.IGNORECASE)
+    if tax_match:
+        extracted_data['tax_amount'] = float(tax_match.group(1).replace(',', '.'))
+
+    non_empty_lines = [line.strip() for line in text.split('\n') if line.strip()]
+    if len(non_empty_lines) > 2:
+        extracted_data['supplier']['name'] = non_empty_lines[2]
+    address_block = ""
+    for i in range(3, min(5, len(non_empty_lines))):
+        if re.search(r'\d+\s+rue', non_empty_lines[i], re.IGNORECASE):
+            address_block = non_empty_lines[i]
+            if i + 1 < len(non_empty_lines):
+                address_block += ", " + non_empty_lines[i + 1]
+            break
+    extracted_data['supplier']['address'] = address_block
+
+    siret_match = re.search(r'SIRET:\s*(\d+)', text, re.IGNORECASE)
+    if siret_match:
+        extracted_data['supplier']['tax_id'] = siret_match.group(1).strip()
+
+    items_section = re.search(r'Description(.*?)Sous-total', text, re.DOTALL | re.IGNORECASE)
+    if items_section:
+        item_pattern = r'([A-Za-z0-9\s]+)\s+(\d+)\s+(\d+[.,]\d{2})\s+€\s+(\d+[.,]\d{2})\s+€'
+        for match in re.finditer(item_pattern, items_section.group(1)):
+            extracted_data['items'].append({
+                'description': match.group(1).strip(),
+                'quantity': float(match.group(2)),
+                'unit_price': float(match.group(3).replace(',', '.')),
+                'total_price': float(match.group(4).replace(',', '.')),
+                'tax_rate': 20.0
+            })
+
+    return extracted_data
+
+
+class Command(BaseCommand):
+    help = "Compare la vitesse d'extraction des champs sur le corpus data_source"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=settings.DATA_SOURCE_DIR)
+        parser.add_argument('--repeat', type=int, default=200)
+        parser.add_argument(
+            '--pages', type=int, default=20,
+            help="Nombre de pages simulées par document (relevés multi-pages)"
+        )
+
+    def handle(self, *args, **options):
+        source = options['source']
+        documents = []
+        for filename in sorted(os.listdir(source)):
+            if filename.lower().endswith('.pdf'):
+                try:
+                    text = extract_text_from_pdf(os.path.join(source, filename))
+                except Exception as e:
+                    self.stderr.write(f"{filename} ignoré: {e}")
+                    continue
+                # Les relevés fournisseurs répètent le détail sur plusieurs pages
+                documents.append(text * options['pages'])
+
+        if not documents:
+            self.stderr.write(f"Aucun PDF trouvé dans {source}")
+            return
+
+        def run(parse):
+            for text in documents:
+                parse(text)
+
+        legacy = min(timeit.repeat(lambda: run(legacy_process_invoice_data), number=options['repeat'], repeat=3))
+        current = min(timeit.repeat(lambda: run(process_invoice_data), number=options['repeat'], repeat=3))
+        calls = options['repeat'] * len(documents)
+
+        self.stdout.write(f"Documents: {len(documents)} ({options['pages']} pages chacun)")
+        self.stdout.write(f"Ancienne extraction : {legacy / calls * 1e6:.1f} µs/document")
+        self.stdout.write(f"Extraction en une passe : {current / calls * 1e6:.1f} µs/document")
+        self.stdout.write(self.style.SUCCESS(f"Accélération : x{legacy / current:.2f}"))
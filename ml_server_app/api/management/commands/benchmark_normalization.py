@@ -0,0 +1,87 @@
+import random
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from api.normalization import ITEM_AMOUNT_COLUMNS, normalize_items, parse_amount
+
+# Écritures d'un même montant rencontrées dans les factures (et corrections saisies)
+AMOUNT_FORMATS = (
+    lambda amount: f'{amount:.2f}'.replace('.', ','),
+    lambda amount: f'{amount:,.2f}'.replace(',', ' ').replace('.', ','),
+    lambda amount: f'{amount:,.2f}'.replace(',', ' ').replace('.', ',') + ' €',
+    lambda amount: f'{amount:,.2f}'.replace(',', 'X').replace('.', ',').replace('X', '.'),
+    lambda amount: f'{amount:.2f}',
+    lambda amount: amount,
+)
+
+
+def legacy_parse_amount(value):
+    """
+    Previous per-field conversion, kept as the benchmark baseline
+    """
+    try:
+        return float(str(value).replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def sample_items(count, seed=0):
+    """
+    Return synthetic items with their amounts written in mixed formats, and the expected values
+    """
+    rng = random.Random(seed)
+    items = []
+    expected = []
+    for _ in range(count):
+        amounts = {
+            'quantity': rng.randint(1, 20),
+            'unit_price': round(rng.uniform(0.5, 5000), 2),
+            'total_price': round(rng.uniform(0.5, 50000), 2),
+            'tax_rate': rng.choice((0, 5.5, 10, 20)),
+        }
+        items.append({'description': 'Article', **{
+            column: rng.choice(AMOUNT_FORMATS)(float(value)) for column, value in amounts.items()
+        }})
+        expected.append({column: Decimal(str(value)) for column, value in amounts.items()})
+    return items, expected
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare la normalisation des montants des articles: conversion champ par champ "
+        "d'origine, module api.normalization valeur par valeur, puis par colonnes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        items, expected = sample_items(options['items'])
+        values = len(items) * len(ITEM_AMOUNT_COLUMNS)
+
+        def per_field(parse):
+            return [{column: parse(item[column]) for column in ITEM_AMOUNT_COLUMNS} for item in items]
+
+        runs = {
+            'Ancienne conversion champ par champ': lambda: per_field(legacy_parse_amount),
+            'Normalisation valeur par valeur': lambda: per_field(parse_amount),
+            'Normalisation par colonnes (NumPy)': lambda: normalize_items(items),
+        }
+        timings = {}
+        self.stdout.write(f"Articles: {len(items)} ({values} montants)")
+        for label, run in runs.items():
+            results = run()
+            correct = sum(
+                result[column] is not None and Decimal(str(result[column])) == truth[column]
+                for result, truth in zip(results, expected) for column in ITEM_AMOUNT_COLUMNS
+            )
+            timings[label] = min(timeit.repeat(run, number=1, repeat=options['repeat']))
+            self.stdout.write(
+                f"{label:<38} {timings[label] / values * 1e6:>7.2f} µs/montant  "
+                f"{correct}/{values} montants lus ({correct / values:.1%})"
+            )
+        baseline, columnar = timings['Normalisation valeur par valeur'], timings['Normalisation par colonnes (NumPy)']
+        self.stdout.write(self.style.SUCCESS(f"Par colonnes / valeur par valeur : x{baseline / columnar:.2f}"))
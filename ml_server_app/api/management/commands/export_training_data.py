@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.models import TrainingData
+from api.training import row_examples
+from api.training_export import TrainingExport
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les corrections (TrainingData) en colonnes NumPy lues par projection mémoire; "
+        "seules les lignes postérieures au dernier export sont ajoutées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.TRAINING_EXPORT_DIR)
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help="Nombre de lignes lues par requête et écrites à la fois"
+        )
+        parser.add_argument('--rebuild', action='store_true', help="Repart d'un export vide")
+
+    def handle(self, *args, **options):
+        export = TrainingExport(options['output'])
+        if options['rebuild']:
+            export.reset()
+
+        # Lecture en flux: les champs JSON ne sont jamais tous chargés en mémoire
+        rows = (
+            TrainingData.objects.filter(id__gt=export.watermark)
+            .order_by('id')
+            .only('id', 'invoice_id', 'original_extraction', 'corrected_extraction')
+            .iterator(chunk_size=options['chunk_size'])
+        )
+        appended = export.append(rows, row_examples, chunk_size=options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{appended} corrections ajoutées ({export.manifest['rows']} au total, "
+            f"{export.manifest['counts']['row_id']} exemples, jusqu'à l'id {export.watermark})"
+        ))
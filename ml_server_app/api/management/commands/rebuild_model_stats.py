@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.stats import invalidate_model_stats, rebuild_stats_row
+
+
+class Command(BaseCommand):
+    help = "Recalcule la ligne de compteurs utilisée avec MODEL_STATS_INCREMENTAL"
+
+    def handle(self, *args, **options):
+        counters = rebuild_stats_row()
+        invalidate_model_stats()
+        self.stdout.write(self.style.SUCCESS(f"Compteurs recalculés: {counters}"))
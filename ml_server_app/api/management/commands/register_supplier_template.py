@@ -0,0 +1,58 @@
+import json
+from contextlib import closing
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.documents import MappedDocument
+from api.ml_processor import extract_text_from_image, iter_pdf_pages
+from api.models import Supplier, SupplierTemplate
+from api.supplier_templates import CompiledTemplate, compile_rules, layout_fingerprint
+
+
+def read_first_page(path):
+    with MappedDocument(path) as document:
+        if document.format == 'unknown':
+            raise CommandError("Format de document non supporté")
+        if not document.is_pdf:
+            return extract_text_from_image(document)
+        with closing(iter_pdf_pages(document)) as pages:
+            return next(pages, '')
+
+
+class Command(BaseCommand):
+    help = (
+        "Enregistre le modèle de mise en page d'un fournisseur à partir d'une facture exemple. "
+        'Règles: fichier JSON [{"field": "invoice_number", "keyword": "facture :", "value": "\\\\s*(\\\\S+)"}, ...]'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Facture exemple (PDF ou image)")
+        parser.add_argument('--supplier', type=int, required=True, help="Identifiant du fournisseur")
+        parser.add_argument('--rules', required=True, help="Fichier JSON des règles du modèle")
+
+    def handle(self, *args, **options):
+        try:
+            supplier = Supplier.objects.get(pk=options['supplier'])
+        except Supplier.DoesNotExist:
+            raise CommandError(f"Fournisseur {options['supplier']} introuvable")
+
+        with open(options['rules'], encoding='utf-8') as f:
+            rules = json.load(f)
+        # Validation avant tout enregistrement: un modèle invalide n'est jamais sauvegardé
+        try:
+            compile_rules(rules)
+        except ValueError as e:
+            raise CommandError(f"Règles invalides: {e}")
+
+        first_page = read_first_page(options['file'])
+        template, created = SupplierTemplate.objects.update_or_create(
+            fingerprint=layout_fingerprint(first_page),
+            defaults={'supplier': supplier, 'rules': rules, 'is_active': True}
+        )
+
+        # Aperçu de l'extraction de la facture exemple avec le modèle
+        extractor = CompiledTemplate(template).extractor()
+        extractor.feed(first_page)
+        self.stdout.write(json.dumps(extractor.result(), ensure_ascii=False, indent=2))
+        action = "créé" if created else "mis à jour"
+        self.stdout.write(self.style.SUCCESS(f"Modèle {template.fingerprint} {action} pour {supplier.name}"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.jobs import claim_next_job, run_job
+
+
+class Command(BaseCommand):
+    help = "Traite les jobs d'extraction en attente dans la base de données"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help="Secondes d'attente lorsque la file est vide"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Traite les jobs en attente puis s'arrête"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            run_job(job)
+            self.stdout.write(f"Job {job.id} ({job.filename}): {job.status}")
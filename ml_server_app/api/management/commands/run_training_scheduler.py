@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.ml_processor import train_model_with_corrections
+from api.training import training_due
+
+
+class Command(BaseCommand):
+    help = "Regroupe les corrections en attente et lance l'entraînement hors des requêtes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float, default=5.0,
+            help="Secondes entre deux vérifications des corrections en attente"
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help="Effectue une seule vérification puis s'arrête"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if training_due():
+                trained = train_model_with_corrections()
+                self.stdout.write(f"Entraînement sur les corrections en attente: {'ok' if trained else 'rien à faire'}")
+            if options['once']:
+                return
+            time.sleep(options['poll_interval'])
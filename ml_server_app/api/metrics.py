@@ -0,0 +1,140 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Bornes (secondes) des histogrammes de durée, au format Prometheus
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRIC_NAME = 'invoice_stage_seconds'
+
+# Durées des étapes de la requête en cours, pour l'en-tête Server-Timing
+request_timings = ContextVar('request_timings', default=None)
+
+
+class Histogram:
+    def __init__(self, counts=None, total=0.0):
+        self.counts = counts or [0] * (len(BUCKETS) + 1)
+        self.total = total
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+
+    def merge(self, other):
+        self.counts = [mine + theirs for mine, theirs in zip(self.counts, other.counts)]
+        self.total += other.total
+
+
+class StageMetrics:
+    """
+    Per-process stage histograms.
+
+    Each process writes a snapshot of its cumulative histograms to
+    METRICS_DIR at most every METRICS_FLUSH_SECONDS; the metrics endpoint
+    sums the snapshots of every process (web and extraction workers).
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+        self.process_key = None
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+        if time.monotonic() - self.flushed_at >= settings.METRICS_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            snapshot = {
+                stage: {'counts': histogram.counts, 'total': histogram.total}
+                for stage, histogram in self.histograms.items()
+            }
+            self.flushed_at = time.monotonic()
+        if not snapshot:
+            return
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(settings.METRICS_DIR, f'{self._process_key()}.json')
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """
+        Sum the histogram snapshots of every process
+        """
+        self.flush()
+        merged = {}
+        directory = settings.METRICS_DIR
+        for filename in sorted(os.listdir(directory)) if os.path.isdir(directory) else []:
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for stage, values in snapshot.items():
+                merged.setdefault(stage, Histogram()).merge(Histogram(values['counts'], values['total']))
+        return merged
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def _process_key(self):
+        # Le pid seul peut être réutilisé par un processus ultérieur
+        if self.process_key is None or not self.process_key.startswith(f'{os.getpid()}-'):
+            self.process_key = f'{os.getpid()}-{time.time_ns()}'
+        return self.process_key
+
+
+stage_metrics = StageMetrics()
+
+
+@contextmanager
+def timed(stage):
+    """
+    Time a block into the stage histogram (and the request's Server-Timing header)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+
+def observe(stage, seconds):
+    stage_metrics.observe(stage, seconds)
+    timings = request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def render_prometheus():
+    """
+    Render the merged histograms in the Prometheus text exposition format
+    """
+    lines = [
+        f"# HELP {METRIC_NAME} Durée des étapes de traitement des factures",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for stage, histogram in sorted(stage_metrics.collect().items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), histogram.counts):
+            cumulative += count
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{stage}"}} {histogram.total}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{stage}"}} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,55 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import request_timings
+
+
+class ServerTimingMiddleware:
+    """
+    Report the timed stages of a request in a Server-Timing header (SERVER_TIMING)
+    """
+
+    # Compatible ASGI: les vues asynchrones ne sont pas repassées dans un thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.SERVER_TIMING:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        timings = []
+        token = request_timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        return self.add_header(response, timings, started)
+
+    async def __acall__(self, request):
+        if not settings.SERVER_TIMING:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        timings = []
+        token = request_timings.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        return self.add_header(response, timings, started)
+
+    def add_header(self, response, timings, started):
+        timings.append(('total', time.perf_counter() - started))
+        response['Server-Timing'] = ', '.join(f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in timings)
+        return response
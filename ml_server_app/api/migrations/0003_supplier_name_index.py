@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_extractionjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='supplier',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_add_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_invoices', models.PositiveIntegerField(default=0)),
+                ('training_data_count', models.PositiveIntegerField(default=0)),
+                ('used_for_training', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
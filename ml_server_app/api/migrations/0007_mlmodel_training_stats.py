@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_suppliertemplate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mlmodel',
+            name='training_corrections',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mlmodel',
+            name='training_samples',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='mlmodel',
+            name='training_seconds',
+            field=models.FloatField(default=0),
+        ),
+    ]
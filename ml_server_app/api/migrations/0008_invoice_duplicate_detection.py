@@ -0,0 +1,62 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:18
+
+import hashlib
+import re
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Copie figée de api.duplicates.invoice_duplicate_key: la migration ne doit pas
+# changer quand le code de l'application évolue
+INVOICE_NUMBER_NOISE = re.compile(r'[\W_]+')
+CENTS = Decimal('0.01')
+BATCH_SIZE = 1000
+
+
+def invoice_duplicate_key(invoice):
+    supplier = (
+        ''.join(str(invoice.supplier.tax_id or '').split()).upper()
+        or ' '.join(str(invoice.supplier.name or '').split()).upper()
+    )
+    number = INVOICE_NUMBER_NOISE.sub('', str(invoice.invoice_number or '')).upper()
+    amount = str(Decimal(invoice.total_amount).quantize(CENTS)) if invoice.total_amount is not None else ''
+    invoice_date = invoice.date.isoformat() if invoice.date is not None else ''
+    parts = (supplier, number, amount, invoice_date)
+    if not all(parts):
+        return ''
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def fill_duplicate_keys(apps, schema_editor):
+    # Factures existantes: clé exacte seulement, leur texte n'est pas conservé
+    Invoice = apps.get_model('api', 'Invoice')
+    batch = []
+    for invoice in Invoice.objects.select_related('supplier').iterator(chunk_size=BATCH_SIZE):
+        invoice.duplicate_key = invoice_duplicate_key(invoice)
+        batch.append(invoice)
+        if len(batch) == BATCH_SIZE:
+            Invoice.objects.bulk_update(batch, ['duplicate_key'])
+            batch = []
+    if batch:
+        Invoice.objects.bulk_update(batch, ['duplicate_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_mlmodel_training_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='duplicate_key',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='text_fingerprint',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_duplicate_keys, migrations.RunPython.noop),
+    ]
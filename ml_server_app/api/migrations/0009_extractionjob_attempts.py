@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_invoice_duplicate_detection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='extractionjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 16:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_extractionjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-created_at', '-id'], name='api_invoice_created_a97757_idx'),
+        ),
+    ]
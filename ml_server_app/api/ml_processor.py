@@ -1,15 +1,20 @@
-import os
-import re
-import json
-from datetime import datetime
+import logging
+import time
 
-def extract_text_from_pdf(pdf_path):
-    """
-    Placeholder for PDF text extraction
-    """
-    # Dans une version réelle, nous utiliserions pytesseract et pdf2image
-    # Pour l'instant, retournons un texte simulé pour permettre le développement
-    return """FACTURE N° 2025-001
+from pypdf import PdfReader
+
+from .documents import MappedDocument
+from .duplicates import format_fingerprint, simhash
+from .field_extractor import extract_fields
+from .metrics import observe, stage_metrics, timed
+from .model_registry import annotate_predictions
+from .ocr import iter_page_texts, ocr_image_file
+from .supplier_templates import template_registry
+
+logger = logging.getLogger(__name__)
+
+# Texte simulé utilisé lorsqu'aucun fichier n'est fourni, pour permettre le développement
+SAMPLE_INVOICE_TEXT = """FACTURE N° 2025-001
     
 Date: 15/01/2025
 Échéance: 15/02/2025
@@ -31,139 +36,155 @@ Service B                    1           200,00 €         200,00 €
                                         TOTAL:           1400,58 €
 """
 
-def extract_text_from_image(image_path):
+def iter_pdf_pages(pdf_path, reports=None):
+    """
+    Yield the text of a PDF one page at a time, OCRing pages without a text layer
+    """
+    if pdf_path is None:
+        yield SAMPLE_INVOICE_TEXT
+        return
+
+    if not isinstance(pdf_path, MappedDocument):
+        with MappedDocument(pdf_path) as document:
+            yield from iter_pdf_pages(document, reports)
+        return
+
+    # Les pages sont lues à la demande dans la projection mémoire: si l'appelant
+    # s'arrête, le reste du document n'est jamais décodé
+    reader = PdfReader(pdf_path.stream())
+    yield from iter_page_texts(reader, pdf_path.path, reports)
+
+def extract_text_from_pdf(pdf_path):
+    """
+    Extract the full text of a PDF
+    """
+    return '\n'.join(iter_pdf_pages(pdf_path))
+
+def extract_text_from_image(image_path, reports=None):
     """
-    Placeholder for image text extraction
+    OCR a scanned invoice image (from a path or a MappedDocument)
     """
-    # Dans une version réelle, nous utiliserions pytesseract et OpenCV
-    # Pour l'instant, retournons le même texte simulé
-    return extract_text_from_pdf(None)
+    if image_path is None:
+        return SAMPLE_INVOICE_TEXT
+
+    if not isinstance(image_path, MappedDocument):
+        with MappedDocument(image_path) as document:
+            return extract_text_from_image(document, reports)
+
+    report = ocr_image_file(image_path.stream())
+    if reports is not None:
+        reports.append(report)
+    return report.text
 
 def process_invoice_data(text):
     """
     Process extracted text to identify invoice data using rule-based approach
     """
-    # Extraction simplifiée basée sur des règles
-    extracted_data = {
-        'invoice_number': None,
-        'date': None,
-        'due_date': None,
-        'total_amount': None,
-        'tax_amount': None,
-        'supplier': {
-            'name': None,
-            'address': None,
-            'tax_id': None
-        },
-        'items': []
+    # `text` peut aussi être un itérable de pages (voir iter_pdf_pages): les
+    # pages sont consommées au fil de l'eau jusqu'à ce que tous les champs soient trouvés.
+    # Une mise en page connue est lue avec le modèle de son fournisseur
+    return extract_fields(text, template_registry.extractor_for)
+
+def extract_invoice(file_path, reports=None):
+    """
+    Extract the text and invoice data of a PDF or image file
+    """
+    # Une seule projection mémoire sert à détecter le format puis à l'analyse
+    with MappedDocument(file_path) as document:
+        if document.format == 'unknown':
+            raise ValueError("Unsupported document format")
+        if not document.is_pdf:
+            with timed('text_extraction'):
+                text = extract_text_from_image(document, reports)
+            with timed('field_parsing'):
+                return text, process_invoice_data(text)
+
+        # On garde les pages lues pour renvoyer le texte, sans lire la suite du document
+        pages = []
+        reports = [] if reports is None else reports
+        first_report = len(reports)
+
+        def read_pages():
+            for page in iter_pdf_pages(document, reports):
+                pages.append(page)
+                yield page
+
+        started = time.perf_counter()
+        extracted_data = process_invoice_data(read_pages())
+        # Lecture des pages et analyse sont entrelacées: la durée de lecture vient des rapports par page
+        text_seconds = sum(report.seconds for report in reports[first_report:])
+        observe('text_extraction', text_seconds)
+        observe('field_parsing', max(time.perf_counter() - started - text_seconds, 0.0))
+        return '\n'.join(pages), extracted_data
+
+def build_invoice_result(file_path):
+    """
+    Extract a file, returning its full text and the payload returned by the upload endpoints
+    """
+    reports = []
+    extracted_text, extracted_data = extract_invoice(file_path, reports)
+    return extracted_text, {
+        'extracted_data': extracted_data,
+        'original_text': extracted_text[:1000],  # Limit text size in response
+        # Empreinte du texte complet: détection des quasi-doublons, renvoyée à l'enregistrement
+        'text_fingerprint': format_fingerprint(simhash(extracted_text)),
+        # Temps par page: permet de vérifier que l'OCR n'est utilisé que là où il le faut
+        'pages': [
+            {
+                'page': report.page,
+                'source': report.source,
+                'dpi': report.dpi,
+                'confidence': report.confidence,
+                'seconds': round(report.seconds, 4)
+            }
+            for report in reports
+        ]
     }
-    
-    # Extraction du numéro de facture
-    invoice_match = re.search(r'FACTURE N°\s*([A-Za-z0-9\-_/]+)', text, re.IGNORECASE)
-    if invoice_match:
-        extracted_data['invoice_number'] = invoice_match.group(1).strip()
-    
-    # Extraction de la date
-    date_match = re.search(r'Date:\s*(\d{1,2}/\d{1,2}/\d{4})', text, re.IGNORECASE)
-    if date_match:
-        extracted_data['date'] = date_match.group(1).strip()
-    
-    # Extraction de la date d'échéance
-    due_date_match = re.search(r'Échéance:\s*(\d{1,2}/\d{1,2}/\d{4})', text, re.IGNORECASE)
-    if due_date_match:
-        extracted_data['due_date'] = due_date_match.group(1).strip()
-    
-    # Extraction du montant total
-    total_match = re.search(r'TOTAL:\s*(\d+[.,]\d{2})', text, re.IGNORECASE)
-    if total_match:
-        amount_str = total_match.group(1).replace(',', '.')
-        extracted_data['total_amount'] = float(amount_str)
-    
-    # Extraction du montant de TVA
-    tax_match = re.search(r'TVA[^:]*:\s*(\d+[.,]\d{2})', text, re.IGNORECASE)
-    if tax_match:
-        tax_str = tax_match.group(1).replace(',', '.')
-        extracted_data['tax_amount'] = float(tax_str)
-    
-    # Extraction du fournisseur
-    lines = text.split('\n')
-    non_empty_lines = [line.strip() for line in lines if line.strip()]
-    
-    if len(non_empty_lines) > 2:
-        extracted_data['supplier']['name'] = non_empty_lines[2]
-    
-    # Extraction de l'adresse du fournisseur
-    address_block = ""
-    for i in range(3, min(5, len(non_empty_lines))):
-        if re.search(r'\d+\s+rue', non_empty_lines[i], re.IGNORECASE):
-            address_block = non_empty_lines[i]
-            if i+1 < len(non_empty_lines):
-                address_block += ", " + non_empty_lines[i+1]
-            break
-    
-    extracted_data['supplier']['address'] = address_block
-    
-    # Extraction du SIRET
-    siret_match = re.search(r'SIRET:\s*(\d+)', text, re.IGNORECASE)
-    if siret_match:
-        extracted_data['supplier']['tax_id'] = siret_match.group(1).strip()
-    
-    # Extraction des éléments de la facture
-    # Recherche des lignes entre "Description" et "Sous-total"
-    items_section = re.search(r'Description(.*?)Sous-total', text, re.DOTALL | re.IGNORECASE)
-    if items_section:
-        items_text = items_section.group(1)
-        # Recherche des lignes avec un format produit, quantité, prix unitaire, total
-        item_pattern = r'([A-Za-z0-9\s]+)\s+(\d+)\s+(\d+[.,]\d{2})\s+€\s+(\d+[.,]\d{2})\s+€'
-        items_matches = re.finditer(item_pattern, items_text)
-        
-        for match in items_matches:
-            description = match.group(1).strip()
-            quantity = float(match.group(2))
-            unit_price = float(match.group(3).replace(',', '.'))
-            total_price = float(match.group(4).replace(',', '.'))
-            
-            extracted_data['items'].append({
-                'description': description,
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'total_price': total_price,
-                'tax_rate': 20.0  # Taux par défaut
-            })
-    
-    return extracted_data
 
-def train_model_with_corrections(training_data_id):
+def extract_invoice_result(file_path):
     """
-    Placeholder for model training
+    Build the extraction payload of one file, with the active model's predictions
     """
-    from .models import TrainingData, MLModel
-    
-    # Marquer les données comme utilisées pour l'entraînement
+    extracted_text, result = build_invoice_result(file_path)
+    annotate_predictions([result], [extracted_text])
+    return result
+
+def extract_invoice_results(file_paths):
+    """
+    Extract several files, scoring all of their lines with the active model at once.
+
+    Failures are returned as error payloads so that one bad file does not
+    fail the batch.
+    """
+    results = []
+    extracted = []
+    texts = []
+    for file_path in file_paths:
+        try:
+            extracted_text, result = build_invoice_result(file_path)
+        except Exception as e:
+            results.append({'status': 'error', 'message': str(e)})
+            continue
+        result = {'status': 'success', **result}
+        results.append(result)
+        extracted.append(result)
+        texts.append(extracted_text)
+    annotate_predictions(extracted, texts)
+    # Appelé dans les workers du pool: leurs mesures sont publiées sans attendre
+    stage_metrics.flush()
+    return results
+
+def train_model_with_corrections(training_data_ids=None):
+    """
+    Incrementally train the model on a batch of corrections (all pending ones by default)
+    """
+    from .training import train_on_pending_corrections
+
+    # Seules les corrections pas encore utilisées sont lues: le coût d'un
+    # entraînement dépend des nouvelles corrections, pas de l'historique
     try:
-        training_data = TrainingData.objects.get(id=training_data_id)
-        training_data.used_for_training = True
-        training_data.save()
-        
-        # Vérifier si nous avons assez de données pour entraîner un modèle
-        training_data_count = TrainingData.objects.filter(used_for_training=True).count()
-        
-        if training_data_count >= 5:  # Seuil arbitraire
-            # Créer une entrée de modèle factice
-            model_count = MLModel.objects.count()
-            
-            new_model = MLModel.objects.create(
-                name="InvoiceExtractor",
-                version=f"0.{model_count + 1}",
-                accuracy=0.75 + (model_count * 0.02),  # Amélioration fictive
-                file_path=f"models/invoice_extractor_v0.{model_count + 1}.h5",
-                is_active=True
-            )
-            
-            # Désactiver les modèles précédents
-            MLModel.objects.exclude(id=new_model.id).update(is_active=False)
-            
-        return True
-    except Exception as e:
-        print(f"Erreur lors de l'entraînement du modèle: {str(e)}")
-        return False
\ No newline at end of file
+        return train_on_pending_corrections(training_data_ids) is not None
+    except Exception:
+        # Les corrections ont été remises en attente pour le prochain entraînement
+        logger.exception("Erreur lors de l'entraînement du modèle")
+        return False
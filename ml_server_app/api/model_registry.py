@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from .inference import LineModel
+from .metrics import timed
+
+# Version servie: le modèle (None si le format n'est pas servi) et le coût de son chargement
+LoadedModel = namedtuple(
+    'LoadedModel', ['key', 'version', 'model', 'load_seconds', 'warmup_seconds', 'memory_bytes', 'mapped']
+)
+
+NO_MODEL = LoadedModel(None, 'none', None, 0.0, 0.0, 0, False)
+
+_warmup_texts = None
+
+
+def model_path(file_path):
+    return file_path if os.path.isabs(file_path) else os.path.join(settings.MEDIA_ROOT, file_path)
+
+
+def is_servable(path):
+    # Modèles NumPy uniquement (.npz ou répertoire de .npy); les autres formats sont ignorés
+    return os.path.isdir(path) or (path.endswith('.npz') and os.path.exists(path))
+
+
+def warmup_texts():
+    """
+    Text of a sample invoice from the data_source corpus, read once per process
+    """
+    from .ml_processor import SAMPLE_INVOICE_TEXT, extract_text_from_pdf
+
+    global _warmup_texts
+    if _warmup_texts is None:
+        _warmup_texts = [SAMPLE_INVOICE_TEXT]
+        source = settings.DATA_SOURCE_DIR
+        filenames = sorted(os.listdir(source)) if os.path.isdir(source) else []
+        for filename in filenames:
+            if filename.lower().endswith('.pdf'):
+                try:
+                    _warmup_texts = [extract_text_from_pdf(os.path.join(source, filename))]
+                    break
+                except Exception:
+                    continue
+    return _warmup_texts
+
+
+class ModelRegistry:
+    """
+    Process-wide holder of the active model.
+
+    The active version is loaded on first use, then checked every
+    MODEL_REGISTRY_POLL_SECONDS (or right away after an MLModel change in
+    this process). A new version is loaded and warmed up while requests
+    keep using the current one, then swapped in with a single assignment.
+    """
+
+    def __init__(self):
+        self._current = None
+        self._checked_at = None
+        self._load_lock = threading.Lock()
+
+    def current(self):
+        current = self._current
+        checked_at = self._checked_at
+        stale = checked_at is None or time.monotonic() - checked_at > settings.MODEL_REGISTRY_POLL_SECONDS
+        if current is None or stale:
+            # Un seul thread recharge; les autres continuent avec la version en place
+            blocking = current is None
+            if self._load_lock.acquire(blocking=blocking):
+                try:
+                    self._refresh()
+                finally:
+                    self._load_lock.release()
+            current = self._current or NO_MODEL
+        return current
+
+    def get(self):
+        return self.current().model
+
+    def _refresh(self):
+        from .models import MLModel
+
+        active = MLModel.objects.filter(is_active=True).values_list('id', 'version', 'file_path').first()
+        self._checked_at = time.monotonic()
+        if active is None:
+            self._current = NO_MODEL
+            return
+        model_id, version, file_path = active
+        key = (model_id, file_path)
+        if self._current is not None and self._current.key == key:
+            return
+
+        path = model_path(file_path)
+        if not is_servable(path):
+            self._current = LoadedModel(key, version, None, 0.0, 0.0, 0, False)
+            return
+
+        started = time.perf_counter()
+        model = LineModel.load(path)
+        loaded = time.perf_counter()
+        # Premier passage hors requête: pages des poids chargées, chemins NumPy initialisés
+        model.predict_documents(warmup_texts())
+        warmed = time.perf_counter()
+        self._current = LoadedModel(
+            key, version, model, loaded - started, warmed - loaded, model.nbytes, model.is_mapped
+        )
+
+    def invalidate(self):
+        """
+        Check the active version on next use
+        """
+        self._checked_at = None
+
+    def stats(self):
+        current = self._current or NO_MODEL
+        return {
+            'version': current.version,
+            'loaded': current.model is not None,
+            'load_seconds': round(current.load_seconds, 4),
+            'warmup_seconds': round(current.warmup_seconds, 4),
+            'memory_bytes': current.memory_bytes,
+            'memory_mapped': current.mapped,
+        }
+
+
+model_registry = ModelRegistry()
+
+
+def annotate_predictions(results, texts):
+    """
+    Add the active model's line predictions to extraction results, in micro-batches
+    """
+    model = model_registry.get()
+    if model is None:
+        return
+    batch_size = settings.INFERENCE_BATCH_SIZE
+    for start in range(0, len(texts), batch_size):
+        with timed('inference'):
+            batch = model.predict_documents(texts[start:start + batch_size])
+        for result, predictions in zip(results[start:start + batch_size], batch):
+            result['predictions'] = predictions
@@ -2,15 +2,33 @@ from django.db import models
 from django.utils import timezone
 
 class Supplier(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, db_index=True)
     address = models.TextField(blank=True, null=True)
-    tax_id = models.CharField(max_length=100, blank=True, null=True)
+    tax_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+
+class SupplierTemplate(models.Model):
+    """
+    Extraction rules for one supplier layout, looked up by layout fingerprint
+    (see api.supplier_templates)
+    """
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='templates')
+    fingerprint = models.CharField(max_length=40, unique=True)
+    # Liste de règles {"field", "keyword", "value"}: mot-clé en minuscules, motif
+    # dont le premier groupe capture la valeur (null pour les marqueurs de section)
+    rules = models.JSONField(default=list)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Modèle {self.supplier.name} ({self.fingerprint[:8]})"
+
 class Invoice(models.Model):
     STATUS_CHOICES = (
         ('pending', 'En attente'),
@@ -18,17 +36,28 @@ class Invoice(models.Model):
         ('rejected', 'Rejetée'),
     )
     
-    invoice_number = models.CharField(max_length=100)
-    date = models.DateField()
+    invoice_number = models.CharField(max_length=100, db_index=True)
+    date = models.DateField(db_index=True)
     due_date = models.DateField(null=True, blank=True)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='invoices')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     tax_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     original_file = models.FileField(upload_to='invoices/')
+    # Détection des doublons (voir api.duplicates): haché de (identifiant fiscal,
+    # numéro, montant, date) et SimHash du texte extrait, signé sur 64 bits
+    duplicate_key = models.CharField(max_length=40, blank=True, default='', db_index=True)
+    text_fingerprint = models.BigIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'date']),
+            # Ordre de la pagination par curseur (voir api.pagination)
+            models.Index(fields=['-created_at', '-id']),
+        ]
+    
     def __str__(self):
         return f"{self.invoice_number} - {self.supplier.name}"
 
@@ -49,6 +78,10 @@ class MLModel(models.Model):
     accuracy = models.FloatField()
     file_path = models.CharField(max_length=255)
     is_active = models.BooleanField(default=False)
+    # Dernier entraînement incrémental: corrections lues, exemples dérivés et durée
+    training_corrections = models.PositiveIntegerField(default=0)
+    training_samples = models.PositiveIntegerField(default=0)
+    training_seconds = models.FloatField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -58,8 +91,51 @@ class TrainingData(models.Model):
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='training_data')
     original_extraction = models.JSONField()
     corrected_extraction = models.JSONField()
-    used_for_training = models.BooleanField(default=False)
+    used_for_training = models.BooleanField(default=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Training data for {self.invoice.invoice_number}"
+
+
+class ExtractionJob(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminée'),
+        ('failed', 'Échouée'),
+    )
+
+    file = models.FileField(upload_to='extraction_jobs/')
+    filename = models.CharField(max_length=255)
+    digest = models.CharField(max_length=64)
+    model_version = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Nombre de fois où le job a été pris par un worker (voir api.jobs.claim_next_job)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Extraction job {self.id} ({self.status})"
+
+
+class ModelStats(models.Model):
+    """
+    Single row of counters maintained incrementally (see MODEL_STATS_INCREMENTAL)
+    """
+    total_invoices = models.PositiveIntegerField(default=0)
+    training_data_count = models.PositiveIntegerField(default=0)
+    used_for_training = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.total_invoices} factures, {self.training_data_count} corrections"
@@ -0,0 +1,260 @@
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+
+# Conventions d'écriture par langue: marque décimale, séparateurs de milliers
+# (en plus de l'autre signe de ponctuation, voir NumberParser), ordre du jour et
+# du mois dans une date numérique, mois écrits en lettres (préfixes)
+LOCALES = {
+    'fr': {
+        'decimal': ',', 'groups': (' ', '\u00a0', '\u202f', "'"), 'day_first': True,
+        'months': ('janv', 'févr', 'mars', 'avr', 'mai', 'juin', 'juil', 'août', 'sept', 'oct', 'nov', 'déc'),
+    },
+    'de': {
+        'decimal': ',', 'groups': (' ', '\u00a0', '\u202f', "'"), 'day_first': True,
+        'months': ('jan', 'feb', 'märz', 'apr', 'mai', 'juni', 'juli', 'aug', 'sep', 'okt', 'nov', 'dez'),
+    },
+    'en': {
+        'decimal': '.', 'groups': (' ', '\u00a0', '\u202f'), 'day_first': False,
+        'months': ('jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'),
+    },
+}
+DEFAULT_LOCALE = 'fr'
+# Symboles retirés avant l'analyse d'un montant
+AMOUNT_SYMBOLS = ('EUR', '€', '$', '£', '%', '\t', '\n')
+ITEM_AMOUNT_COLUMNS = ('quantity', 'unit_price', 'total_price', 'tax_rate')
+# Séparateur des valeurs d'une colonne jointes pour être nettoyées d'un seul passage
+COLUMN_SEPARATOR = '\x1f'
+
+NUMBER_PATTERN = re.compile(r'^[-+]?\d+(?:[.,]\d+)*$')
+# Milliers séparés par une marque: premier groupe de 1 à 3 chiffres sans zéro initial, puis groupes de 3
+GROUPED_PATTERNS = {mark: re.compile(rf'^[-+]?[1-9]\d{{0,2}}(?:\{mark}\d{{3}})+$') for mark in ',.'}
+# Comparées au texte en minuscules: "2025-01-15t10:00:00z"
+ISO_DATE_PATTERN = re.compile(r'^(\d{4})-(\d{1,2})-(\d{1,2})(?:[t ][\d:.+-]*z?)?$')
+NUMERIC_DATE_PATTERN = re.compile(r'^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4}|\d{2})$')
+DAY_MONTH_DATE_PATTERN = re.compile(r'^(\d{1,2})(?:er)?\.? ([^\W\d_]+)\.? (\d{4})$')
+MONTH_DAY_DATE_PATTERN = re.compile(r'^([^\W\d_]+)\.? (\d{1,2}),? (\d{4})$')
+SPACES = re.compile(r'\s+')
+# Années sur deux chiffres: 25 -> 2025
+CENTURY = 2000
+
+
+class NumberParser:
+    """
+    Amount parser of one locale, returning Decimal values (None when unreadable).
+
+    A mark separates thousands only between well-formed groups: a first
+    group of one to three digits not starting with 0, then groups of
+    exactly three digits. When both a comma and a dot appear, the last one
+    is the decimal mark and the other must group the digits before it.
+    A lone mark is the locale's decimal mark, unless it is the other one
+    and groups thousands ("1.400" in French, "1,400" in English, but
+    "0.125" is a decimal). Repeated marks must group thousands, otherwise
+    the value is unreadable ("1,2,3").
+    """
+
+    def __init__(self, locale):
+        conventions = LOCALES[locale]
+        self.decimal = conventions['decimal']
+        self.other = '.' if self.decimal == ',' else ','
+        self.removed = AMOUNT_SYMBOLS + conventions['groups']
+        self.translation = str.maketrans('', '', ''.join(symbol for symbol in self.removed if len(symbol) == 1))
+
+    def parse(self, value):
+        if value is None or isinstance(value, bool):
+            return None
+        if isinstance(value, Decimal):
+            return value
+        if isinstance(value, int):
+            return Decimal(value)
+        if isinstance(value, float):
+            # Passage par repr: Decimal(0.1) garderait l'erreur de la représentation binaire
+            return Decimal(repr(value))
+        text = str(value).replace('EUR', '').translate(self.translation)
+        if not NUMBER_PATTERN.match(text):
+            return None
+        commas, dots = text.count(','), text.count('.')
+        if commas and dots:
+            decimal, grouping = (',', '.') if text.rfind(',') > text.rfind('.') else ('.', ',')
+            whole = text[:text.rfind(decimal)]
+            if decimal in whole or not GROUPED_PATTERNS[grouping].match(whole):
+                return None
+        elif commas or dots:
+            mark = ',' if commas else '.'
+            grouped = GROUPED_PATTERNS[mark].match(text)
+            if commas + dots > 1 and not grouped:
+                return None
+            decimal = None if commas + dots > 1 or (mark == self.other and grouped) else mark
+        else:
+            decimal = None
+        if decimal is None:
+            return Decimal(text.replace(',', '').replace('.', ''))
+        whole, _, fraction = text.rpartition(decimal)
+        return Decimal(f"{whole.replace(',', '').replace('.', '')}.{fraction}")
+
+    def parse_many(self, values):
+        """
+        Parse a column of amounts, same rules as parse(), with NumPy string operations.
+
+        The text values are cleaned in one pass over the joined column, then
+        checked and their decimal mark located by vector operations (a few
+        more per thousands group of the longest value); only the final
+        Decimal conversion runs per value.
+        """
+        texts = [value for value in values if isinstance(value, str)]
+        if not texts:
+            return [self.parse(value) for value in values]
+
+        # str.replace sur la colonne jointe: une recherche en C par symbole, pas une par valeur
+        joined = COLUMN_SEPARATOR.join(texts)
+        for symbol in self.removed:
+            joined = joined.replace(symbol, '')
+        column = np.array(joined.split(COLUMN_SEPARATOR), dtype=np.str_)
+        if len(column) != len(texts):
+            # Séparateur présent dans une valeur: lecture valeur par valeur
+            return [self.parse(value) for value in values]
+        digits = np.array(joined.replace(',', '').replace('.', '').split(COLUMN_SEPARATOR), dtype=np.str_)
+
+        # Même forme que NUMBER_PATTERN: au plus un signe, des chiffres séparés par des marques isolées
+        unsigned = np.strings.lstrip(column, '+-')
+        lengths = np.strings.str_len(column)
+        valid = np.strings.isdecimal(np.strings.lstrip(digits, '+-')) & (np.strings.str_len(unsigned) >= lengths - 1)
+        for mark in (',', '.'):
+            valid &= ~np.strings.startswith(unsigned, mark) & ~np.strings.endswith(unsigned, mark)
+        for pair in (',,', ',.', '.,', '..'):
+            valid &= np.strings.find(unsigned, pair) < 0
+
+        # Marque des milliers: l'autre signe si les deux sont présents, sinon le seul signe de la valeur
+        last_comma, last_dot = np.strings.rfind(unsigned, ','), np.strings.rfind(unsigned, '.')
+        commas, dots = np.strings.count(unsigned, ','), np.strings.count(unsigned, '.')
+        both = (commas > 0) & (dots > 0)
+        grouping_mark = np.where(both, np.where(last_comma > last_dot, '.', ','), np.where(commas > 0, ',', '.'))
+        groups = np.where(grouping_mark == ',', commas, dots)
+        # Les groupes finissent à la marque décimale (la dernière) ou en fin de valeur
+        last = np.maximum(last_comma, last_dot)
+        unsigned_lengths = np.strings.str_len(unsigned)
+        end = np.where(both, last, unsigned_lengths)
+        head = end - 4 * groups
+        grouped = (head >= 1) & (head <= 3) & (np.strings.slice(unsigned, 0, 1) != '0')
+        for group in range(1, int(np.where(valid, groups, 0).max(initial=0)) + 1):
+            position = end - 4 * group
+            grouped &= (group > groups) | (np.strings.slice(unsigned, position, position + 1) == grouping_mark)
+
+        marks = commas + dots
+        valid &= ~both | (grouped & (marks - groups == 1))
+        valid &= both | (marks <= 1) | grouped
+        fraction = unsigned_lengths - last - 1
+        decimal = both | ((marks == 1) & ~((grouping_mark == self.other) & grouped))
+        split = np.strings.str_len(digits) - np.where(decimal, fraction, 0)
+        canonical = np.where(
+            decimal,
+            np.strings.add(np.strings.add(np.strings.slice(digits, 0, split), '.'), np.strings.slice(digits, split, None)),
+            digits
+        )
+
+        parsed = iter([Decimal(text) if ok else None for text, ok in zip(canonical.tolist(), valid.tolist())])
+        if len(texts) == len(values):
+            return list(parsed)
+        return [next(parsed) if isinstance(value, str) else self.parse(value) for value in values]
+
+
+class DateParser:
+    """
+    Date parser of one locale, returning ISO strings (None when unreadable).
+
+    Reads ISO dates, numeric dates in the locale's day/month order (with
+    /, . or - and two or four digit years) and dates with the month in
+    letters ("31 janv. 2025", "January 31, 2025").
+    """
+
+    def __init__(self, locale):
+        conventions = LOCALES[locale]
+        self.day_first = conventions['day_first']
+        # Préfixe le plus long d'abord: "juil" est essayé avant "jui..."
+        self.months = sorted(enumerate(conventions['months'], 1), key=lambda month: -len(month[1]))
+
+    def parse(self, value):
+        if isinstance(value, datetime):
+            return value.date().isoformat()
+        if isinstance(value, date):
+            return value.isoformat()
+        if value is None:
+            return None
+        text = SPACES.sub(' ', str(value)).strip().lower()
+        match = ISO_DATE_PATTERN.match(text)
+        if match:
+            return iso_date(*match.groups())
+        match = NUMERIC_DATE_PATTERN.match(text)
+        if match:
+            first, second, year = match.groups()
+            if len(year) == 2:
+                year = CENTURY + int(year)
+            return iso_date(year, second, first) if self.day_first else iso_date(year, first, second)
+        match = DAY_MONTH_DATE_PATTERN.match(text)
+        if match:
+            day, month, year = match.groups()
+            return iso_date(year, self.month(month), day)
+        match = MONTH_DAY_DATE_PATTERN.match(text)
+        if match:
+            month, day, year = match.groups()
+            return iso_date(year, self.month(month), day)
+        return None
+
+    def month(self, name):
+        # Nom complet ("janvier") ou abrégé ("sep" pour "sept")
+        for number, prefix in self.months:
+            if name.startswith(prefix) or (len(name) >= 3 and prefix.startswith(name)):
+                return number
+        return None
+
+
+def iso_date(year, month, day):
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=None)
+def number_parser(locale=DEFAULT_LOCALE):
+    return NumberParser(locale)
+
+
+@lru_cache(maxsize=None)
+def date_parser(locale=DEFAULT_LOCALE):
+    return DateParser(locale)
+
+
+def parse_amount(value, locale=DEFAULT_LOCALE):
+    """
+    Return an amount (text or number) as a Decimal, or None
+    """
+    return number_parser(locale).parse(value)
+
+
+def parse_amounts(values, locale=DEFAULT_LOCALE):
+    return number_parser(locale).parse_many(values)
+
+
+def parse_date(value, locale=DEFAULT_LOCALE):
+    """
+    Return a date (date object or text) as YYYY-MM-DD, or None
+    """
+    return date_parser(locale).parse(value)
+
+
+def normalize_items(items, locale=DEFAULT_LOCALE):
+    """
+    Return invoice items with their amount columns as Decimal, each column parsed at once
+    """
+    columns = {
+        column: parse_amounts([item.get(column) for item in items], locale)
+        for column in ITEM_AMOUNT_COLUMNS
+    }
+    return [
+        {**item, **{column: values[index] for column, values in columns.items()}}
+        for index, item in enumerate(items)
+    ]
@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import pytesseract
+from django.conf import settings
+from pdf2image import convert_from_path
+from PIL import Image
+
+from .extraction_pool import is_pool_worker, pool_size
+
+# Rapport par page: source ('text_layer' ou 'ocr'), résolution et confiance de l'OCR, durée
+PageReport = namedtuple('PageReport', ['page', 'source', 'dpi', 'confidence', 'seconds', 'text'])
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def ocr_workers():
+    workers = settings.OCR_WORKERS or os.cpu_count() or 1
+    if is_pool_worker():
+        # Les workers du pool d'extraction se partagent les threads OCR: sinon
+        # un lot de documents numérisés lancerait cœurs² tesseract à la fois
+        return max(1, workers // pool_size())
+    return workers
+
+
+def get_ocr_executor():
+    """
+    Return the process-wide OCR pool, created on first use
+    """
+    # Des threads suffisent: pdftoppm et tesseract tournent dans leurs propres processus
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ocr_workers(), thread_name_prefix='ocr')
+        return _executor
+
+
+def needs_ocr(text):
+    """
+    Tell whether a page text layer is too thin to be used as is
+    """
+    return len(text.strip()) < settings.OCR_MIN_TEXT_LAYER_CHARS
+
+
+def ocr_image(image):
+    """
+    OCR an image, returning its text and mean word confidence (0-100)
+    """
+    data = pytesseract.image_to_data(image, lang=settings.OCR_LANG, output_type=pytesseract.Output.DICT)
+    lines = {}
+    confidences = []
+    for word, confidence, block, paragraph, line in zip(
+        data['text'], data['conf'], data['block_num'], data['par_num'], data['line_num']
+    ):
+        if not word.strip():
+            continue
+        lines.setdefault((block, paragraph, line), []).append(word)
+        if float(confidence) >= 0:
+            confidences.append(float(confidence))
+
+    text = '\n'.join(' '.join(words) for words in lines.values())
+    confidence = sum(confidences) / len(confidences) if confidences else 0.0
+    return text, confidence
+
+
+def ocr_pdf_page(pdf_path, page_number):
+    """
+    Rasterize and OCR one PDF page, at high DPI only if low DPI is not confident enough
+    """
+    started = time.perf_counter()
+    for dpi in (settings.OCR_LOW_DPI, settings.OCR_HIGH_DPI):
+        image, = convert_from_path(pdf_path, dpi=dpi, first_page=page_number, last_page=page_number)
+        text, confidence = ocr_image(image)
+        if confidence >= settings.OCR_MIN_CONFIDENCE:
+            break
+    return PageReport(page_number, 'ocr', dpi, confidence, time.perf_counter() - started, text)
+
+
+def ocr_image_file(stream):
+    """
+    OCR a scanned image, upscaling it once if the first pass is not confident enough
+    """
+    started = time.perf_counter()
+    image = Image.open(stream)
+    image.load()
+    text, confidence = ocr_image(image)
+    scale = 1
+    if confidence < settings.OCR_MIN_CONFIDENCE:
+        # Équivalent d'une numérisation à plus haute résolution
+        scale = settings.OCR_HIGH_DPI / settings.OCR_LOW_DPI
+        upscaled = image.resize((int(image.width * scale), int(image.height * scale)), Image.LANCZOS)
+        text, confidence = ocr_image(upscaled)
+    dpi = image.info.get('dpi', (None,))[0]
+    return PageReport(1, 'ocr', dpi * scale if dpi else None, confidence, time.perf_counter() - started, text)
+
+
+def iter_page_texts(reader, pdf_path, reports=None):
+    """
+    Yield the text of each page in order, OCRing only pages without a text layer.
+
+    When a page needs OCR, the next pages needing it are submitted too so
+    that up to OCR_WORKERS pages are processed in parallel; pages beyond
+    the caller's stopping point are cancelled.
+    """
+    executor = get_ocr_executor()
+    page_count = len(reader.pages)
+    layers = {}
+    scheduled = {}
+    next_page = 0
+
+    def prepare_until(limit):
+        nonlocal next_page
+        while next_page < min(limit, page_count):
+            started = time.perf_counter()
+            text = reader.pages[next_page].extract_text() or ''
+            layers[next_page] = (text, time.perf_counter() - started)
+            if needs_ocr(text):
+                scheduled[next_page] = executor.submit(ocr_pdf_page, pdf_path, next_page + 1)
+            next_page += 1
+
+    try:
+        for index in range(page_count):
+            prepare_until(index + 1)
+            text, seconds = layers.pop(index)
+            if index in scheduled:
+                prepare_until(index + ocr_workers())
+                report = scheduled.pop(index).result()
+                report = report._replace(seconds=report.seconds + seconds)
+            else:
+                report = PageReport(index + 1, 'text_layer', None, None, seconds, text)
+            if reports is not None:
+                reports.append(report)
+            yield report.text
+    finally:
+        for future in scheduled.values():
+            future.cancel()
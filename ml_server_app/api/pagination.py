@@ -0,0 +1,13 @@
+from rest_framework.pagination import CursorPagination
+
+
+class InvoiceCursorPagination(CursorPagination):
+    # Pagination par clé: le coût d'une page ne dépend pas de sa position dans la table
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class InvoiceItemCursorPagination(InvoiceCursorPagination):
+    ordering = ('-id',)
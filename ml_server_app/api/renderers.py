@@ -0,0 +1,13 @@
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import timed
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """
+    JSON renderer timing response serialization as the 'serialization' stage
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serialization'):
+            return super().render(data, accepted_media_type, renderer_context)
@@ -1,23 +1,57 @@
 from rest_framework import serializers
 from .models import Invoice, Supplier, InvoiceItem, MLModel, TrainingData
 
+def requested_fields(request):
+    """
+    Return the field names asked for with ?fields=a,b, or None for all fields
+    """
+    fields = request.query_params.get('fields') if request is not None else None
+    if not fields:
+        return None
+    return {field.strip() for field in fields.split(',') if field.strip()}
+
+def includes_items(request):
+    if request is None:
+        return True
+    fields = requested_fields(request)
+    if fields is not None and 'items' not in fields:
+        return False
+    return request.query_params.get('include_items', '').lower() not in ('0', 'false')
+
+class SparseFieldsetMixin:
+    """
+    Restrict the serialized fields to the ones listed in ?fields=
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = requested_fields(self.context.get('request'))
+        if fields is not None:
+            for field_name in set(self.fields) - fields:
+                self.fields.pop(field_name)
+
 class SupplierSerializer(serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = '__all__'
 
-class InvoiceItemSerializer(serializers.ModelSerializer):
+class InvoiceItemSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = InvoiceItem
         fields = '__all__'
 
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     supplier_name = serializers.ReadOnlyField(source='supplier.name')
     items = InvoiceItemSerializer(many=True, read_only=True)
     
     class Meta:
         model = Invoice
         fields = '__all__'
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # ?include_items=false: les lignes ne sont ni chargées ni sérialisées
+        if not includes_items(self.context.get('request')):
+            self.fields.pop('items', None)
 
 class MLModelSerializer(serializers.ModelSerializer):
     class Meta:
@@ -30,4 +64,7 @@ class TrainingDataSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 class InvoiceUploadSerializer(serializers.Serializer):
-    file = serializers.FileField()
\ No newline at end of file
+    file = serializers.FileField()
+
+class InvoiceBatchUploadSerializer(serializers.Serializer):
+    files = serializers.ListField(child=serializers.FileField(), allow_empty=False)
\ No newline at end of file
@@ -0,0 +1,78 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .duplicates import duplicate_index, invoice_duplicate_key
+from .extraction_cache import extraction_cache
+from .invoice_store import add_to_duplicate_index, add_to_supplier_resolver
+from .model_registry import model_registry
+from .models import Invoice, MLModel, Supplier, SupplierTemplate, TrainingData
+from .stats import record_stats_change
+from .supplier_resolver import supplier_resolver
+from .supplier_templates import template_registry
+
+# Les écritures groupées (bulk_create, update) ne déclenchent pas ces signaux:
+# elles appellent record_stats_change elles-mêmes
+
+
+@receiver(pre_save, sender=Invoice)
+def invoice_saving(sender, instance, **kwargs):
+    # Numéro, montant ou date modifiés (admin...): la clé de doublon suit
+    instance.duplicate_key = invoice_duplicate_key(instance)
+
+
+@receiver(post_save, sender=Invoice)
+def invoice_saved(sender, instance, created, **kwargs):
+    if created:
+        record_stats_change(total_invoices=1)
+    else:
+        record_stats_change()
+    transaction.on_commit(partial(add_to_duplicate_index, [instance]))
+
+
+@receiver(post_delete, sender=Invoice)
+def invoice_deleted(sender, instance, **kwargs):
+    record_stats_change(total_invoices=-1)
+    transaction.on_commit(partial(duplicate_index.remove, instance.id))
+
+
+@receiver(post_save, sender=Supplier)
+def supplier_saved(sender, instance, **kwargs):
+    # Nom ou identifiant fiscal modifié (admin...): le résolveur suit
+    transaction.on_commit(partial(add_to_supplier_resolver, [instance]))
+
+
+@receiver(post_delete, sender=Supplier)
+def supplier_deleted(sender, instance, **kwargs):
+    transaction.on_commit(partial(supplier_resolver.remove, instance.id))
+
+
+@receiver(post_save, sender=TrainingData)
+def training_data_saved(sender, instance, created, **kwargs):
+    if created:
+        record_stats_change(training_data_count=1, used_for_training=int(instance.used_for_training))
+    else:
+        record_stats_change()
+
+
+@receiver(post_delete, sender=TrainingData)
+def training_data_deleted(sender, instance, **kwargs):
+    record_stats_change(training_data_count=-1, used_for_training=-int(instance.used_for_training))
+
+
+@receiver(post_save, sender=MLModel)
+@receiver(post_delete, sender=MLModel)
+def ml_model_changed(sender, instance, **kwargs):
+    record_stats_change()
+    # Nouvelle version active: rechargée dès la prochaine extraction de ce processus
+    model_registry.invalidate()
+
+
+@receiver(post_save, sender=SupplierTemplate)
+@receiver(post_delete, sender=SupplierTemplate)
+def supplier_template_changed(sender, instance, **kwargs):
+    # Les extractions en cache ont pu être faites avec l'ancien modèle
+    template_registry.invalidate()
+    extraction_cache.invalidate()
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import Invoice, MLModel, ModelStats
+from .serializers import MLModelSerializer
+
+STATS_CACHE_KEY = 'api:model_stats'
+STATS_ROW_ID = 1
+COUNTER_FIELDS = ('total_invoices', 'training_data_count', 'used_for_training')
+
+
+def count_model_stats():
+    """
+    Compute the stats counters in a single aggregate query
+    """
+    # Chaque correction appartient à une facture: la jointure suffit à tout compter
+    return Invoice.objects.aggregate(
+        total_invoices=Count('id', distinct=True),
+        training_data_count=Count('training_data'),
+        used_for_training=Count('training_data', filter=Q(training_data__used_for_training=True))
+    )
+
+
+def rebuild_stats_row():
+    counters = count_model_stats()
+    ModelStats.objects.update_or_create(id=STATS_ROW_ID, defaults=counters)
+    return counters
+
+
+def get_counters():
+    if not settings.MODEL_STATS_INCREMENTAL:
+        return count_model_stats()
+    counters = ModelStats.objects.filter(id=STATS_ROW_ID).values(*COUNTER_FIELDS).first()
+    return counters if counters is not None else rebuild_stats_row()
+
+
+def get_cached_model_stats():
+    """
+    Return the model stats payload, cached for MODEL_STATS_CACHE_TTL seconds
+    """
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        counters = get_counters()
+        active_model = MLModel.objects.filter(is_active=True).first()
+        stats = {
+            'active_model': MLModelSerializer(active_model).data if active_model else None,
+            **counters,
+            'pending_training': counters['training_data_count'] - counters['used_for_training']
+        }
+        cache.set(STATS_CACHE_KEY, stats, settings.MODEL_STATS_CACHE_TTL)
+    return stats
+
+
+def invalidate_model_stats():
+    cache.delete(STATS_CACHE_KEY)
+
+
+def record_stats_change(**deltas):
+    """
+    Invalidate the cached stats and apply counter deltas to the stats row
+    """
+    # Après le commit, sinon une lecture concurrente remettrait en cache l'ancien état
+    transaction.on_commit(invalidate_model_stats)
+    if settings.MODEL_STATS_INCREMENTAL and deltas:
+        ModelStats.objects.filter(id=STATS_ROW_ID).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
@@ -0,0 +1,271 @@
+import math
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+
+import numpy as np
+from django.conf import settings
+
+# Formes juridiques ignorées: "Fournisseur XYZ SAS" et "FOURNISSEUR XYZ" sont le même fournisseur
+LEGAL_FORMS = frozenset((
+    'SA', 'SAS', 'SASU', 'SARL', 'EURL', 'SNC', 'SCI', 'SCOP', 'SCA', 'SELARL',
+    'INC', 'LTD', 'LLC', 'PLC', 'GMBH', 'AG', 'BV', 'SPA', 'SRL', 'SL',
+))
+NAME_NOISE = re.compile(r'[^A-Z0-9]+')
+TAX_ID_NOISE = re.compile(r'[^A-Z0-9]+')
+SIRET_PATTERN = re.compile(r'^\d{14}$')
+VAT_NUMBER_PATTERN = re.compile(r'^FR[0-9A-Z]{2}(\d{9})$')
+# Nombre maximal de fournisseurs dont la similarité exacte est calculée par recherche
+SCORED_CANDIDATES = 64
+
+
+def normalize_name(name):
+    """
+    Uppercase a supplier name without accents, punctuation or legal form
+    """
+    decomposed = unicodedata.normalize('NFKD', str(name or ''))
+    ascii_name = ''.join(char for char in decomposed if not unicodedata.combining(char)).upper()
+    words = NAME_NOISE.sub(' ', ascii_name).split()
+    # Un nom réduit à sa forme juridique est gardé tel quel
+    return ' '.join([word for word in words if word not in LEGAL_FORMS] or words)
+
+
+def tax_keys(tax_id):
+    """
+    Return the lookup keys of a tax id: itself and, for a SIRET or French VAT number, its SIREN
+    """
+    tax_id = TAX_ID_NOISE.sub('', str(tax_id or '').upper())
+    if not tax_id:
+        return ()
+    if SIRET_PATTERN.match(tax_id):
+        return (tax_id, tax_id[:9])
+    vat_number = VAT_NUMBER_PATTERN.match(tax_id)
+    if vat_number:
+        return (tax_id, vat_number.group(1))
+    return (tax_id,)
+
+
+def name_trigrams(normalized):
+    padded = f'  {normalized} '
+    return frozenset(sys.intern(padded[index:index + 3]) for index in range(len(padded) - 2))
+
+
+def name_similarity(grams, other):
+    """
+    Jaccard similarity of a trigram set and another set (or tuple) of distinct trigrams
+    """
+    shared = len(grams.intersection(other))
+    return shared / (len(grams) + len(other) - shared)
+
+
+class SupplierEntry:
+    __slots__ = ('id', 'name', 'tax_id', 'normalized', 'grams', 'tax_keys')
+
+    def __init__(self, supplier_id, name, tax_id):
+        self.id = supplier_id
+        self.name = name
+        self.tax_id = tax_id or ''
+        self.normalized = normalize_name(name)
+        # Tuple de chaînes internées: bien plus compact qu'un frozenset par fournisseur
+        self.grams = tuple(name_trigrams(self.normalized))
+        self.tax_keys = tax_keys(tax_id)
+
+    def conflicts_with(self, keys):
+        # Deux identifiants fiscaux différents: homonymes, pas le même fournisseur
+        return bool(self.tax_keys and keys) and not set(self.tax_keys) & set(keys)
+
+
+class SupplierResolver:
+    """
+    In-memory index of the suppliers by tax id and normalized name trigrams.
+
+    A tax id (or the SIREN of a SIRET or VAT number) is looked up first,
+    then the exact normalized name; otherwise the name with the highest
+    trigram similarity at SUPPLIER_MATCH_THRESHOLD or above wins. Shared
+    trigrams are counted for every supplier at once with NumPy, from
+    postings stored as int32 arrays, and only the suppliers that can reach
+    the threshold are scored.
+
+    Loaded on first use in each process, then completed every
+    SUPPLIER_INDEX_REFRESH_SECONDS with the suppliers created since (by id),
+    or at once by refresh(); suppliers saved or deleted in this process are
+    applied at once.
+    """
+
+    def __init__(self):
+        self._entries = None
+        self._tax_ids = None
+        self._names = None
+        self._postings = None
+        self._sizes = None
+        self._last_id = 0
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def resolve(self, tax_id, name):
+        """
+        Return (supplier id, 'tax_id' or 'name') of the matching supplier, or None
+        """
+        keys = tax_keys(tax_id)
+        normalized = normalize_name(name)
+        with self._lock:
+            self._sync()
+            for key in keys:
+                if key in self._tax_ids:
+                    return self._tax_ids[key], 'tax_id'
+            if not normalized:
+                return None
+            entry = self._entries.get(self._names.get(normalized))
+            if entry is not None and not entry.conflicts_with(keys):
+                return entry.id, 'name'
+            match = self._similar_name(name_trigrams(normalized), keys)
+            return (match, 'name') if match is not None else None
+
+    def refresh(self):
+        """
+        Read the suppliers created since the last sync, whatever its age
+        """
+        with self._lock:
+            self._sync(force=True)
+
+    def add(self, supplier_id, name, tax_id):
+        with self._lock:
+            if self._entries is not None:
+                self._add(SupplierEntry(supplier_id, name, tax_id))
+
+    def remove(self, supplier_id):
+        with self._lock:
+            if self._entries is not None:
+                self._remove(supplier_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries = None
+
+    def _similar_name(self, grams, keys):
+        threshold = settings.SUPPLIER_MATCH_THRESHOLD
+        size = len(grams)
+        # Similarité >= seuil: au moins ceil(seuil * n) trigrammes communs. Les listes
+        # des trigrammes les plus fréquents, les plus longues, sont omises du comptage
+        # dans la limite de la moitié des trigrammes manquants permis
+        needed = math.ceil(threshold * size)
+        skipped = (size - needed) // 2
+        postings = sorted((self._postings[gram] for gram in grams if self._postings.get(gram)), key=len)
+        counted = postings[:len(postings) - skipped] if skipped else postings
+        if not counted:
+            return None
+        # Un comptage NumPy sur les listes concaténées, sans boucle Python par fournisseur
+        ids = np.concatenate([np.frombuffer(posting, dtype=np.int32) for posting in counted])
+        shared = np.bincount(ids)
+        if len(ids) * 4 < len(shared):
+            candidates = np.unique(ids[shared[ids] >= needed - skipped])
+        else:
+            candidates = np.flatnonzero(shared >= needed - skipped)
+
+        # Majorant de la similarité (trigrammes omis tous communs): élimine aussi
+        # les noms trop courts ou trop longs, et arrête la notation au meilleur score
+        sizes = self._sizes[candidates]
+        bound = np.minimum(shared[candidates] + skipped, sizes)
+        upper = bound / (size + sizes - bound)
+        reachable = upper >= threshold
+        candidates, upper = candidates[reachable], upper[reachable]
+        order = np.lexsort((candidates, -upper))[:SCORED_CANDIDATES]
+
+        best = None
+        for supplier_id, supplier_upper in zip(candidates[order].tolist(), upper[order].tolist()):
+            if best is not None and supplier_upper < best[0]:
+                break
+            entry = self._entries[supplier_id]
+            score = name_similarity(grams, entry.grams)
+            # À score égal, le fournisseur le plus ancien est retenu
+            if score >= threshold and (best is None or (score, -supplier_id) > best) and not entry.conflicts_with(keys):
+                best = (score, -supplier_id)
+        return -best[1] if best is not None else None
+
+    def _sync(self, force=False):
+        from .models import Supplier
+
+        if self._entries is None:
+            self._entries, self._tax_ids, self._names, self._postings = {}, {}, {}, {}
+            self._sizes = np.zeros(1024, dtype=np.int32)
+            self._last_id = 0
+        elif not force and time.monotonic() - self._refreshed_at < settings.SUPPLIER_INDEX_REFRESH_SECONDS:
+            return
+        rows = Supplier.objects.filter(id__gt=self._last_id).order_by('id').values_list('id', 'name', 'tax_id')
+        for supplier_id, name, tax_id in rows.iterator():
+            self._add(SupplierEntry(supplier_id, name, tax_id))
+        self._refreshed_at = time.monotonic()
+
+    def _add(self, entry):
+        if entry.id in self._entries:
+            self._remove(entry.id)
+        self._entries[entry.id] = entry
+        self._last_id = max(self._last_id, entry.id)
+        # Fournisseurs déjà en double: le plus ancien est retenu
+        for key in entry.tax_keys:
+            self._tax_ids.setdefault(key, entry.id)
+        self._names.setdefault(entry.normalized, entry.id)
+        if entry.id >= len(self._sizes):
+            self._sizes = np.concatenate([self._sizes, np.zeros(max(entry.id + 1, len(self._sizes)), dtype=np.int32)])
+        self._sizes[entry.id] = len(entry.grams)
+        for gram in entry.grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array('i')
+            posting.append(entry.id)
+
+    def _remove(self, supplier_id):
+        entry = self._entries.pop(supplier_id, None)
+        if entry is None:
+            return
+        for key in entry.tax_keys:
+            if self._tax_ids.get(key) == supplier_id:
+                del self._tax_ids[key]
+        if self._names.get(entry.normalized) == supplier_id:
+            del self._names[entry.normalized]
+        self._sizes[supplier_id] = 0
+        for gram in entry.grams:
+            self._postings[gram].remove(supplier_id)
+
+
+supplier_resolver = SupplierResolver()
+
+
+def is_same_supplier(supplier, tax_id, name):
+    """
+    Check a resolved supplier row against the extracted or submitted one
+    """
+    # L'index d'un autre processus peut précéder un renommage ou une suppression
+    entry = SupplierEntry(supplier.id, supplier.name, supplier.tax_id)
+    keys = tax_keys(tax_id)
+    if keys and set(keys) & set(entry.tax_keys):
+        return True
+    normalized = normalize_name(name)
+    if not normalized or entry.conflicts_with(keys):
+        return False
+    return name_similarity(name_trigrams(normalized), entry.grams) >= settings.SUPPLIER_MATCH_THRESHOLD
+
+
+def match_supplier(supplier_data):
+    """
+    Resolve extracted supplier data to a saved supplier, for the upload endpoints
+    """
+    from .models import Supplier
+
+    supplier_data = supplier_data or {}
+    tax_id, name = supplier_data.get('tax_id'), supplier_data.get('name')
+    match = supplier_resolver.resolve(tax_id, name)
+    if match is None:
+        return None
+    supplier_id, kind = match
+    supplier = Supplier.objects.filter(id=supplier_id).only('id', 'name', 'tax_id').first()
+    if supplier is None:
+        supplier_resolver.remove(supplier_id)
+        return match_supplier(supplier_data)
+    if not is_same_supplier(supplier, tax_id, name):
+        supplier_resolver.add(supplier.id, supplier.name, supplier.tax_id)
+        return match_supplier(supplier_data)
+    return {'id': supplier.id, 'name': supplier.name, 'tax_id': supplier.tax_id, 'match': kind}
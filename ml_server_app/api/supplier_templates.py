@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+
+from .field_extractor import FIELD_RULES, FieldExtractor, FieldRule, RuleScanner, parse_amount, parse_text
+
+# Identifiant fiscal repéré dans la première page: SIRET/SIREN, sinon numéro de TVA intracommunautaire
+TAX_ID_PATTERN = re.compile(r'\b(?:siret|siren)\b\D{0,5}(\d[\d ]{7,17}\d)', re.IGNORECASE)
+VAT_NUMBER_PATTERN = re.compile(r'\bFR ?[0-9A-Z]{2} ?\d{3} ?\d{3} ?\d{3}\b')
+HEADER_TOKEN_PATTERN = re.compile(r'[^\W\d_]{3,}')
+# Lignes d'en-tête prises en compte: l'en-tête d'un fournisseur change peu d'une facture à l'autre
+HEADER_LINES = 5
+# Mots qui varient d'une facture à l'autre pour une même mise en page
+VARIABLE_TOKENS = frozenset((
+    'JANVIER', 'FÉVRIER', 'FEVRIER', 'MARS', 'AVRIL', 'MAI', 'JUIN', 'JUILLET', 'AOÛT', 'AOUT',
+    'SEPTEMBRE', 'OCTOBRE', 'NOVEMBRE', 'DÉCEMBRE', 'DECEMBRE',
+    'JANUARY', 'FEBRUARY', 'MARCH', 'APRIL', 'MAY', 'JUNE', 'JULY', 'AUGUST',
+    'SEPTEMBER', 'OCTOBER', 'NOVEMBER', 'DECEMBER',
+))
+
+AMOUNT_FIELDS = frozenset(('total_amount', 'tax_amount'))
+MARKER_FIELDS = frozenset(('items_start', 'items_end'))
+TEMPLATE_FIELDS = frozenset(rule.field for rule in FIELD_RULES)
+
+logger = logging.getLogger(__name__)
+
+
+def header_tokens(text):
+    """
+    Return the sorted distinct words of the first header lines, without digits
+    """
+    tokens = set()
+    lines = 0
+    for line in text.split('\n', HEADER_LINES * 4):
+        if not line.strip():
+            continue
+        tokens.update(token.upper() for token in HEADER_TOKEN_PATTERN.findall(line))
+        lines += 1
+        if lines == HEADER_LINES:
+            break
+    return sorted(tokens - VARIABLE_TOKENS)
+
+
+def find_tax_id(text):
+    match = TAX_ID_PATTERN.search(text)
+    if match:
+        return match.group(1).replace(' ', '')
+    match = VAT_NUMBER_PATTERN.search(text)
+    return match.group().replace(' ', '') if match else ''
+
+
+def layout_fingerprint(text):
+    """
+    Fingerprint a document layout from its first page: tax id plus header words
+    """
+    key = f"{find_tax_id(text)}|{' '.join(header_tokens(text))}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def compile_rules(rules):
+    """
+    Turn stored template rules into a rule table, completed by the generic rules.
+
+    Raises ValueError for an unknown field, a missing or repeated keyword
+    or a value pattern that does not compile or has no group to capture
+    the value.
+    """
+    if not isinstance(rules, list):
+        raise ValueError("Template rules must be a list")
+    compiled = []
+    for rule in rules:
+        if not isinstance(rule, dict):
+            raise ValueError(f"Template rule is not an object: {rule!r}")
+        field = rule.get('field')
+        if field not in TEMPLATE_FIELDS:
+            raise ValueError(f"Unknown template field: {field}")
+        keyword = rule.get('keyword')
+        if not isinstance(keyword, str) or not keyword:
+            raise ValueError(f"Template rule for {field} has no keyword")
+        # Le scanner indexe les règles par mot-clé: un doublon en remplacerait une
+        if any(keyword.lower() == other.keyword for other in compiled):
+            raise ValueError(f"Template keyword {keyword!r} is used by several rules")
+        value = rule.get('value')
+        if value is None and field not in MARKER_FIELDS:
+            raise ValueError(f"Template rule for {field} has no value pattern")
+        if value is not None:
+            # Compilé ici pour que RuleScanner ne puisse pas échouer sur un motif enregistré
+            try:
+                pattern = re.compile(value, re.IGNORECASE)
+            except (re.error, TypeError) as e:
+                raise ValueError(f"Invalid value pattern for {field}: {e}")
+            if pattern.groups < 1:
+                raise ValueError(f"Value pattern for {field} has no capture group")
+        convert = None if field in MARKER_FIELDS else parse_amount if field in AMOUNT_FIELDS else parse_text
+        compiled.append(FieldRule(field, keyword.lower(), value, convert))
+
+    # Les champs non couverts par le modèle gardent les règles génériques, sauf
+    # celles dont le mot-clé est déjà pris par une règle du modèle
+    covered = {rule.field for rule in compiled}
+    keywords = {rule.keyword for rule in compiled}
+    compiled.extend(rule for rule in FIELD_RULES if rule.field not in covered and rule.keyword not in keywords)
+    return compiled
+
+
+class CompiledTemplate:
+    """
+    Supplier template compiled once into a single-pass scanner
+    """
+
+    def __init__(self, template):
+        self.id = template.id
+        self.fingerprint = template.fingerprint
+        self.scanner = RuleScanner(compile_rules(template.rules))
+        self.supplier = {
+            'name': template.supplier.name,
+            'address': template.supplier.address or '',
+            'tax_id': template.supplier.tax_id or None,
+        }
+
+    def extractor(self):
+        return FieldExtractor(self.scanner, supplier=self.supplier)
+
+
+class TemplateRegistry:
+    """
+    In-memory index of the active supplier templates, by layout fingerprint.
+
+    Loaded on first use in each process and reloaded after
+    SUPPLIER_TEMPLATE_REFRESH_SECONDS, or as soon as a template changes in
+    this process (see signals).
+    """
+
+    def __init__(self):
+        self._templates = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def templates(self):
+        with self._lock:
+            expired = time.monotonic() - self._loaded_at > settings.SUPPLIER_TEMPLATE_REFRESH_SECONDS
+            if self._templates is None or expired:
+                self._templates = self.load()
+                self._loaded_at = time.monotonic()
+            return self._templates
+
+    def load(self):
+        from .models import SupplierTemplate
+
+        templates = {}
+        for template in SupplierTemplate.objects.filter(is_active=True).select_related('supplier'):
+            # Un modèle invalide est ignoré: ses factures passent par les règles génériques
+            try:
+                templates[template.fingerprint] = CompiledTemplate(template)
+            except ValueError as e:
+                logger.error("Supplier template %s skipped: %s", template.pk, e)
+        return templates
+
+    def match(self, text):
+        """
+        Return the template of the document's layout, or None
+        """
+        templates = self.templates()
+        if not templates:
+            # Aucun modèle: inutile de calculer l'empreinte
+            return None
+        return templates.get(layout_fingerprint(text))
+
+    def extractor_for(self, text):
+        template = self.match(text)
+        return template.extractor() if template is not None else FieldExtractor()
+
+    def invalidate(self):
+        with self._lock:
+            self._templates = None
+
+
+template_registry = TemplateRegistry()
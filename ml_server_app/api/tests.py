@@ -1,3 +1,1218 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+import numpy as np
+
+from .async_extraction import extract_invoice_async, extraction_limiter
+from .benchmark import compare_reports, corpus_files, run_benchmark
+from .documents import MappedDocument, sniff_format
+from .field_extractor import FieldExtractor, RuleScanner, extract_fields
+from .duplicates import (
+    DuplicateIndex, duplicate_index, find_duplicate, format_fingerprint, invoice_duplicate_key, simhash, to_signed
+)
+from .extraction_cache import extraction_cache
+from .inference import FEATURE_DIM, LINE_LABELS, LineModel, featurize_documents, token_buckets
+from .metrics import BUCKETS, observe
+from .model_registry import ModelRegistry, model_registry
+from .jobs import claim_next_job
+from .line_items import parse_number
+from .training import correction_examples, labelled_values, row_examples, training_due
+from .training_export import TrainingExport
+from .normalization import normalize_items, number_parser, parse_amount, parse_date
+from .models import ExtractionJob, Invoice, InvoiceItem, MLModel, Supplier, SupplierTemplate, TrainingData
+from .extraction_pool import get_executor, pool_size
+from .ocr import ocr_workers
+from .ml_processor import (
+    SAMPLE_INVOICE_TEXT,
+    extract_invoice_result,
+    extract_text_from_pdf,
+    iter_pdf_pages,
+    process_invoice_data,
+    train_model_with_corrections
+)
+from .stats import count_model_stats
+from .supplier_resolver import SupplierResolver, normalize_name, supplier_resolver, tax_keys
+from .supplier_templates import compile_rules, layout_fingerprint, template_registry
+from .upload_handlers import UploadTooLarge
+from .views import spool_chunks
+
+
+def invoice_payload(number, supplier='FOURNISSEUR XYZ', item_count=3, tax_id='123456789'):
+    return {
+        'supplier': {'name': supplier, 'address': '', 'tax_id': tax_id},
+        'invoice': {'invoice_number': number, 'date': '2025-01-15', 'total_amount': 1400.58, 'tax_amount': 200.08},
+        'items': [
+            {'description': f'Ligne {index}', 'quantity': 1, 'unit_price': 10, 'total_price': 10, 'tax_rate': 20}
+            for index in range(item_count)
+        ],
+        'original_extraction': {}
+    }
+
+
+class ProcessInvoiceDataTests(TestCase):
+    def test_extracts_fields_from_sample_invoice(self):
+        data = process_invoice_data(extract_text_from_pdf(None))
+
+        self.assertEqual(data['invoice_number'], '2025-001')
+        self.assertEqual(data['date'], '15/01/2025')
+        self.assertEqual(data['due_date'], '15/02/2025')
+        self.assertEqual(data['total_amount'], 1400.58)
+        self.assertEqual(data['tax_amount'], 200.08)
+        self.assertEqual(data['supplier'], {
+            'name': 'FOURNISSEUR XYZ',
+            'address': '123 rue des Exemples, 75000 Paris',
+            'tax_id': '123456789'
+        })
+        self.assertEqual([item['description'] for item in data['items']], ['Produit A', 'Service B'])
+
+    def test_missing_fields_keep_result_shape(self):
+        data = process_invoice_data("")
+
+        self.assertIsNone(data['invoice_number'])
+        self.assertEqual(data['supplier']['address'], '')
+        self.assertEqual(data['items'], [])
+
+    def test_unreadable_amount_is_skipped(self):
+        data = extract_fields("TOTAL: 1.400.58 €\nTVA (20%): 1.000.00\nTOTAL: 1 400,58 €\n")
+
+        self.assertEqual(data['total_amount'], 1400.58)
+        self.assertIsNone(data['tax_amount'])
+
+    def test_stops_consuming_pages_once_fields_are_found(self):
+        consumed = []
+
+        def pages():
+            for page in (SAMPLE_INVOICE_TEXT, "Conditions générales", "Annexe"):
+                consumed.append(page)
+                yield page
+
+        data = process_invoice_data(pages())
+
+        self.assertEqual(data['total_amount'], 1400.58)
+        self.assertEqual(consumed, [SAMPLE_INVOICE_TEXT])
+
+
+class UploadInvoiceCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = self.cache_dir
+        extraction_cache.entries.clear()
+
+    def upload(self, filename='TR-E0406UNMJB.pdf'):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, filename), 'rb') as pdf_file:
+            upload = SimpleUploadedFile(filename, pdf_file.read(), content_type='application/pdf')
+        return self.client.post(reverse('upload-invoice'), {'file': upload})
+
+    def test_reupload_is_served_from_cache(self):
+        first = self.upload()
+        before = extraction_cache.stats()
+        second = self.upload()
+        after = extraction_cache.stats()
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(after['memory_hits'], before['memory_hits'] + 1)
+
+    def test_upload_is_hashed_while_streamed_to_disk(self):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'), 'rb') as pdf_file:
+            digest = hashlib.sha256(pdf_file.read()).hexdigest()
+        self.upload()
+
+        self.assertIn((digest, 'none'), extraction_cache.entries)
+
+    @override_settings(MAX_UPLOAD_FILE_SIZE=1024)
+    def test_oversized_upload_is_rejected(self):
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 413)
+
+    def test_new_model_version_invalidates_cache(self):
+        self.upload()
+        MLModel.objects.create(name="InvoiceExtractor", version="9.9", accuracy=0.9, file_path="", is_active=True)
+        before = extraction_cache.stats()
+        self.upload()
+
+        self.assertEqual(extraction_cache.stats()['misses'], before['misses'] + 1)
+
+
+class UploadInvoicesBatchTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = self.cache_dir
+        extraction_cache.entries.clear()
+
+    def read_source(self, filename):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, filename), 'rb') as source_file:
+            return source_file.read()
+
+    def test_results_keep_input_order_with_per_file_errors(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w') as zip_file:
+            zip_file.writestr('OODRIVE.pdf', self.read_source('TR-OODRIVE.pdf'))
+
+        files = [
+            SimpleUploadedFile('E0406UNMJB.pdf', self.read_source('TR-E0406UNMJB.pdf')),
+            SimpleUploadedFile('archive.zip', archive.getvalue()),
+            SimpleUploadedFile('broken.zip', b'not a zip'),
+            SimpleUploadedFile('broken.pdf', b'not a pdf'),
+        ]
+        response = self.client.post(reverse('upload-invoices-batch'), {'files': files})
+
+        results = response.json()['results']
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(result['filename'], result['status']) for result in results],
+            [
+                ('E0406UNMJB.pdf', 'success'),
+                ('archive.zip/OODRIVE.pdf', 'success'),
+                ('broken.zip', 'error'),
+                ('broken.pdf', 'error'),
+            ]
+        )
+
+    @override_settings(MAX_UPLOAD_FILE_SIZE=10000, MAX_UPLOAD_ARCHIVE_SIZE=15000)
+    def test_archive_members_are_limited_once_uncompressed(self):
+        def post_archive(*sizes):
+            archive = io.BytesIO()
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                for index, size in enumerate(sizes):
+                    zip_file.writestr(f'{index}.pdf', b'0' * size)
+            return self.client.post(
+                reverse('upload-invoices-batch'), {'files': [SimpleUploadedFile('bomb.zip', archive.getvalue())]}
+            )
+
+        spooled = set(os.listdir(settings.FILE_UPLOAD_TEMP_DIR))
+        self.assertEqual(post_archive(20000).status_code, 413)
+        self.assertEqual(post_archive(8000, 8000).status_code, 413)
+        self.assertEqual(set(os.listdir(settings.FILE_UPLOAD_TEMP_DIR)), spooled)
+
+        # Taille déclarée fausse: le compte des octets écrits arrête la décompression
+        with self.assertRaises(UploadTooLarge):
+            spool_chunks(iter([b'0' * 6000] * 2), 'member.pdf', limit=10000)
+        self.assertEqual(set(os.listdir(settings.FILE_UPLOAD_TEMP_DIR)), spooled)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ExtractionJobTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = self.cache_dir
+        extraction_cache.entries.clear()
+
+    def test_async_upload_is_processed_by_worker(self):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, 'TR-OODRIVE.pdf'), 'rb') as pdf_file:
+            upload = SimpleUploadedFile('TR-OODRIVE.pdf', pdf_file.read())
+        response = self.client.post(reverse('upload-invoice') + '?async=true', {'file': upload})
+
+        self.assertEqual(response.status_code, 202)
+        job_url = reverse('extraction-job', args=[response.json()['job_id']])
+        self.assertEqual(self.client.get(job_url).json()['job_status'], 'pending')
+
+        call_command('run_extraction_worker', once=True, stdout=io.StringIO())
+
+        job = self.client.get(job_url).json()
+        self.assertEqual(job['job_status'], 'done')
+        self.assertIn('extracted_data', job)
+        self.assertEqual(ExtractionJob.objects.get().file.name, '')
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'extraction_jobs')), [])
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        ExtractionJob.objects.create(filename='a.pdf', digest='0' * 64, model_version='none')
+
+        self.assertIsNotNone(claim_next_job())
+        self.assertIsNone(claim_next_job())
+
+    @override_settings(EXTRACTION_JOB_TIMEOUT_SECONDS=60, EXTRACTION_JOB_MAX_ATTEMPTS=2)
+    def test_job_of_crashed_worker_is_reclaimed_then_abandoned(self):
+        job = ExtractionJob(filename='a.pdf', digest='0' * 64, model_version='none')
+        job.file.save('a.pdf', ContentFile(b'%PDF'))
+        path = job.file.path
+        self.assertEqual(claim_next_job().attempts, 1)
+        # Worker encore actif: le job n'est pas repris
+        self.assertIsNone(claim_next_job())
+
+        ExtractionJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(minutes=5))
+        reclaimed = claim_next_job()
+        self.assertEqual((reclaimed.id, reclaimed.status, reclaimed.attempts), (job.id, 'running', 2))
+
+        ExtractionJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(minutes=5))
+        self.assertIsNone(claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.file.name), ('failed', ''))
+        self.assertFalse(os.path.exists(path))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TrainingSchedulerTests(TestCase):
+    def save_invoice(self, number):
+        return self.client.post(reverse('save-invoice'), {
+            'supplier': {'name': 'FOURNISSEUR XYZ', 'address': '', 'tax_id': '123456789'},
+            'invoice': {'invoice_number': number, 'date': '2025-01-15', 'total_amount': 1400.58, 'tax_amount': 200.08},
+            'items': [{'description': 'Produit A', 'quantity': 2, 'unit_price': 500.25, 'total_price': 1000.50, 'tax_rate': 20}],
+            'original_extraction': {}
+        }, content_type='application/json')
+
+    def test_save_does_not_train(self):
+        response = self.save_invoice('2025-001')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(TrainingData.objects.filter(used_for_training=True).exists())
+
+    @override_settings(TRAINING_BATCH_SIZE=5)
+    def test_scheduler_trains_pending_corrections_in_one_batch(self):
+        for number in range(5):
+            self.save_invoice(f"2025-{number:03d}")
+
+        call_command('run_training_scheduler', once=True, stdout=io.StringIO())
+
+        self.assertFalse(TrainingData.objects.filter(used_for_training=False).exists())
+        self.assertEqual(MLModel.objects.filter(is_active=True).count(), 1)
+
+    @override_settings(TRAINING_BATCH_SIZE=5, TRAINING_DEBOUNCE_SECONDS=60, TRAINING_MAX_DELAY_SECONDS=600)
+    def test_scheduler_waits_for_corrections_to_settle(self):
+        self.save_invoice('2025-001')
+
+        self.assertFalse(training_due())
+        self.assertTrue(training_due(timezone.now() + timedelta(seconds=61)))
+
+
+class SaveInvoicesTests(TestCase):
+    def setUp(self):
+        supplier_resolver.invalidate()
+        self.addCleanup(supplier_resolver.invalidate)
+
+    def save_batch(self, payloads):
+        return self.client.post(reverse('save-invoices'), {'invoices': payloads}, content_type='application/json')
+
+    def test_batch_query_count_does_not_depend_on_size(self):
+        with CaptureQueriesContext(connection) as small:
+            self.save_batch([invoice_payload('A-1')])
+        with CaptureQueriesContext(connection) as large:
+            self.save_batch([
+                invoice_payload(f'B-{index}', supplier=f'S{index % 3}', item_count=5, tax_id='')
+                for index in range(20)
+            ])
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Invoice.objects.count(), 21)
+        self.assertEqual(InvoiceItem.objects.count(), 3 + 20 * 5)
+
+    def test_existing_suppliers_are_reused(self):
+        self.save_batch([invoice_payload('A-1')])
+        response = self.save_batch([invoice_payload('A-2'), invoice_payload('A-3', supplier='AUTRE', tax_id='987654321')])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['invoice_ids']), 2)
+        self.assertEqual(Supplier.objects.count(), 2)
+
+
+class InvoiceListQueryTests(TestCase):
+    def create_invoices(self, count):
+        for index in range(count):
+            supplier = Supplier.objects.create(name=f"Fournisseur {index}")
+            invoice = Invoice.objects.create(
+                invoice_number=f"F-{index}", date='2025-01-15', supplier=supplier, total_amount=100
+            )
+            InvoiceItem.objects.bulk_create([
+                InvoiceItem(invoice=invoice, description=f"Ligne {line}", quantity=1, unit_price=50, total_price=50)
+                for line in range(2)
+            ])
+
+    def test_invoice_list_query_count_is_fixed(self):
+        self.create_invoices(1)
+        with self.assertNumQueries(2):
+            self.client.get(reverse('invoice-list'))
+
+        self.create_invoices(10)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('invoice-list'))
+
+        self.assertEqual(len(response.json()['results']), 11)
+
+    def test_cursor_pagination_walks_every_invoice_once(self):
+        self.create_invoices(5)
+        seen = []
+        url = reverse('invoice-list') + '?page_size=2&include_items=false'
+        while url:
+            page = self.client.get(url).json()
+            seen.extend(invoice['id'] for invoice in page['results'])
+            url = page['next']
+
+        self.assertEqual(sorted(seen), sorted(Invoice.objects.values_list('id', flat=True)))
+
+    def test_cursor_page_reads_the_ordering_index(self):
+        self.create_invoices(3)
+        next_url = self.client.get(reverse('invoice-list') + '?page_size=1&include_items=false').json()['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(next_url)
+
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('api_invoice_created_a97757_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_sparse_fieldset_skips_items_and_their_query(self):
+        self.create_invoices(3)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('invoice-list') + '?fields=id,invoice_number,total_amount')
+
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'invoice_number', 'total_amount'})
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ModelStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def save_invoices(self, count):
+        payloads = [invoice_payload(f"S-{index}") for index in range(count)]
+        # L'invalidation du cache n'a lieu qu'au commit de la transaction
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('save-invoices'), {'invoices': payloads}, content_type='application/json')
+
+    def test_stats_are_cached_and_invalidated_on_save(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(reverse('model-stats')).json()['total_invoices'], 0)
+        with self.assertNumQueries(0):
+            self.client.get(reverse('model-stats'))
+
+        self.save_invoices(3)
+        stats = self.client.get(reverse('model-stats')).json()
+
+        self.assertEqual(stats['total_invoices'], 3)
+        self.assertEqual(stats['pending_training'], 3)
+
+    @override_settings(MODEL_STATS_INCREMENTAL=True)
+    def test_incremental_counters_follow_saves_and_training(self):
+        self.client.get(reverse('model-stats'))
+        self.save_invoices(5)
+        with self.captureOnCommitCallbacks(execute=True):
+            train_model_with_corrections()
+            Invoice.objects.first().delete()
+
+        expected = count_model_stats()
+        with self.assertNumQueries(2):
+            stats = self.client.get(reverse('model-stats')).json()
+
+        self.assertEqual(expected, {'total_invoices': 4, 'training_data_count': 4, 'used_for_training': 4})
+        self.assertEqual({field: stats[field] for field in expected}, expected)
+
+
+class MappedDocumentTests(TestCase):
+    def test_sniffs_hashes_and_parses_from_one_mapping(self):
+        path = os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf')
+        with open(path, 'rb') as pdf_file:
+            content = pdf_file.read()
+
+        with MappedDocument(path) as document:
+            self.assertEqual(document.format, 'pdf')
+            self.assertEqual(document.sha256(), hashlib.sha256(content).hexdigest())
+            pages = list(iter_pdf_pages(document))
+
+        self.assertEqual(len(pages), 2)
+        self.assertIn('Facture', pages[0])
+
+    def test_pages_with_text_layer_skip_ocr(self):
+        reports = []
+        list(iter_pdf_pages(os.path.join(settings.DATA_SOURCE_DIR, 'TR-scaleway-invoice-2025-01.pdf'), reports))
+
+        self.assertEqual([report.page for report in reports], [1, 2])
+        self.assertEqual({report.source for report in reports}, {'text_layer'})
+
+    def test_extraction_workers_share_ocr_threads(self):
+        self.assertEqual(ocr_workers(), os.cpu_count())
+        self.assertEqual(get_executor().submit(ocr_workers).result(), max(1, os.cpu_count() // pool_size()))
+
+    def test_sniffs_image_formats(self):
+        self.assertEqual(sniff_format(b'\x89PNG\r\n\x1a\n....'), 'png')
+        self.assertEqual(sniff_format(b'\xff\xd8\xff\xe0'), 'jpeg')
+        self.assertEqual(sniff_format(b'not a document'), 'unknown')
+
+
+ACME_INVOICE_TEXT = """ACME SERVICES SAS
+Facture {month} 2025
+SIRET 123 456 789 00012
+Réf. facture : {number}
+Émise le {date}
+
+Hébergement mensuel            100,00 EUR
+TVA (20%): 20,00
+Montant total TTC 120,00 EUR
+"""
+
+
+class SupplierTemplateTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = self.cache_dir
+        self.addCleanup(template_registry.invalidate)
+
+        january = ACME_INVOICE_TEXT.format(month='Janvier', number='AC-0001', date='02/01/2025')
+        self.supplier = Supplier.objects.create(name='ACME Services', address='1 rue du Port, Brest', tax_id='12345678900012')
+        self.template = SupplierTemplate.objects.create(
+            supplier=self.supplier,
+            fingerprint=layout_fingerprint(january),
+            rules=[
+                {'field': 'invoice_number', 'keyword': 'Réf. facture :', 'value': r'\s*(\S+)'},
+                {'field': 'date', 'keyword': 'émise le', 'value': r'\s*(\d{2}/\d{2}/\d{4})'},
+                {'field': 'total_amount', 'keyword': 'total ttc', 'value': r'\s*(\d+,\d{2})'},
+            ]
+        )
+        self.february = ACME_INVOICE_TEXT.format(month='Février', number='AC-0042', date='03/02/2025')
+
+    def test_fingerprint_ignores_invoice_specific_values(self):
+        self.assertEqual(layout_fingerprint(self.february), self.template.fingerprint)
+        self.assertNotEqual(layout_fingerprint(SAMPLE_INVOICE_TEXT), self.template.fingerprint)
+
+    def test_known_layout_uses_supplier_template(self):
+        data = process_invoice_data(self.february)
+
+        self.assertEqual(data['invoice_number'], 'AC-0042')
+        self.assertEqual(data['date'], '03/02/2025')
+        self.assertEqual(data['total_amount'], 120.0)
+        # Champ absent du modèle: règle générique
+        self.assertEqual(data['tax_amount'], 20.0)
+        self.assertEqual(data['supplier'], {
+            'name': 'ACME Services',
+            'address': '1 rue du Port, Brest',
+            'tax_id': '12345678900012'
+        })
+
+    def test_unknown_or_disabled_layout_falls_back_to_generic_rules(self):
+        self.assertEqual(process_invoice_data(SAMPLE_INVOICE_TEXT)['invoice_number'], '2025-001')
+
+        self.template.is_active = False
+        self.template.save()
+
+        self.assertIsNone(process_invoice_data(self.february)['invoice_number'])
+
+    def test_invalid_patterns_are_rejected_before_saving(self):
+        rules_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, rules_dir, ignore_errors=True)
+        rules_path = os.path.join(rules_dir, 'rules.json')
+        for value in (r'\s*(\S+', r'\s*\S+'):
+            with open(rules_path, 'w', encoding='utf-8') as rules_file:
+                json.dump([{'field': 'invoice_number', 'keyword': 'facture', 'value': value}], rules_file)
+            with self.assertRaises(CommandError):
+                call_command(
+                    'register_supplier_template', os.path.join(settings.DATA_SOURCE_DIR, 'TR-OODRIVE.pdf'),
+                    supplier=self.supplier.id, rules=rules_path, stdout=io.StringIO()
+                )
+        self.assertEqual(SupplierTemplate.objects.count(), 1)
+
+    def test_template_keyword_takes_precedence_over_generic_rule(self):
+        rules = compile_rules([{'field': 'due_date', 'keyword': 'Date:', 'value': r'\s*(\d{2}/\d{2}/\d{4})'}])
+        extractor = FieldExtractor(RuleScanner(rules))
+        extractor.feed("ACME\nDate: 31/01/2025\n")
+
+        self.assertEqual([rule.field for rule in rules if rule.keyword == 'date:'], ['due_date'])
+        self.assertEqual((extractor.data['due_date'], extractor.data['date']), ('31/01/2025', None))
+        with self.assertRaises(ValueError):
+            compile_rules([
+                {'field': 'date', 'keyword': 'le', 'value': r'\s*(\S+)'},
+                {'field': 'due_date', 'keyword': 'LE', 'value': r'\s*(\S+)'},
+            ])
+
+    def test_invalid_stored_template_is_skipped(self):
+        # Enregistré sans validation (mise à jour directe en base)
+        broken = SupplierTemplate.objects.create(supplier=self.supplier, fingerprint=layout_fingerprint(SAMPLE_INVOICE_TEXT))
+        SupplierTemplate.objects.filter(id=broken.id).update(
+            rules=[{'field': 'invoice_number', 'keyword': 'facture', 'value': r'\s*\S+'}]
+        )
+
+        with self.assertLogs('api.supplier_templates', 'ERROR'):
+            self.assertEqual(process_invoice_data(self.february)['invoice_number'], 'AC-0042')
+        self.assertEqual(process_invoice_data(SAMPLE_INVOICE_TEXT)['invoice_number'], '2025-001')
+
+
+class BatchInferenceTests(TestCase):
+    def setUp(self):
+        self.addCleanup(model_registry.invalidate)
+
+    def total_line_model(self):
+        weights = np.zeros((FEATURE_DIM, len(LINE_LABELS)), dtype=np.float32)
+        bias = np.zeros(len(LINE_LABELS), dtype=np.float32)
+        bias[LINE_LABELS.index('other')] = 1.0
+        weights[token_buckets(['total'])[0], LINE_LABELS.index('total_amount')] = 5.0
+        return LineModel(weights, bias)
+
+    def test_featurizes_lines_of_all_documents_at_once(self):
+        features, documents, lines = featurize_documents([SAMPLE_INVOICE_TEXT, "", "Total: 10,00"])
+
+        self.assertEqual(features.shape, (len(lines), FEATURE_DIM))
+        self.assertEqual(features.dtype, np.float32)
+        self.assertEqual(documents[-1], 2)
+        self.assertEqual(lines[-1], 'Total: 10,00')
+
+    def test_batch_predictions_match_single_document_predictions(self):
+        rng = np.random.default_rng(0)
+        model = LineModel(rng.normal(size=(FEATURE_DIM, len(LINE_LABELS))), rng.normal(size=len(LINE_LABELS)))
+        texts = [SAMPLE_INVOICE_TEXT, "Facture n° 7\nTOTAL: 3,00", ""]
+
+        self.assertEqual(model.predict_documents(texts), [model.predict_documents([text])[0] for text in texts])
+
+    def test_active_model_predictions_are_added_to_extraction_results(self):
+        model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, model_dir, ignore_errors=True)
+        path = os.path.join(model_dir, 'line_model.npz')
+        self.total_line_model().save(path)
+        MLModel.objects.create(name='InvoiceExtractor', version='0.1', accuracy=0.9, file_path=path, is_active=True)
+
+        result = extract_invoice_result(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'))
+
+        self.assertIn('total', result['predictions']['total_amount']['line'].lower())
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        self.model_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.model_dir, ignore_errors=True)
+        self.registry = ModelRegistry()
+
+    def create_model(self, version, bias_label):
+        bias = np.zeros(len(LINE_LABELS), dtype=np.float32)
+        bias[LINE_LABELS.index(bias_label)] = 1.0
+        path = os.path.join(self.model_dir, f'line_model_v{version}')
+        LineModel(np.zeros((FEATURE_DIM, len(LINE_LABELS))), bias).save(path)
+        model = MLModel.objects.create(name='InvoiceExtractor', version=version, accuracy=0.9, file_path=path, is_active=True)
+        MLModel.objects.exclude(id=model.id).update(is_active=False)
+        return model
+
+    def test_loads_active_model_lazily_with_mapped_weights(self):
+        self.assertIsNone(self.registry.get())
+
+        self.create_model('0.1', 'item')
+        self.registry.invalidate()
+        stats = self.registry.stats()
+        model = self.registry.get()
+
+        self.assertEqual(stats['version'], 'none')
+        self.assertTrue(model.is_mapped)
+        stats = self.registry.stats()
+        self.assertEqual(stats['version'], '0.1')
+        self.assertTrue(stats['loaded'] and stats['memory_mapped'])
+        self.assertEqual(stats['memory_bytes'], model.nbytes)
+
+    def test_new_active_version_is_swapped_in(self):
+        self.create_model('0.1', 'item')
+        first = self.registry.get()
+
+        with self.settings(MODEL_REGISTRY_POLL_SECONDS=3600):
+            self.create_model('0.2', 'date')
+            # Pas encore de vérification: la version en place continue de servir
+            self.assertIs(self.registry.get(), first)
+            self.registry.invalidate()
+            second = self.registry.get()
+
+        self.assertIsNot(second, first)
+        self.assertEqual(self.registry.stats()['version'], '0.2')
+        self.assertIn('date', second.predict_documents([SAMPLE_INVOICE_TEXT])[0])
+
+    def test_unservable_model_format_is_reported_without_loading(self):
+        MLModel.objects.create(name='InvoiceExtractor', version='0.1', accuracy=0.75, file_path='models/invoice_extractor_v0.1.h5', is_active=True)
+
+        self.assertIsNone(self.registry.get())
+        self.assertEqual(self.registry.stats(), {
+            'version': '0.1', 'loaded': False, 'load_seconds': 0.0,
+            'warmup_seconds': 0.0, 'memory_bytes': 0, 'memory_mapped': False
+        })
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class IncrementalTrainingTests(TestCase):
+    def setUp(self):
+        self.addCleanup(model_registry.invalidate)
+
+    def save_corrections(self, numbers):
+        payloads = []
+        for number in numbers:
+            payload = invoice_payload(number, item_count=1)
+            payload['original_extraction'] = {
+                'invoice_number': number, 'date': '15/01/2025', 'total_amount': 200.08, 'tax_amount': 200.08,
+                'supplier': {'name': 'FOURNISSEUR XYZ', 'tax_id': '123456789'}, 'items': []
+            }
+            payloads.append(payload)
+        self.client.post(reverse('save-invoices'), {'invoices': payloads}, content_type='application/json')
+
+    def test_diffs_original_and_corrected_extractions(self):
+        examples = correction_examples(
+            {'invoice_number': 'A-1', 'date': '15/01/2025', 'total_amount': 200.08, 'supplier': {'name': 'XYZ'}},
+            {'invoice': {'invoice_number': 'A-1', 'date': '2025-01-15', 'total_amount': '1400.58'},
+             'supplier': {'name': 'XYZ'}, 'items': [{'description': 'Produit A'}]}
+        )
+
+        self.assertIn(('A-1', 'invoice_number', 1.0), examples)
+        self.assertIn(('15/01/2025', 'date', 1.0), examples)
+        self.assertIn(('1400,58', 'total_amount', settings.TRAINING_CORRECTION_WEIGHT), examples)
+        self.assertIn(('200,08', 'other', 1.0), examples)
+        self.assertIn(('Produit A', 'item', settings.TRAINING_CORRECTION_WEIGHT), examples)
+
+    def test_each_run_trains_only_on_new_corrections(self):
+        self.save_corrections(['2025-001', '2025-002', '2025-003'])
+        self.assertTrue(train_model_with_corrections())
+        first = MLModel.objects.get(is_active=True)
+
+        self.save_corrections(['2025-004'])
+        self.assertTrue(train_model_with_corrections())
+        second = MLModel.objects.get(is_active=True)
+
+        self.assertEqual((first.training_corrections, second.training_corrections), (3, 1))
+        self.assertEqual(second.training_samples * 3, first.training_samples)
+        self.assertGreater(second.training_seconds, 0)
+        # La nouvelle version part des poids de la précédente
+        self.assertGreater(second.accuracy, first.accuracy)
+        predictions = model_registry.get().predict_documents(['1400,58'])[0]
+        self.assertEqual(list(predictions), ['total_amount'])
+        self.assertFalse(train_model_with_corrections())
+
+    def test_failed_training_keeps_corrections_pending(self):
+        self.save_corrections(['2025-001', '2025-002'])
+        # Modèle actif illisible: répertoire sans poids
+        broken = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, broken, ignore_errors=True)
+        MLModel.objects.create(name='InvoiceExtractor', version='0.1', accuracy=0.5, file_path=broken, is_active=True)
+
+        with self.assertLogs('api.ml_processor', 'ERROR'):
+            self.assertFalse(train_model_with_corrections())
+        self.assertEqual(TrainingData.objects.filter(used_for_training=False).count(), 2)
+
+        MLModel.objects.all().delete()
+        self.assertTrue(train_model_with_corrections())
+        self.assertEqual(MLModel.objects.get(is_active=True).training_corrections, 2)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class TrainingExportTests(TestCase):
+    def setUp(self):
+        self.export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.export_dir, ignore_errors=True)
+        self.addCleanup(model_registry.invalidate)
+        override = self.settings(TRAINING_EXPORT_DIR=self.export_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def save_corrections(self, count, start=0):
+        payloads = [invoice_payload(f"2025-{start + index:03d}", item_count=2) for index in range(count)]
+        self.client.post(reverse('save-invoices'), {'invoices': payloads}, content_type='application/json')
+
+    def export(self):
+        output = io.StringIO()
+        call_command('export_training_data', chunk_size=2, stdout=output)
+        return TrainingExport(self.export_dir)
+
+    def test_appends_only_rows_past_the_watermark(self):
+        self.save_corrections(3)
+        first = self.export()
+        self.save_corrections(2, start=3)
+        second = self.export()
+
+        self.assertEqual(first.manifest['rows'], 3)
+        self.assertEqual(second.manifest['rows'], 5)
+        self.assertEqual(second.watermark, TrainingData.objects.latest('id').id)
+        self.assertIsInstance(second.column('row_id'), np.memmap)
+        row = TrainingData.objects.latest('id')
+        self.assertEqual(sorted(second.examples([row.id])), sorted(row_examples(row)))
+
+    def test_interrupted_export_is_resumed(self):
+        self.save_corrections(2)
+        self.export()
+        with open(os.path.join(self.export_dir, 'row_id.bin'), 'ab') as f:
+            f.write(b'\xff' * 16)
+        self.save_corrections(1, start=2)
+        export = self.export()
+
+        row_ids = np.fromfile(os.path.join(self.export_dir, 'row_id.bin'), dtype=np.int64)
+        self.assertEqual(len(row_ids), export.manifest['counts']['row_id'])
+        self.assertEqual(set(export.column('row_id')), set(TrainingData.objects.values_list('id', flat=True)))
+
+    def test_training_reads_exported_examples(self):
+        self.save_corrections(2)
+        export = self.export()
+        # Les champs JSON ne sont plus relus une fois exportés
+        TrainingData.objects.update(corrected_extraction={})
+
+        self.assertTrue(train_model_with_corrections())
+        self.assertEqual(MLModel.objects.get(is_active=True).training_samples, export.manifest['counts']['row_id'])
+
+    def test_rows_below_watermark_missing_from_export_are_read_from_database(self):
+        self.save_corrections(2)
+        first, second = TrainingData.objects.order_by('id')
+        # Première ligne validée après l'export de la seconde
+        export = TrainingExport(self.export_dir)
+        export.append([second], row_examples)
+        self.assertEqual(export.watermark, second.id)
+        self.assertEqual(export.exported_rows([first.id, second.id]), {second.id})
+
+        self.assertTrue(train_model_with_corrections())
+        expected = len(row_examples(first)) + len(row_examples(second))
+        self.assertEqual(MLModel.objects.get(is_active=True).training_samples, expected)
+
+
+class BenchmarkTests(TestCase):
+    def test_reports_latency_memory_and_field_accuracy(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source, ignore_errors=True)
+        shutil.copy(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'), source)
+        with open(os.path.join(source, 'notes.txt'), 'w') as f:
+            f.write("pas une facture")
+        files = corpus_files(source)
+        extracted = process_invoice_data(extract_text_from_pdf(files[0][0]))
+        ground_truth = {'TR-E0406UNMJB.pdf': {
+            'invoice': {'invoice_number': 'AUTRE-001', 'total_amount': extracted['total_amount']},
+            'supplier': {'name': extracted['supplier']['name']}
+        }}
+
+        report = run_benchmark(files, ground_truth, repeat=2)
+
+        self.assertEqual(report['files'], 1)
+        self.assertEqual(set(report['stages']), {'pdf_text', 'fields'})
+        self.assertEqual(report['stages']['fields']['calls'], 2)
+        self.assertGreater(report['stages']['pdf_text']['peak_memory_kb'], 0)
+        self.assertEqual(report['accuracy']['invoice_number']['accuracy'], 0.0)
+        self.assertEqual(report['accuracy']['supplier_name']['accuracy'], 1.0)
+        self.assertEqual(report['overall_accuracy'], round(2 / 3, 4))
+
+    def test_compares_against_baseline(self):
+        stage = {'p50_ms': 10.0, 'p90_ms': 20.0, 'peak_memory_kb': 100.0, 'throughput_per_s': 50.0}
+        baseline = {'stages': {'fields': stage}, 'accuracy': {'date': {'accuracy': 0.9}}}
+        current = {
+            'stages': {'fields': {**stage, 'p50_ms': 15.0, 'throughput_per_s': 45.0}},
+            'accuracy': {'date': {'accuracy': 0.8}}
+        }
+
+        self.assertEqual(compare_reports(baseline, current, tolerance=0.2), [
+            'fields p50_ms: 10.0 -> 15.0',
+            'date accuracy: 0.9 -> 0.8'
+        ])
+        self.assertEqual(compare_reports(baseline, baseline), [])
+
+    def test_corpus_ships_with_ground_truth_and_baseline(self):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, 'ground_truth.json'), encoding='utf-8') as f:
+            ground_truth = json.load(f)
+        with open(os.path.join(settings.BASE_DIR, 'benchmarks', 'baseline.json'), encoding='utf-8') as f:
+            baseline = json.load(f)
+
+        corpus = {os.path.basename(path) for path, _ in corpus_files(settings.DATA_SOURCE_DIR)}
+        self.assertLessEqual(set(ground_truth), corpus)
+        self.assertEqual(baseline['files'], len(corpus))
+        # La référence a été mesurée sur cette vérité terrain
+        labelled = [labelled_values(expected) for expected in ground_truth.values()]
+        for label, field in baseline['accuracy'].items():
+            self.assertEqual(field['total'], sum(1 for values in labelled if values.get(label)))
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = self.cache_dir
+        extraction_cache.entries.clear()
+        override = self.settings(METRICS_DIR=self.metrics_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_upload_reports_stage_timings(self):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'), 'rb') as pdf_file:
+            upload = SimpleUploadedFile('invoice.pdf', pdf_file.read(), content_type='application/pdf')
+        response = self.client.post(reverse('upload-invoice'), {'file': upload})
+
+        stages = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        for stage in ('request_parsing', 'spool', 'text_extraction', 'field_parsing', 'extraction', 'serialization'):
+            self.assertIn(stage, stages)
+        self.assertEqual(stages[-1], 'total')
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_header_is_optional(self):
+        self.assertFalse(self.client.get(reverse('model-stats')).has_header('Server-Timing'))
+
+    def test_metrics_endpoint_sums_every_process(self):
+        worker_counts = [0] * (len(BUCKETS) + 1)
+        worker_counts[0] = 2
+        with open(os.path.join(self.metrics_dir, '1-1.json'), 'w') as f:
+            json.dump({'metrics_test_stage': {'counts': worker_counts, 'total': 0.0015}}, f)
+        observe('metrics_test_stage', 0.003)
+
+        response = self.client.get(reverse('metrics'))
+        text = response.content.decode()
+
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('invoice_stage_seconds_bucket{stage="metrics_test_stage",le="0.001"} 2', text)
+        self.assertIn('invoice_stage_seconds_bucket{stage="metrics_test_stage",le="0.005"} 3', text)
+        self.assertIn('invoice_stage_seconds_count{stage="metrics_test_stage"} 3', text)
+
+
+class AsyncViewsTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = self.cache_dir
+        extraction_cache.entries.clear()
+
+    def upload(self):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'), 'rb') as pdf_file:
+            upload = SimpleUploadedFile('invoice.pdf', pdf_file.read(), content_type='application/pdf')
+        return self.client.post(reverse('async-upload-invoice'), {'file': upload})
+
+    def test_async_upload_extracts_in_the_pool(self):
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertIn('extracted_data', response.json())
+        self.assertEqual(extraction_limiter.in_flight, 0)
+
+    def test_full_queue_answers_429_with_retry_after(self):
+        self.addCleanup(setattr, extraction_limiter, 'in_flight', extraction_limiter.in_flight)
+        extraction_limiter.in_flight = extraction_limiter.capacity
+
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(os.listdir(settings.FILE_UPLOAD_TEMP_DIR), [])
+
+    def test_cancelled_extraction_removes_its_file_once_done(self):
+        file_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, file_dir, ignore_errors=True)
+        path = shutil.copy(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'), file_dir)
+
+        async def cancel_request():
+            request = asyncio.ensure_future(extract_invoice_async(path, remove_file=True))
+            await asyncio.sleep(0)
+            # Requête abandonnée pendant l'extraction (client déconnecté)
+            request.cancel()
+            for _ in range(300):
+                if not extraction_limiter.in_flight:
+                    break
+                await asyncio.sleep(0.1)
+
+        asyncio.run(cancel_request())
+
+        self.assertEqual(extraction_limiter.in_flight, 0)
+        self.assertFalse(os.path.exists(path))
+
+    @override_settings(MAX_UPLOAD_FILE_SIZE=1024)
+    def test_oversized_upload_is_rejected(self):
+        response = self.upload()
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['status'], 'error')
+        self.assertEqual(os.listdir(settings.FILE_UPLOAD_TEMP_DIR), [])
+
+    def test_async_model_stats(self):
+        Invoice.objects.create(
+            invoice_number='2025-001', date='2025-01-15', total_amount=10,
+            supplier=Supplier.objects.create(name='FOURNISSEUR XYZ')
+        )
+
+        response = self.client.get(reverse('async-model-stats'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_invoices'], 1)
+
+
+
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = self.cache_dir
+        extraction_cache.entries.clear()
+        duplicate_index.invalidate()
+        self.addCleanup(duplicate_index.invalidate)
+
+    def save(self, payload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('save-invoice'), payload, content_type='application/json')
+
+    def upload(self):
+        with open(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'), 'rb') as pdf_file:
+            upload = SimpleUploadedFile('invoice.pdf', pdf_file.read(), content_type='application/pdf')
+        return self.client.post(reverse('upload-invoice'), {'file': upload})
+
+    def test_resaved_invoice_is_rejected_with_existing_id(self):
+        first = self.save(invoice_payload('F-2025-001')).json()['invoice_id']
+        # Mêmes fournisseur, numéro, montant et date, autrement écrits
+        payload = invoice_payload('f 2025 001')
+        payload['invoice'].update(date='15/01/2025', total_amount='1 400,58')
+        payload['supplier']['tax_id'] = '123 456 789'
+        response = self.save(payload)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['duplicate_of'], first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('save-invoices'), {'invoices': [
+                invoice_payload('F-2025-001'), invoice_payload('F-2025-002'), invoice_payload('F-2025-002')
+            ]}, content_type='application/json')
+        second, = response.json()['invoice_ids']
+
+        self.assertEqual(response.json()['duplicates'], [
+            {'index': 0, 'duplicate_of': first}, {'index': 2, 'duplicate_of': second}
+        ])
+        self.assertEqual(Invoice.objects.count(), 2)
+
+    def test_key_uses_the_resolved_supplier(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            supplier = Supplier.objects.create(name='FOURNISSEUR XYZ', tax_id='12345678900012')
+        # Numéro de TVA: rapproché du fournisseur par son SIREN
+        payload = invoice_payload('F-2025-001', tax_id='FR32123456789')
+        invoice = Invoice.objects.get(id=self.save(payload).json()['invoice_id'])
+        key = invoice.duplicate_key
+
+        self.assertEqual(invoice.supplier, supplier)
+        self.assertEqual(key, invoice_duplicate_key(invoice))
+        invoice.save()
+        self.assertEqual(invoice.duplicate_key, key)
+        self.assertEqual(find_duplicate(
+            {'extracted_data': {**payload['invoice'], 'supplier': payload['supplier']}},
+            {'id': supplier.id, 'name': supplier.name, 'tax_id': supplier.tax_id}
+        ), {'invoice_id': invoice.id, 'match': 'exact'})
+
+    def test_upload_reports_saved_invoice(self):
+        extracted = self.upload().json()
+        self.assertIsNone(extracted['duplicate'])
+
+        payload = invoice_payload('F-2025-001')
+        payload['text_fingerprint'] = extracted['text_fingerprint']
+        invoice_id = self.save(payload).json()['invoice_id']
+        # Résultat servi par le cache d'extraction: le doublon est tout de même signalé
+        duplicate = self.upload().json()['duplicate']
+
+        self.assertEqual(duplicate, {'invoice_id': invoice_id, 'match': 'near'})
+
+        Invoice.objects.filter(id=invoice_id).delete()
+        self.assertIsNone(self.upload().json()['duplicate'])
+
+    def test_text_fingerprint_tolerates_ocr_noise_only(self):
+        index = DuplicateIndex()
+        supplier = Supplier.objects.create(name='FOURNISSEUR XYZ', tax_id='123456789')
+        invoice = Invoice.objects.create(
+            invoice_number='2025-001', date='2025-01-15', total_amount='1400.58', supplier=supplier,
+            text_fingerprint=to_signed(simhash(SAMPLE_INVOICE_TEXT))
+        )
+        noisy = SAMPLE_INVOICE_TEXT.replace('Paris', 'Pari5').replace('Exemples', 'Exemplcs')
+        next_invoice = (
+            SAMPLE_INVOICE_TEXT.replace('2025-001', '2025-014')
+            .replace('1400,58', '1530,12').replace('15/01', '15/03')
+        )
+
+        self.assertEqual(index.find('', simhash(noisy)), (invoice.id, 'near'))
+        self.assertIsNone(index.find('', simhash(next_invoice)))
+        self.assertEqual(index.find(invoice.duplicate_key, simhash(next_invoice)), (invoice.id, 'exact'))
+        self.assertEqual(len(format_fingerprint(simhash(noisy))), 16)
+
+
+class SupplierResolverTests(TestCase):
+    def setUp(self):
+        supplier_resolver.invalidate()
+        self.addCleanup(supplier_resolver.invalidate)
+
+    def save_batch(self, payloads):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('save-invoices'), {'invoices': payloads}, content_type='application/json')
+
+    def test_name_and_tax_id_variants_reuse_supplier(self):
+        self.save_batch([invoice_payload('A-1', tax_id='')])
+        supplier = Supplier.objects.get()
+        self.save_batch([
+            invoice_payload('A-2', supplier='Fournisseur XYZ SAS', tax_id=''),
+            invoice_payload('A-3', supplier='F0URNISSEUR XYZ', tax_id=''),
+            invoice_payload('A-4', supplier='Société Générale', tax_id='55212022200013'),
+            invoice_payload('A-5', supplier='SOCIETE GENERALE SA', tax_id='FR27552120222'),
+        ])
+
+        self.assertEqual(Supplier.objects.count(), 2)
+        self.assertEqual(Invoice.objects.filter(supplier=supplier).count(), 3)
+        self.assertEqual(normalize_name('Société  Générale, S.A.'), 'SOCIETE GENERALE S A')
+        self.assertEqual(tax_keys('FR 27 552120222'), ('FR27552120222', '552120222'))
+
+    def test_different_tax_ids_are_different_suppliers(self):
+        self.save_batch([invoice_payload('A-1')])
+        self.save_batch([invoice_payload('A-2', tax_id='987654321')])
+
+        self.assertEqual(Supplier.objects.count(), 2)
+
+    def test_index_follows_renames_and_deletions(self):
+        resolver = SupplierResolver()
+        with self.captureOnCommitCallbacks(execute=True):
+            supplier = Supplier.objects.create(name='FOURNISSEUR XYZ', tax_id='')
+        self.assertEqual(resolver.resolve('', 'Fournisseur XYZ'), (supplier.id, 'name'))
+        self.assertIsNone(resolver.resolve('', 'Autre Fournisseur'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            supplier.name = 'Autre Fournisseur'
+            supplier.save()
+        self.assertEqual(supplier_resolver.resolve('', 'AUTRE FOURNISEUR'), (supplier.id, 'name'))
+        with self.captureOnCommitCallbacks(execute=True):
+            supplier.delete()
+        self.assertIsNone(supplier_resolver.resolve('', 'Autre Fournisseur'))
+
+    def test_upload_reports_matched_supplier(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        self.addCleanup(setattr, extraction_cache, 'directory', extraction_cache.directory)
+        extraction_cache.directory = cache_dir
+        extraction_cache.entries.clear()
+        with open(os.path.join(settings.DATA_SOURCE_DIR, 'TR-E0406UNMJB.pdf'), 'rb') as pdf_file:
+            content = pdf_file.read()
+
+        extracted = self.client.post(reverse('upload-invoice'), {
+            'file': SimpleUploadedFile('invoice.pdf', content, content_type='application/pdf')
+        }).json()
+        self.assertIsNone(extracted['supplier_match'])
+
+        self.save_batch([{**invoice_payload('A-1'), 'supplier': extracted['extracted_data']['supplier']}])
+        supplier_match = self.client.post(reverse('upload-invoice'), {
+            'file': SimpleUploadedFile('invoice.pdf', content, content_type='application/pdf')
+        }).json()['supplier_match']
+
+        self.assertEqual(supplier_match['id'], Supplier.objects.get().id)
+
+
+class LineItemTableTests(TestCase):
+    def test_aligned_columns_with_thousands_separators(self):
+        data = extract_fields(
+            "Description                 Qté        P.U.          TVA      Montant\n"
+            "Câble réseau catégorie 6    1 200      0,85 €        20 %     1 020,00 €\n"
+            "Étiquettes                  3          12,50 €                37,50 €\n"
+            "Sous-total:                                                   1 057,50 €\n"
+            "TVA (5,5 %): 2,06\n"
+        )
+
+        self.assertEqual(data['items'], [
+            {'description': 'Câble réseau catégorie 6', 'quantity': 1200.0, 'unit_price': 0.85,
+             'total_price': 1020.0, 'tax_rate': 20.0},
+            {'description': 'Étiquettes', 'quantity': 3.0, 'unit_price': 12.5, 'total_price': 37.5, 'tax_rate': 5.5},
+        ])
+
+    def test_collapsed_columns_follow_header_order(self):
+        data = extract_fields(
+            "Description Qté Prix Unitaire\nHT\nTaux TVA Prix Unitaire\nTTC\n Total\nTTC\n"
+            "Prise extérieure intelligente IP44\nASIN: B0DKD3NGB7\n"
+            "1 18,82 € 0 % (1) 18,82 € 18,82 €\n"
+            "Écran 27 pouces 2 1 250,00 € 20 % 1 500,00 € 3 000,00 €\n"
+            "Livraison 4,99 € 4,99 € 4,99 €\n"
+            "Sous-total 3 023,81 €\nTVA (20%): 500,00 €\n"
+        )
+
+        self.assertEqual([
+            (item['description'], item['quantity'], item['unit_price'], item['total_price'], item['tax_rate'])
+            for item in data['items']
+        ], [
+            ('Prise extérieure intelligente IP44', 1.0, 18.82, 18.82, 0.0),
+            ('Écran 27 pouces', 2.0, 1250.0, 3000.0, 20.0),
+            ('Livraison', 1.0, 4.99, 4.99, 20.0),
+        ])
+        self.assertEqual(parse_number('1.234,50'), 1234.5)
+        self.assertEqual(parse_number('1,234.50'), 1234.5)
+        self.assertIsNone(parse_number('B0DKD3NGB7'))
+
+    def test_long_table_is_parsed_page_by_page(self):
+        rows = [f'Référence {index} 2 {index % 900 + 100},50 € {2 * (index % 900 + 100) + 1},00 €' for index in range(3000)]
+        pages = [
+            'Description Quantité Prix unitaire Montant\n' + '\n'.join(rows[:1500]),
+            '\n'.join(rows[1500:]) + '\nSous-total: 1,00\nTVA (10%): 0,10\n',
+        ]
+
+        items = extract_fields(iter(pages))['items']
+
+        self.assertEqual(len(items), 3000)
+        self.assertEqual(items[-1], {
+            'description': 'Référence 2999', 'quantity': 2.0, 'unit_price': 399.5, 'total_price': 799.0, 'tax_rate': 10.0
+        })
+
+
+class NormalizationTests(TestCase):
+    def test_amounts_are_read_in_every_notation(self):
+        values = [
+            '1 400,58', '1.400,58', '1,400.58', '1\u202f400,58 €', '1400.58', 1400.58, '1.400', '-3,20', '20 %',
+            'abc', '', ',5', '1,,2', None, 12, 'EUR 7,5', 'x\x1fy',
+        ]
+        expected = [
+            Decimal('1400.58'), Decimal('1400.58'), Decimal('1400.58'), Decimal('1400.58'), Decimal('1400.58'),
+            Decimal('1400.58'), Decimal('1400'), Decimal('-3.20'), Decimal('20'),
+            None, None, None, None, None, Decimal('12'), Decimal('7.5'), None,
+        ]
+
+        self.assertEqual([parse_amount(value) for value in values], expected)
+        self.assertEqual(number_parser('fr').parse_many(values), expected)
+        self.assertEqual(number_parser('fr').parse_many(values[:9]), expected[:9])
+        self.assertEqual(parse_amount('1,400', 'en'), Decimal('1400'))
+        self.assertEqual(parse_amount('1.5', 'en'), Decimal('1.5'))
+        self.assertIs(number_parser('en'), number_parser('en'))
+
+    def test_only_well_formed_groups_are_thousands(self):
+        values = ['0.125', '1,2,3', '1.400.000', '12.345.678,9', '1234.567', '1,2.5', '1.2,3.4', '-1.400,5']
+        expected = [
+            Decimal('0.125'), None, Decimal('1400000'), Decimal('12345678.9'), Decimal('1234.567'), None, None,
+            Decimal('-1400.5'),
+        ]
+
+        self.assertEqual([parse_amount(value) for value in values], expected)
+        self.assertEqual(number_parser('fr').parse_many(values), expected)
+        self.assertEqual(parse_amount('0,125', 'en'), Decimal('0.125'))
+        self.assertEqual(number_parser('en').parse_many(['0,125', '1,400', '1,2,3']), [Decimal('0.125'), Decimal('1400'), None])
+
+    def test_dates_are_returned_in_iso_format(self):
+        self.assertEqual(parse_date('15/01/2025'), '2025-01-15')
+        self.assertEqual(parse_date('15.01.25'), '2025-01-15')
+        self.assertEqual(parse_date('31 janv. 2025'), '2025-01-31')
+        self.assertEqual(parse_date('1er mars 2025'), '2025-03-01')
+        self.assertEqual(parse_date('2025-01-15T10:00:00Z'), '2025-01-15')
+        self.assertEqual(parse_date('01/15/2025', 'en'), '2025-01-15')
+        self.assertEqual(parse_date('January 31, 2025', 'en'), '2025-01-31')
+        self.assertIsNone(parse_date('31/02/2025'))
+        self.assertIsNone(parse_date('bientôt'))
+
+    def test_saved_invoice_amounts_and_dates_are_normalized(self):
+        payload = invoice_payload('N-1')
+        payload['invoice'].update(date='15/01/2025', due_date='15 févr. 2025', total_amount='1 400,58', tax_amount='200,08')
+        payload['items'] = [
+            {'description': 'Produit A', 'quantity': '2', 'unit_price': '500,25 €', 'total_price': '1 000,50', 'tax_rate': '20 %'},
+            {'description': 'Service B', 'quantity': 1, 'unit_price': 200, 'total_price': 200.0},
+        ]
+        response = self.client.post(reverse('save-invoice'), payload, content_type='application/json')
+        invoice = Invoice.objects.get(id=response.json()['invoice_id'])
+
+        self.assertEqual((invoice.date.isoformat(), invoice.due_date.isoformat()), ('2025-01-15', '2025-02-15'))
+        self.assertEqual((invoice.total_amount, invoice.tax_amount), (Decimal('1400.58'), Decimal('200.08')))
+        self.assertEqual(
+            list(invoice.items.order_by('id').values_list('quantity', 'unit_price', 'total_price', 'tax_rate')),
+            [(Decimal('2'), Decimal('500.25'), Decimal('1000.50'), Decimal('20')), (1, 200, 200, 0)]
+        )
+        self.assertEqual(normalize_items([{'quantity': '1 000'}])[0]['quantity'], Decimal('1000'))
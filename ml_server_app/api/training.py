@@ -0,0 +1,256 @@
+import os
+import re
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .extraction_cache import extraction_cache
+from .inference import FEATURE_DIM, LINE_LABELS, LineModel, featurize_documents
+from .model_registry import is_servable, model_path
+from .models import MLModel, TrainingData
+from .stats import record_stats_change
+from .training_export import TrainingExport
+
+# Champs des extractions et étiquette de ligne correspondante
+FIELD_LABELS = {
+    'invoice_number': 'invoice_number',
+    'date': 'date',
+    'due_date': 'due_date',
+    'total_amount': 'total_amount',
+    'tax_amount': 'tax_amount',
+}
+SUPPLIER_LABELS = {
+    'name': 'supplier_name',
+    'tax_id': 'supplier_tax_id',
+}
+AMOUNT_FIELDS = frozenset(('total_amount', 'tax_amount'))
+ISO_DATE_PATTERN = re.compile(r'^(\d{4})-(\d{2})-(\d{2})$')
+
+
+def training_due(now=None):
+    """
+    Tell whether the pending corrections should be trained on now
+    """
+    now = now or timezone.now()
+    pending = TrainingData.objects.filter(used_for_training=False).aggregate(
+        count=Count('id'),
+        oldest=Min('created_at'),
+        newest=Max('created_at')
+    )
+    if not pending['count']:
+        return False
+    if pending['count'] >= settings.TRAINING_BATCH_SIZE:
+        return True
+    # Attendre la fin d'une série de corrections, sans retarder indéfiniment
+    if now - pending['newest'] >= timedelta(seconds=settings.TRAINING_DEBOUNCE_SECONDS):
+        return True
+    return now - pending['oldest'] >= timedelta(seconds=settings.TRAINING_MAX_DELAY_SECONDS)
+
+
+def format_value(value, field=None):
+    """
+    Render a field value the way it is printed on French invoices
+    """
+    if isinstance(value, bool) or value is None:
+        return ''
+    if isinstance(value, (int, float)):
+        return f"{value:.2f}".replace('.', ',')
+    if field in AMOUNT_FIELDS:
+        try:
+            return format_value(float(str(value).replace(',', '.')), field)
+        except ValueError:
+            pass
+    value = ' '.join(str(value).split())
+    iso_date = ISO_DATE_PATTERN.match(value)
+    if iso_date:
+        year, month, day = iso_date.groups()
+        return f"{day}/{month}/{year}"
+    return value
+
+
+def labelled_values(extraction):
+    """
+    Return {label: set of rendered values} for an original or corrected extraction
+    """
+    # Extraction d'origine: champs à plat; correction: {'invoice', 'supplier', 'items'}
+    invoice = extraction.get('invoice', extraction)
+    values = {}
+    for field, label in FIELD_LABELS.items():
+        values.setdefault(label, set()).add(format_value(invoice.get(field), field))
+    for field, label in SUPPLIER_LABELS.items():
+        values.setdefault(label, set()).add(format_value((extraction.get('supplier') or {}).get(field)))
+    values['item'] = {format_value(item.get('description')) for item in extraction.get('items') or []}
+    return {label: rendered - {''} for label, rendered in values.items()}
+
+
+def correction_examples(original, corrected):
+    """
+    Diff an extraction against its correction into (line, label, weight) examples.
+
+    Corrected values are positive examples, weighted up when the original
+    extraction got them wrong; wrong original values that match no
+    corrected field become 'other' examples.
+    """
+    original_values = labelled_values(original or {})
+    corrected_values = labelled_values(corrected or {})
+    all_corrected = set().union(*corrected_values.values())
+
+    examples = []
+    for label, values in corrected_values.items():
+        for value in values:
+            changed = value not in original_values.get(label, ())
+            examples.append((value, label, settings.TRAINING_CORRECTION_WEIGHT if changed else 1.0))
+    for label, values in original_values.items():
+        for value in values - corrected_values.get(label, set()) - all_corrected:
+            examples.append((value, 'other', 1.0))
+    return examples
+
+
+def row_examples(row):
+    return correction_examples(row.original_extraction, row.corrected_extraction)
+
+
+def claim_pending_corrections(training_data_ids=None):
+    """
+    Atomically claim the corrections not yet trained on, returning the ids
+    of those this call claimed
+    """
+    with transaction.atomic():
+        pending = TrainingData.objects.filter(used_for_training=False).order_by('id')
+        if training_data_ids is not None:
+            pending = pending.filter(id__in=training_data_ids)
+        if connection.features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+        ids = list(pending.values_list('id', flat=True))
+        # Sous SQLite il n'y a pas de verrou de ligne: seule la ligne que cette mise
+        # à jour conditionnelle fait passer à True est à nous, un autre processus
+        # qui l'a lue en même temps ne l'obtient pas
+        return [
+            training_data_id for training_data_id in ids
+            if TrainingData.objects.filter(id=training_data_id, used_for_training=False).update(used_for_training=True)
+        ]
+
+
+def pending_examples(ids):
+    """
+    Examples of the given corrections, from the columnar export when it
+    covers them and from the database otherwise
+    """
+    export = TrainingExport(settings.TRAINING_EXPORT_DIR)
+    examples = export.examples(ids)
+    # Pas de déduction depuis le watermark: une ligne validée après l'export peut
+    # avoir un id inférieur, et n'est alors lue que depuis la base
+    missing = sorted(set(ids) - export.exported_rows(ids))
+    rows = (
+        TrainingData.objects.filter(id__in=missing)
+        .only('id', 'original_extraction', 'corrected_extraction')
+        .iterator()
+    )
+    for row in rows:
+        examples.extend(row_examples(row))
+    return examples
+
+
+def base_model(active):
+    """
+    Writable copy of the active model to update, or a blank model
+    """
+    if active is not None:
+        path = model_path(active.file_path)
+        if is_servable(path):
+            current = LineModel.load(path)
+            return LineModel(np.array(current.weights), np.array(current.bias), current.labels)
+    return LineModel(
+        np.zeros((FEATURE_DIM, len(LINE_LABELS)), dtype=np.float32), np.zeros(len(LINE_LABELS), dtype=np.float32)
+    )
+
+
+def fit_incremental(model, features, targets, sample_weights):
+    """
+    Update a model in place with a few epochs of mini-batch gradient descent
+    on the new examples only
+    """
+    rng = np.random.default_rng(0)
+    batch_size = settings.TRAINING_MINIBATCH_SIZE
+    for _ in range(settings.TRAINING_EPOCHS):
+        order = rng.permutation(len(targets))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            gradient = model.predict_proba(features[batch])
+            gradient[np.arange(len(batch)), targets[batch]] -= 1.0
+            gradient *= (sample_weights[batch] / sample_weights[batch].sum())[:, None]
+            model.weights -= settings.TRAINING_LEARNING_RATE * (features[batch].T @ gradient)
+            model.bias -= settings.TRAINING_LEARNING_RATE * gradient.sum(axis=0)
+
+
+def release_corrections(ids):
+    """
+    Return claimed corrections to the pending ones, after a failed training
+    """
+    TrainingData.objects.filter(id__in=ids).update(used_for_training=False)
+
+
+def train_on_pending_corrections(training_data_ids=None):
+    """
+    Update the active model with the pending corrections and publish it as a
+    new version. Returns the new MLModel, or None if nothing was pending.
+
+    If training fails, the claimed corrections are released for the next
+    run and the error is raised again.
+    """
+    started = time.perf_counter()
+    ids = claim_pending_corrections(training_data_ids)
+    if not ids:
+        return None
+    try:
+        new_model = train_and_publish(ids, started)
+    except Exception:
+        release_corrections(ids)
+        raise
+    record_stats_change(used_for_training=len(ids))
+    # Les extractions en cache ont été produites par l'ancien modèle
+    extraction_cache.invalidate()
+    return new_model
+
+
+def train_and_publish(ids, started):
+    """
+    Train a copy of the active model on the claimed corrections and make it the active version
+    """
+    examples = pending_examples(ids)
+
+    active = MLModel.objects.filter(is_active=True).first()
+    model = base_model(active)
+    accuracy = active.accuracy if active is not None else 0.0
+    if examples:
+        lines, labels, weights = zip(*examples)
+        features, _, _ = featurize_documents(lines)
+        targets = np.array([model.labels.index(label) for label in labels], dtype=np.intp)
+        sample_weights = np.array(weights, dtype=np.float32)
+        # Validation progressive: précision du modèle courant sur les corrections qu'il n'a pas encore vues
+        accuracy = float((model.predict_proba(features).argmax(axis=1) == targets).mean())
+        fit_incremental(model, features, targets, sample_weights)
+
+    version = f"0.{MLModel.objects.count() + 1}"
+    file_path = os.path.join('models', f'line_model_v{version}')
+    model.save(model_path(file_path))
+    with transaction.atomic():
+        new_model = MLModel.objects.create(
+            name="InvoiceExtractor",
+            version=version,
+            accuracy=accuracy,
+            file_path=file_path,
+            is_active=True,
+            training_corrections=len(ids),
+            training_samples=len(examples),
+            training_seconds=time.perf_counter() - started
+        )
+        # Désactiver les modèles précédents
+        MLModel.objects.exclude(id=new_model.id).update(is_active=False)
+    return new_model
+
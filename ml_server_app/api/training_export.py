@@ -0,0 +1,181 @@
+import json
+import os
+
+import numpy as np
+
+from .inference import LINE_LABELS
+
+MANIFEST = 'manifest.json'
+# Une colonne par fichier brut, lue par projection mémoire: un élément par
+# exemple d'entraînement, sauf `text` qui contient les lignes en UTF-8 bout à bout
+# (l'exemple i occupe text[text_end[i - 1]:text_end[i]])
+COLUMNS = {
+    'row_id': np.int64,
+    'invoice_id': np.int64,
+    'label': np.uint8,
+    'weight': np.float32,
+    'text_end': np.int64,
+    'text': np.uint8,
+}
+
+
+def empty_manifest():
+    return {'watermark': 0, 'rows': 0, 'labels': list(LINE_LABELS), 'counts': dict.fromkeys(COLUMNS, 0)}
+
+
+class Chunk:
+    """
+    Examples buffered in memory until the next write
+    """
+
+    def __init__(self, text_start):
+        self.values = {name: [] for name in COLUMNS if name != 'text'}
+        self.text = bytearray()
+        self.text_start = text_start
+        self.rows = 0
+        self.watermark = None
+
+    def add(self, row, line, label, weight):
+        self.text += line.encode('utf-8')
+        self.values['row_id'].append(row.id)
+        self.values['invoice_id'].append(row.invoice_id)
+        self.values['label'].append(label)
+        self.values['weight'].append(weight)
+        self.values['text_end'].append(self.text_start + len(self.text))
+
+    def columns(self):
+        columns = {name: np.asarray(values, dtype=COLUMNS[name]) for name, values in self.values.items()}
+        columns['text'] = np.frombuffer(bytes(self.text), dtype=np.uint8)
+        return columns
+
+
+class TrainingExport:
+    """
+    Append-only columnar export of the examples derived from TrainingData.
+
+    Rows are appended in id order; the manifest records the highest
+    exported id (watermark) and the length of each column, and is replaced
+    atomically after the columns are written, so that an interrupted export
+    is simply resumed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        path = os.path.join(directory, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = empty_manifest()
+
+    @property
+    def watermark(self):
+        return self.manifest['watermark']
+
+    @property
+    def labels(self):
+        return self.manifest['labels']
+
+    def column(self, name):
+        count = self.manifest['counts'][name]
+        if not count:
+            return np.empty(0, dtype=COLUMNS[name])
+        return np.memmap(self._path(name), dtype=COLUMNS[name], mode='r', shape=(count,))
+
+    def append(self, rows, examples_of, chunk_size=1000):
+        """
+        Append rows (TrainingData, by increasing id) with their (line, label, weight)
+        examples, writing the columns every `chunk_size` rows. Returns the number of rows.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._truncate()
+        label_index = {label: index for index, label in enumerate(self.labels)}
+        appended = 0
+        chunk = Chunk(self.manifest['counts']['text'])
+
+        for row in rows:
+            for line, label, weight in examples_of(row):
+                chunk.add(row, line, label_index[label], weight)
+            chunk.rows += 1
+            chunk.watermark = row.id
+            appended += 1
+            if chunk.rows == chunk_size:
+                self._write(chunk)
+                chunk = Chunk(self.manifest['counts']['text'])
+        if chunk.rows:
+            self._write(chunk)
+        return appended
+
+    def row_ranges(self, row_ids):
+        """
+        Return the exported rows among row_ids, with the start and end
+        position of their examples.
+
+        Rows are appended by increasing id, so row_id is sorted: a binary
+        search per requested row, whatever the size of the export.
+        """
+        row_id = self.column('row_id')
+        wanted = np.unique(np.asarray(row_ids, dtype=np.int64))
+        starts = np.searchsorted(row_id, wanted, side='left')
+        ends = np.searchsorted(row_id, wanted, side='right')
+        found = ends > starts
+        return wanted[found], starts[found], ends[found]
+
+    def exported_rows(self, row_ids):
+        """
+        Return the set of row_ids that have examples in the export
+        """
+        return set(self.row_ranges(row_ids)[0].tolist())
+
+    def examples(self, row_ids):
+        """
+        Return the (line, label, weight) examples of the given rows
+        """
+        _, starts, ends = self.row_ranges(row_ids)
+        if not len(starts):
+            return []
+        text = self.column('text')
+        text_end = self.column('text_end')
+        labels = self.column('label')
+        weights = self.column('weight')
+        examples = []
+        for first, end in zip(starts.tolist(), ends.tolist()):
+            for index in range(first, end):
+                start = text_end[index - 1] if index else 0
+                line = bytes(text[start:text_end[index]]).decode('utf-8')
+                examples.append((line, self.labels[labels[index]], float(weights[index])))
+        return examples
+
+    def reset(self):
+        for name in COLUMNS:
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self.manifest = empty_manifest()
+        self._save_manifest()
+
+    def _path(self, name):
+        return os.path.join(self.directory, f'{name}.bin')
+
+    def _truncate(self):
+        # Données écrites après le dernier manifeste (export interrompu): ignorées
+        for name, dtype in COLUMNS.items():
+            path = self._path(name)
+            if os.path.exists(path):
+                os.truncate(path, self.manifest['counts'][name] * np.dtype(dtype).itemsize)
+
+    def _write(self, chunk):
+        for name, values in chunk.columns().items():
+            with open(self._path(name), 'ab') as f:
+                f.write(values.tobytes())
+            self.manifest['counts'][name] += len(values)
+        self.manifest['rows'] += chunk.rows
+        self.manifest['watermark'] = chunk.watermark
+        self._save_manifest()
+
+    def _save_manifest(self):
+        path = os.path.join(self.directory, MANIFEST)
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f)
+        os.replace(temporary, path)
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Uploaded file is too large.'
+    default_code = 'upload_too_large'
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream uploaded files to FILE_UPLOAD_TEMP_DIR, hashing them on the way.
+
+    Files never sit in memory whatever their size: each chunk is hashed
+    and written as soon as it is read. The SHA-256 digest is exposed as
+    `sha256` on the resulting TemporaryUploadedFile.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Refus avant même de lire le corps de la requête
+        if content_length and content_length > settings.MAX_UPLOAD_REQUEST_SIZE:
+            raise UploadTooLarge(f"Request body exceeds {settings.MAX_UPLOAD_REQUEST_SIZE} bytes.")
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.MAX_UPLOAD_FILE_SIZE:
+            self.upload_interrupted()
+            raise UploadTooLarge(f"{self.file_name} exceeds {settings.MAX_UPLOAD_FILE_SIZE} bytes.")
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.digest.hexdigest()
+        return uploaded_file
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'suppliers', views.SupplierViewSet)
@@ -11,6 +11,13 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('', include(router.urls)),
     path('upload-invoice/', views.upload_invoice, name='upload-invoice'),
+    path('upload-invoices/batch/', views.upload_invoices_batch, name='upload-invoices-batch'),
+    path('extraction-jobs/<int:job_id>/', views.get_extraction_job, name='extraction-job'),
     path('save-invoice/', views.save_invoice_with_corrections, name='save-invoice'),
+    path('save-invoices/', views.save_invoices_with_corrections, name='save-invoices'),
     path('model-stats/', views.get_model_stats, name='model-stats'),
+    path('metrics/', views.metrics, name='metrics'),
+    # Versions asynchrones, à servir par ASGI (uvicorn ml_server_app.asgi:application)
+    path('async/upload-invoice/', async_views.upload_invoice, name='async-upload-invoice'),
+    path('async/model-stats/', async_views.get_model_stats, name='async-model-stats'),
 ]
\ No newline at end of file
@@ -1,30 +1,42 @@
 import os
 import json
+import hashlib
 import tempfile
+import zipfile
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.conf import settings
 from django.db import transaction
 from rest_framework import viewsets, status
 from rest_framework.decorators import api_view, parser_classes, action
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 
-from .models import Invoice, Supplier, InvoiceItem, MLModel, TrainingData
+from .models import Invoice, Supplier, InvoiceItem, ExtractionJob
 from .serializers import (
     InvoiceSerializer, 
     SupplierSerializer, 
     InvoiceItemSerializer,
-    MLModelSerializer,
-    TrainingDataSerializer,
-    InvoiceUploadSerializer
-)
-from .ml_processor import (
-    extract_text_from_pdf,
-    extract_text_from_image,
-    process_invoice_data,
-    train_model_with_corrections
+    InvoiceUploadSerializer,
+    InvoiceBatchUploadSerializer,
+    requested_fields,
+    includes_items
 )
+from .pagination import InvoiceCursorPagination, InvoiceItemCursorPagination
+from .ml_processor import extract_invoice_result
+from .duplicates import find_duplicate
+from .extraction_cache import extraction_cache, get_active_model_version
+from .extraction_pool import extract_many
+from .metrics import render_prometheus, timed
+from .model_registry import model_registry
+from .invoice_store import save_corrected_invoices
+from .stats import get_cached_model_stats
+from .supplier_resolver import match_supplier
+from .upload_handlers import UploadTooLarge
+
+# Taille des blocs lus dans les archives zip
+ZIP_CHUNK_SIZE = 64 * 1024
 
 # Index view
 @api_view(['GET'])
@@ -41,6 +53,18 @@ class SupplierViewSet(viewsets.ModelViewSet):
 class InvoiceViewSet(viewsets.ModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
+    pagination_class = InvoiceCursorPagination
+    
+    def get_queryset(self):
+        # Fournisseur et lignes chargés en deux requêtes au total, pas une par facture,
+        # et seulement s'ils font partie de la réponse
+        queryset = Invoice.objects.all()
+        fields = requested_fields(self.request)
+        if fields is None or 'supplier_name' in fields:
+            queryset = queryset.select_related('supplier')
+        if includes_items(self.request):
+            queryset = queryset.prefetch_related('items')
+        return queryset
     
     @action(detail=True, methods=['get'])
     def items(self, request, pk=None):
@@ -52,6 +76,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
 class InvoiceItemViewSet(viewsets.ModelViewSet):
     queryset = InvoiceItem.objects.all()
     serializer_class = InvoiceItemSerializer
+    pagination_class = InvoiceItemCursorPagination
     
     def get_queryset(self):
         queryset = InvoiceItem.objects.all()
@@ -60,36 +85,253 @@ class InvoiceItemViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(invoice_id=invoice_id)
         return queryset
 
+def spool_chunks(chunks, filename, limit=None):
+    """
+    Write byte chunks to a temporary path, hashing them on the way.
+
+    Raises UploadTooLarge, without leaving the file behind, past `limit` bytes.
+    """
+    digest = hashlib.sha256()
+    suffix = os.path.splitext(filename)[1].lower()
+    written = 0
+    with tempfile.NamedTemporaryFile(suffix=suffix, dir=settings.FILE_UPLOAD_TEMP_DIR, delete=False) as tmp_file:
+        try:
+            for chunk in chunks:
+                written += len(chunk)
+                if limit is not None and written > limit:
+                    raise UploadTooLarge(f"{filename} exceeds {limit} bytes.")
+                digest.update(chunk)
+                tmp_file.write(chunk)
+        except BaseException:
+            tmp_file.close()
+            os.remove(tmp_file.name)
+            raise
+    return tmp_file.name, digest.hexdigest()
+
+def spool_upload(uploaded_file):
+    # Déjà écrit sur disque et haché par HashingFileUploadHandler: aucune copie
+    if hasattr(uploaded_file, 'sha256'):
+        return uploaded_file.temporary_file_path(), uploaded_file.sha256
+    return spool_chunks(uploaded_file.chunks(), uploaded_file.name)
+
+def hash_upload(uploaded_file):
+    if hasattr(uploaded_file, 'sha256'):
+        return uploaded_file.sha256
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def queue_upload(uploaded_file):
+    """
+    Queue an uploaded invoice for the extraction worker
+    """
+    digest = hash_upload(uploaded_file)
+    model_version = get_active_model_version()
+    
+    result = extraction_cache.get(digest, model_version)
+    if result is not None:
+        return Response({
+            'status': 'success',
+            **result
+        })
+    
+    job = ExtractionJob(filename=uploaded_file.name, digest=digest, model_version=model_version)
+    job.file.save(uploaded_file.name, uploaded_file)
+    return Response({
+        'status': 'queued',
+        'job_id': job.id
+    }, status=status.HTTP_202_ACCEPTED)
+
+def spool_batch_file(uploaded_file):
+    """
+    Spool one batch upload, expanding zip archives into their documents.
+
+    Each document of an archive is limited to MAX_UPLOAD_FILE_SIZE and the
+    whole archive to MAX_UPLOAD_ARCHIVE_SIZE once uncompressed: the sizes
+    declared by the archive are checked first, then the bytes actually
+    written, so that a lying archive is stopped as well.
+    """
+    if not uploaded_file.name.lower().endswith('.zip'):
+        path, digest = spool_upload(uploaded_file)
+        return [{'filename': uploaded_file.name, 'path': path, 'digest': digest}]
+
+    entries = []
+    try:
+        with zipfile.ZipFile(uploaded_file) as archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            # Refus avant toute décompression
+            for info in members:
+                if info.file_size > settings.MAX_UPLOAD_FILE_SIZE:
+                    raise UploadTooLarge(f"{info.filename} exceeds {settings.MAX_UPLOAD_FILE_SIZE} bytes.")
+            if sum(info.file_size for info in members) > settings.MAX_UPLOAD_ARCHIVE_SIZE:
+                raise UploadTooLarge(
+                    f"{uploaded_file.name} exceeds {settings.MAX_UPLOAD_ARCHIVE_SIZE} bytes uncompressed."
+                )
+
+            remaining = settings.MAX_UPLOAD_ARCHIVE_SIZE
+            for info in members:
+                filename = f"{uploaded_file.name}/{info.filename}"
+                limit = min(settings.MAX_UPLOAD_FILE_SIZE, remaining)
+                with archive.open(info) as member:
+                    path, digest = spool_chunks(iter(lambda: member.read(ZIP_CHUNK_SIZE), b''), info.filename, limit)
+                entries.append({'filename': filename, 'path': path, 'digest': digest})
+                remaining -= os.path.getsize(path)
+    except zipfile.BadZipFile as e:
+        entries.append({'filename': uploaded_file.name, 'error': str(e)})
+    except UploadTooLarge:
+        # Les documents déjà extraits de l'archive ne seront pas traités
+        for entry in entries:
+            os.remove(entry['path'])
+        raise
+    return entries
+
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
 def upload_invoice(request):
     """
     Upload and process an invoice file (PDF or image)
     """
-    serializer = InvoiceUploadSerializer(data=request.data)
+    # Lecture du corps multipart (fichier écrit sur disque et haché à la volée)
+    with timed('request_parsing'):
+        serializer = InvoiceUploadSerializer(data=request.data)
     
     if serializer.is_valid():
         invoice_file = serializer.validated_data['file']
+        file_path = None
+        
+        # ?async=true: l'extraction est confiée au worker (manage.py run_extraction_worker)
+        if request.query_params.get('async', '').lower() in ('1', 'true'):
+            try:
+                return queue_upload(invoice_file)
+            except Exception as e:
+                return Response({
+                    'status': 'error',
+                    'message': str(e)
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
         try:
-            # Pour cette version simplifiée, nous n'avons pas besoin de traiter le fichier réel
-            # Nous utilisons directement la fonction process_invoice_data avec un texte simulé
-            extracted_text = extract_text_from_pdf(None)  # Utilise le texte simulé
+            with timed('spool'):
+                file_path, digest = spool_upload(invoice_file)
+            with timed('cache_lookup'):
+                model_version = get_active_model_version()
+                # Un fichier déjà traité par le modèle actif n'est pas ré-extrait
+                result = extraction_cache.get(digest, model_version)
+            if result is None:
+                with timed('extraction'):
+                    result = extract_invoice_result(file_path)
+                extraction_cache.set(digest, model_version, result)
+            # Hors cache: une facture enregistrée depuis l'extraction doit être signalée
+            with timed('supplier_lookup'):
+                supplier_match = match_supplier(result['extracted_data'].get('supplier'))
+            with timed('duplicate_lookup'):
+                duplicate = find_duplicate(result, supplier_match)
             
-            # Process the extracted text with rule-based approach
-            extracted_data = process_invoice_data(extracted_text)
+            return Response({
+                'status': 'success',
+                **result,
+                'duplicate': duplicate,
+                'supplier_match': supplier_match
+            })
+            
+        except Exception as e:
+            return Response({
+                'status': 'error',
+                'message': str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            if file_path is not None:
+                os.remove(file_path)
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+def get_extraction_job(request, job_id):
+    """
+    Get the status, and once done the result, of a queued extraction
+    """
+    job = get_object_or_404(ExtractionJob, id=job_id)
+    response = {
+        'status': 'success',
+        'job_id': job.id,
+        'job_status': job.status,
+        'filename': job.filename
+    }
+    if job.status == 'done':
+        response.update(job.result)
+        response['supplier_match'] = match_supplier(job.result['extracted_data'].get('supplier'))
+        response['duplicate'] = find_duplicate(job.result, response['supplier_match'])
+    elif job.status == 'failed':
+        response['message'] = job.error
+    return Response(response)
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def upload_invoices_batch(request):
+    """
+    Upload and process many invoice files (or zip archives) in parallel
+    """
+    with timed('request_parsing'):
+        serializer = InvoiceBatchUploadSerializer(data=request.data)
+    
+    if serializer.is_valid():
+        entries = []
+        
+        try:
+            with timed('spool'):
+                for uploaded_file in serializer.validated_data['files']:
+                    entries.extend(spool_batch_file(uploaded_file))
+            model_version = get_active_model_version()
+            
+            results = [None] * len(entries)
+            pending = {}  # digest -> positions des fichiers à extraire
+            for index, entry in enumerate(entries):
+                if 'error' in entry:
+                    results[index] = {'filename': entry['filename'], 'status': 'error', 'message': entry['error']}
+                    continue
+                cached = extraction_cache.get(entry['digest'], model_version)
+                if cached is not None:
+                    results[index] = {'filename': entry['filename'], 'status': 'success', **cached}
+                else:
+                    pending.setdefault(entry['digest'], []).append(index)
+            
+            # Les extractions manquantes sont réparties sur le pool de processus
+            paths = [entries[indexes[0]]['path'] for indexes in pending.values()]
+            with timed('extraction'):
+                extracted = extract_many(paths) if paths else []
+            for (digest, indexes), result in zip(pending.items(), extracted):
+                if result['status'] == 'success':
+                    extraction_cache.set(digest, model_version, {
+                        key: value for key, value in result.items() if key != 'status'
+                    })
+                for index in indexes:
+                    results[index] = {'filename': entries[index]['filename'], **result}
+            with timed('supplier_lookup'):
+                for result in results:
+                    if result['status'] == 'success':
+                        result['supplier_match'] = match_supplier(result['extracted_data'].get('supplier'))
+            with timed('duplicate_lookup'):
+                for result in results:
+                    if result['status'] == 'success':
+                        result['duplicate'] = find_duplicate(result, result['supplier_match'])
             
             return Response({
                 'status': 'success',
-                'extracted_data': extracted_data,
-                'original_text': extracted_text[:1000]  # Limit text size in response
+                'results': results
             })
             
+        except APIException:
+            # Archive trop volumineuse (413): réponse d'erreur de DRF, comme pour un envoi direct
+            raise
         except Exception as e:
             return Response({
                 'status': 'error',
                 'message': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        finally:
+            for entry in entries:
+                if 'path' in entry:
+                    os.remove(entry['path'])
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -101,59 +343,17 @@ def save_invoice_with_corrections(request):
     """
     try:
         with transaction.atomic():
-            data = request.data
-            
-            # Get or create supplier
-            supplier_data = data.get('supplier', {})
-            supplier, created = Supplier.objects.get_or_create(
-                name=supplier_data.get('name'),
-                defaults={
-                    'address': supplier_data.get('address', ''),
-                    'tax_id': supplier_data.get('tax_id', '')
-                }
-            )
-            
-            # Create invoice
-            invoice_data = data.get('invoice', {})
-            invoice = Invoice.objects.create(
-                invoice_number=invoice_data.get('invoice_number'),
-                date=invoice_data.get('date'),
-                due_date=invoice_data.get('due_date'),
-                supplier=supplier,
-                total_amount=invoice_data.get('total_amount'),
-                tax_amount=invoice_data.get('tax_amount', 0),
-                status='validated',
-                original_file=request.data.get('file_path', '')
-            )
-            
-            # Create invoice items
-            items_data = data.get('items', [])
-            for item_data in items_data:
-                InvoiceItem.objects.create(
-                    invoice=invoice,
-                    description=item_data.get('description'),
-                    quantity=item_data.get('quantity'),
-                    unit_price=item_data.get('unit_price'),
-                    total_price=item_data.get('total_price'),
-                    tax_rate=item_data.get('tax_rate', 0)
-                )
-            
-            # Save training data
-            original_extraction = data.get('original_extraction', {})
-            corrected_extraction = {
-                'invoice': invoice_data,
-                'supplier': supplier_data,
-                'items': items_data
-            }
+            invoices, duplicates = save_corrected_invoices([request.data])
+            if duplicates:
+                return Response({
+                    'status': 'error',
+                    'message': 'Invoice already saved',
+                    'duplicate_of': duplicates[0]
+                }, status=status.HTTP_409_CONFLICT)
+            invoice, = invoices
             
-            training_data = TrainingData.objects.create(
-                invoice=invoice,
-                original_extraction=original_extraction,
-                corrected_extraction=corrected_extraction
-            )
-            
-            # Trigger async model training (in a real app, this would be a background task)
-            train_model_with_corrections(training_data.id)
+            # L'entraînement est déclenché hors requête par manage.py run_training_scheduler,
+            # qui regroupe les corrections en attente
             
             return Response({
                 'status': 'success',
@@ -167,24 +367,52 @@ def save_invoice_with_corrections(request):
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['POST'])
+@parser_classes([JSONParser])
+def save_invoices_with_corrections(request):
+    """
+    Save many corrected invoices in a single transaction
+    """
+    payloads = request.data.get('invoices') if isinstance(request.data, dict) else request.data
+    if not isinstance(payloads, list) or not payloads:
+        return Response({
+            'status': 'error',
+            'message': "A non-empty 'invoices' list is required"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        with transaction.atomic():
+            invoices, duplicates = save_corrected_invoices(payloads)
+            
+            return Response({
+                'status': 'success',
+                'message': f'{len(invoices)} invoices saved successfully and will be used for training',
+                'invoice_ids': [invoice.id for invoice in invoices],
+                # Factures déjà enregistrées, ignorées: position dans le lot et facture existante
+                'duplicates': [
+                    {'index': index, 'duplicate_of': invoice_id}
+                    for index, invoice_id in duplicates.items()
+                ]
+            })
+            
+    except Exception as e:
+        return Response({
+            'status': 'error',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 @api_view(['GET'])
 def get_model_stats(request):
     """
     Get statistics about the ML model and training data
     """
     try:
-        active_model = MLModel.objects.filter(is_active=True).first()
-        total_invoices = Invoice.objects.count()
-        training_data_count = TrainingData.objects.count()
-        used_for_training = TrainingData.objects.filter(used_for_training=True).count()
-        
         return Response({
             'status': 'success',
-            'active_model': MLModelSerializer(active_model).data if active_model else None,
-            'total_invoices': total_invoices,
-            'training_data_count': training_data_count,
-            'used_for_training': used_for_training,
-            'pending_training': training_data_count - used_for_training
+            **get_cached_model_stats(),
+            'extraction_cache': extraction_cache.stats(),
+            # Modèle chargé par ce processus: temps de chargement, d'échauffement et mémoire
+            'serving_model': model_registry.stats()
         })
         
     except Exception as e:
@@ -192,3 +420,11 @@ def get_model_stats(request):
             'status': 'error',
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+def metrics(request):
+    """
+    Stage duration histograms of every process, in the Prometheus text format
+    """
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ServerTimingMiddleware',
 ]
 
 ROOT_URLCONF = 'ml_server_app.urls'
@@ -82,6 +84,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de test dans un fichier: les workers d'extraction (api.extraction_pool)
+        # y ouvrent leur propre connexion, une base en mémoire leur serait invisible
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -140,7 +145,7 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.TimedJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
@@ -169,4 +174,100 @@ CORS_ALLOW_HEADERS = [
 
 # ML model storage
 ML_MODEL_DIR = os.path.join(BASE_DIR, 'ml_models')
-os.makedirs(ML_MODEL_DIR, exist_ok=True)
\ No newline at end of file
+os.makedirs(ML_MODEL_DIR, exist_ok=True)
+
+# Envois de fichiers: écrits par blocs sous MEDIA_ROOT et hachés à la volée,
+# sans jamais être gardés en mémoire (voir api.upload_handlers)
+FILE_UPLOAD_HANDLERS = ['api.upload_handlers.HashingFileUploadHandler']
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'uploads')
+os.makedirs(FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+MAX_UPLOAD_FILE_SIZE = 50 * 1024 * 1024
+MAX_UPLOAD_REQUEST_SIZE = 500 * 1024 * 1024
+# Taille totale, une fois décompressés, des documents d'une archive zip envoyée en lot
+# (chaque document reste limité à MAX_UPLOAD_FILE_SIZE)
+MAX_UPLOAD_ARCHIVE_SIZE = 500 * 1024 * 1024
+
+# Cache des résultats d'extraction (clé: SHA-256 du fichier + version du modèle actif)
+EXTRACTION_CACHE_SIZE = 256
+EXTRACTION_CACHE_DIR = os.path.join(MEDIA_ROOT, 'extraction_cache')
+
+# Planification de l'entraînement (manage.py run_training_scheduler): un
+# entraînement est lancé dès TRAINING_BATCH_SIZE corrections en attente, après
+# TRAINING_DEBOUNCE_SECONDS sans nouvelle correction, ou au plus tard
+# TRAINING_MAX_DELAY_SECONDS après la plus ancienne correction en attente
+TRAINING_BATCH_SIZE = 20
+TRAINING_DEBOUNCE_SECONDS = 30
+TRAINING_MAX_DELAY_SECONDS = 600
+# Entraînement incrémental: le modèle actif est mis à jour par descente de gradient
+# sur les seules nouvelles corrections; les champs corrigés pèsent davantage
+TRAINING_EPOCHS = 5
+TRAINING_LEARNING_RATE = 0.5
+TRAINING_MINIBATCH_SIZE = 256
+TRAINING_CORRECTION_WEIGHT = 3.0
+# Export en colonnes des exemples d'entraînement (manage.py export_training_data),
+# lu par projection mémoire lors de l'entraînement à la place des champs JSON
+TRAINING_EXPORT_DIR = os.path.join(MEDIA_ROOT, 'training_export')
+
+# Statistiques du modèle: durée de cache (secondes) et lecture des compteurs depuis
+# une ligne maintenue à chaque écriture plutôt que par agrégat (voir rebuild_model_stats)
+MODEL_STATS_CACHE_TTL = 5
+MODEL_STATS_INCREMENTAL = False
+
+# OCR (pytesseract + pdf2image): les pages sans couche texte sont d'abord
+# rastérisées à OCR_LOW_DPI, puis à OCR_HIGH_DPI si la confiance moyenne reste
+# sous OCR_MIN_CONFIDENCE. OCR_WORKERS pages sont traitées en parallèle (None: un par cœur),
+# au total: chaque processus d'extraction (EXTRACTION_WORKERS) en a sa part
+OCR_LANG = 'fra+eng'
+OCR_LOW_DPI = 150
+OCR_HIGH_DPI = 300
+OCR_MIN_CONFIDENCE = 70
+OCR_MIN_TEXT_LAYER_CHARS = 20
+OCR_WORKERS = None
+
+# Modèles de mise en page par fournisseur: index en mémoire rechargé au plus tard
+# après ce délai (secondes) dans les processus qui n'ont pas vu la modification
+SUPPLIER_TEMPLATE_REFRESH_SECONDS = 60
+
+# Index des doublons de factures: complété au plus tard après ce délai (secondes)
+# avec les factures enregistrées par les autres processus
+DUPLICATE_INDEX_REFRESH_SECONDS = 30
+
+# Rapprochement des fournisseurs (api.supplier_resolver): similarité minimale des
+# trigrammes de noms normalisés, et délai de prise en compte des fournisseurs
+# créés par les autres processus
+SUPPLIER_MATCH_THRESHOLD = 0.6
+SUPPLIER_INDEX_REFRESH_SECONDS = 30
+
+# Nombre de processus d'extraction pour les envois groupés (None: un par cœur)
+EXTRACTION_WORKERS = None
+# Démarrage de ces processus: 'fork' reprend les réglages du processus parent (base de
+# test comprise); avec 'forkserver' ou 'spawn' chaque worker réimporte Django.
+# Dans tous les cas un worker ouvre ses propres connexions à la base
+EXTRACTION_START_METHOD = 'fork'
+# Jobs d'extraction (manage.py run_extraction_worker): un job resté "running" plus de
+# EXTRACTION_JOB_TIMEOUT_SECONDS (worker arrêté en cours de route) est repris par un
+# autre worker, et marqué en échec après EXTRACTION_JOB_MAX_ATTEMPTS tentatives
+EXTRACTION_JOB_TIMEOUT_SECONDS = 600
+EXTRACTION_JOB_MAX_ATTEMPTS = 3
+# Vues asynchrones (api/async/...): extractions en attente tolérées au-delà d'une
+# par worker avant de répondre 429, et Retry-After (secondes) en l'absence de mesures
+EXTRACTION_QUEUE_DEPTH = 16
+EXTRACTION_RETRY_AFTER = 2
+
+# Inférence du modèle actif (fichier .npz, voir api.inference): nombre maximal de
+# documents dont les lignes sont évaluées ensemble lors des envois groupés
+INFERENCE_BATCH_SIZE = 16
+# Intervalle (secondes) de vérification de la version active du modèle par
+# chaque processus; un changement dans le processus même est pris en compte aussitôt
+MODEL_REGISTRY_POLL_SECONDS = 5
+
+# Mesure des étapes (api.metrics): chaque processus écrit ses histogrammes dans
+# METRICS_DIR au plus toutes les METRICS_FLUSH_SECONDS, /api/metrics/ les additionne.
+# Le répertoire est à vider au déploiement, comme pour prometheus_client en multiprocessus.
+# SERVER_TIMING ajoute les durées de la requête dans l'en-tête Server-Timing
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ml_server_app_metrics'))
+METRICS_FLUSH_SECONDS = 5
+SERVER_TIMING = DEBUG
+
+# Corpus de factures utilisé pour les benchmarks
+DATA_SOURCE_DIR = os.path.join(BASE_DIR.parent, 'data_source')